@@ -0,0 +1,123 @@
+"""
+Bayes Factors for t-Tests and Correlations
+VR Maze Navigation Studies
+
+Default (JZS) Bayes factors to report next to the p-values of the scripts:
+
+    t-test       Rouder et al. (2009): Cauchy(0, r) prior on the standardized
+                 effect, r = sqrt(2)/2 by default. For a t statistic with
+                 effective sample size N (n for one-sample / paired tests,
+                 n1 n2 / (n1 + n2) for two samples) and df nu:
+
+                 BF10 = int (1 + N g r^2)^(-1/2)
+                            (1 + t^2 / ((1 + N g r^2) nu))^(-(nu + 1)/2)
+                            IG(g; 1/2, 1/2) dg  /  (1 + t^2 / nu)^(-(nu + 1)/2)
+
+    correlation  Wetzels & Wagenmakers (2012) JZS Bayes factor for Pearson r:
+
+                 BF10 = sqrt(n/2) / Gamma(1/2) int (1 + g)^((n - 2)/2)
+                            (1 + (1 - r^2) g)^(-(n - 1)/2) g^(-3/2) e^(-n/(2g)) dg
+
+Both integrals over the g-prior scale are evaluated on one fixed
+Gauss-Legendre grid in log g, shared by every test, so the Bayes factors of
+any number of contrasts come from a single (tests x nodes) array reduction.
+Integrands are summed in log space, so large t or r do not overflow.
+
+Usage:
+    bf = bf10_ttest(results['t'], results['n1'], results['n2'])
+    bf = bf10_correlation(corr_df['r'], corr_df['n'])
+    labels = bf_evidence(bf)
+"""
+
+import numpy as np
+from scipy.special import gammaln, logsumexp
+
+# Default Cauchy prior scale ("medium") for the standardized effect size
+JZS_PRIOR_SCALE = np.sqrt(2) / 2
+
+# Gauss-Legendre nodes over log g in [LOG_G_MIN, LOG_G_MAX]
+N_NODES = 400
+LOG_G_MIN, LOG_G_MAX = -25.0, 25.0
+
+# Lee & Wagenmakers (2013) evidence categories for BF10
+EVIDENCE_LABELS = [
+    (100, 'extreme H1'), (30, 'very strong H1'), (10, 'strong H1'), (3, 'moderate H1'),
+    (1, 'anecdotal H1'), (1 / 3, 'anecdotal H0'), (1 / 10, 'moderate H0'), (1 / 30, 'strong H0'),
+    (1 / 100, 'very strong H0'), (0, 'extreme H0'),
+]
+
+
+def _log_g_grid():
+    """Log-g nodes and the log quadrature weights including the dg = g dlog g Jacobian"""
+    nodes, weights = np.polynomial.legendre.leggauss(N_NODES)
+    half = (LOG_G_MAX - LOG_G_MIN) / 2
+    log_g = LOG_G_MIN + half * (nodes + 1)
+    return log_g, np.log(weights * half) + log_g
+
+
+_LOG_G, _LOG_W = _log_g_grid()
+
+
+def log_bf10_ttest(t, n1, n2=None, prior_scale=JZS_PRIOR_SCALE):
+    """Natural log of the JZS Bayes factor for t statistics (broadcast over all inputs)
+
+    n2=None gives the one-sample / paired test with n1 observations.
+    """
+    t = np.asarray(t, dtype=float)
+    n1 = np.asarray(n1, dtype=float)
+    if n2 is None:
+        n_eff, nu = n1, n1 - 1
+    else:
+        n2 = np.asarray(n2, dtype=float)
+        n_eff, nu = n1 * n2 / (n1 + n2), n1 + n2 - 2
+    t, n_eff, nu = (x[..., None] for x in np.broadcast_arrays(t, n_eff, nu))
+    g = np.exp(_LOG_G)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        scale = 1 + n_eff * g * prior_scale ** 2
+        log_integrand = (-0.5 * np.log(scale)
+                         - (nu + 1) / 2 * np.log1p(t ** 2 / (scale * nu))
+                         # inverse-gamma(1/2, 1/2) prior density of g
+                         - 0.5 * np.log(2 * np.pi) - 1.5 * _LOG_G - 1 / (2 * g))
+        log_null = -(nu[..., 0] + 1) / 2 * np.log1p(t[..., 0] ** 2 / nu[..., 0])
+        return logsumexp(log_integrand + _LOG_W, axis=-1) - log_null
+
+
+def bf10_ttest(t, n1, n2=None, prior_scale=JZS_PRIOR_SCALE):
+    """JZS Bayes factor BF10 for t statistics (see log_bf10_ttest)"""
+    return np.exp(log_bf10_ttest(t, n1, n2, prior_scale))
+
+
+def log_bf10_correlation(r, n):
+    """Natural log of the JZS Bayes factor for Pearson correlations r with n observations"""
+    r, n = np.broadcast_arrays(np.asarray(r, dtype=float), np.asarray(n, dtype=float))
+    r, n = np.clip(r, -1.0, 1.0)[..., None], n[..., None]
+    g = np.exp(_LOG_G)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        log_integrand = ((n - 2) / 2 * np.log1p(g)
+                         - (n - 1) / 2 * np.log1p((1 - r ** 2) * g)
+                         - 1.5 * _LOG_G - n / (2 * g))
+        log_const = 0.5 * np.log(n[..., 0] / 2) - gammaln(0.5)
+        return log_const + logsumexp(log_integrand + _LOG_W, axis=-1)
+
+
+def bf10_correlation(r, n):
+    """JZS Bayes factor BF10 for Pearson correlations (see log_bf10_correlation)"""
+    return np.exp(log_bf10_correlation(r, n))
+
+
+def bf_evidence(bf10):
+    """Evidence category for each BF10 (Lee & Wagenmakers, 2013)"""
+    bf10 = np.asarray(bf10, dtype=float)
+    conditions = [bf10 > cutoff for cutoff, _ in EVIDENCE_LABELS[:-1]]
+    choices = [label for _, label in EVIDENCE_LABELS[:-1]]
+    labels = np.select(conditions, choices, default=EVIDENCE_LABELS[-1][1])
+    return np.where(np.isnan(bf10), '', labels)
+
+
+def format_bf(bf10):
+    """BF10 for the printed results (scientific notation when very large or small)"""
+    if not np.isfinite(bf10):
+        return 'BF10 = n/a'
+    if bf10 >= 1000 or bf10 < 0.001:
+        return f'BF10 = {bf10:.2e}'
+    return f'BF10 = {bf10:.3f}'
@@ -0,0 +1,209 @@
+"""
+Bit-Packed Decision Patterns and Compliance Transitions
+VR Maze Navigation Studies
+
+A participant's 10 follow/deviate decisions fit in one 10-bit integer, so
+every follow vector is packed into two uint16 codes when the metrics are
+calculated (trust_metrics adds them as follow_pattern / follow_observed):
+
+    follow_pattern    bit c - 1 set if the agent was followed at corner c
+    follow_observed   bit c - 1 set if corner c has a decision at all
+
+Pattern frequencies per condition are one bincount over (condition, pattern)
+keys. The pattern index stores the counts of every distinct
+(observed, pattern) key per condition, and both pattern queries and the
+first-order transition matrices (follow -> deviate etc.) are evaluated on
+those distinct keys with bit operations, so their cost depends on the number
+of distinct patterns rather than on the number of participants.
+
+Queries are strings over corners 1, 2, ... with F = followed, D = deviated
+and '.' = any, or dicts {corner: 'F' / 'D' / 1 / 0}:
+
+    'FFDF'             followed at 1-2, deviated at 3, followed again at 4
+    {3: 'D', 4: 'F'}   deviated at 3 and followed at 4, anything elsewhere
+
+Usage:
+    codes, observed = pack_follow(followed_matrix(df, STUDY1_DESIGN))
+    index = pattern_index(codes, observed, df['Display'], n_corners=10)
+    pattern_counts(index, top=10)
+    query_patterns(index, 'FFDF')
+    transition_counts(index)
+"""
+
+import numpy as np
+import pandas as pd
+
+FOLLOW, DEVIATE, ANY = 'F', 'D', '.'
+
+MAX_CORNERS = 16
+
+# Number of set bits of every uint16 value
+_POPCOUNT = np.unpackbits(np.arange(1 << MAX_CORNERS, dtype='>u2').view(np.uint8)).reshape(-1, 16).sum(axis=1)
+
+
+def pack_follow(followed):
+    """Pack a (N, K) follow matrix (1 / 0 / NaN) into uint16 (pattern, observed) codes"""
+    followed = np.asarray(followed, dtype=float)
+    n_corners = followed.shape[1]
+    if n_corners > MAX_CORNERS:
+        raise ValueError(f"Cannot pack {n_corners} corners into uint16 codes (max {MAX_CORNERS})")
+    weights = (1 << np.arange(n_corners)).astype(np.uint16)
+    observed = ~np.isnan(followed)
+    codes = ((followed == 1) @ weights).astype(np.uint16)
+    return codes, (observed @ weights).astype(np.uint16)
+
+
+def unpack_follow(codes, observed, n_corners):
+    """(N, K) follow matrix from packed codes (inverse of pack_follow)"""
+    bits = 1 << np.arange(n_corners)
+    followed = ((np.asarray(codes, dtype=np.int64)[:, None] & bits) > 0).astype(float)
+    followed[(np.asarray(observed, dtype=np.int64)[:, None] & bits) == 0] = np.nan
+    return followed
+
+
+def pattern_labels(codes, observed, n_corners):
+    """'FFDF...' label of each packed pattern ('.' marks a missing corner)"""
+    followed = unpack_follow(codes, observed, n_corners)
+    chars = np.where(np.isnan(followed), ANY, np.where(followed == 1, FOLLOW, DEVIATE))
+    return np.array([''.join(row) for row in chars], dtype=object)
+
+
+def pattern_index(codes, observed, groups, n_corners):
+    """Counts of every distinct (observed, pattern) key per condition
+
+    Returns a dict with the condition levels, the distinct keys' codes and
+    observed masks (U,), and counts (G, U). Participants without a
+    condition label are dropped.
+    """
+    codes = np.asarray(codes, dtype=np.int64)
+    observed = np.asarray(observed, dtype=np.int64)
+    group_codes, levels = pd.factorize(np.asarray(groups, dtype=object), sort=True)
+    keep = group_codes >= 0
+    keys, inverse = np.unique((observed[keep] << MAX_CORNERS) | codes[keep], return_inverse=True)
+    n_keys = len(keys)
+    counts = np.bincount(group_codes[keep] * n_keys + inverse.ravel(),
+                         minlength=len(levels) * n_keys).reshape(len(levels), n_keys)
+    return {
+        'levels': list(levels), 'n_corners': n_corners,
+        'codes': keys & ((1 << MAX_CORNERS) - 1), 'observed': keys >> MAX_CORNERS,
+        'counts': counts,
+    }
+
+
+def _with_total(index):
+    """Condition labels and counts with a pooled 'All' row first"""
+    counts = index['counts']
+    return ['All'] + index['levels'], np.vstack([counts.sum(axis=0), counts])
+
+
+def pattern_counts(index, top=None, complete_only=True):
+    """Frequency of each decision pattern per condition (long format, most frequent first)
+
+    complete_only keeps participants with a decision at every corner;
+    otherwise missing corners show as '.' in the pattern.
+    """
+    levels, counts = _with_total(index)
+    full = (1 << index['n_corners']) - 1
+    keep = index['observed'] == full if complete_only else np.ones(len(index['codes']), dtype=bool)
+    labels = pattern_labels(index['codes'][keep], index['observed'][keep], index['n_corners'])
+    counts = counts[:, keep]
+    order = np.argsort(-counts[0], kind='stable')
+    if top is not None:
+        order = order[:top]
+    with np.errstate(invalid='ignore', divide='ignore'):
+        proportions = counts / counts.sum(axis=1, keepdims=True)
+    return pd.DataFrame({
+        'condition': np.repeat(np.array(levels, dtype=object), len(order)),
+        'pattern': np.tile(labels[order], len(levels)),
+        'n_followed': np.tile(_POPCOUNT[index['codes'][keep][order]], len(levels)),
+        'count': counts[:, order].ravel(),
+        'proportion': proportions[:, order].ravel(),
+    })
+
+
+def parse_query(query, n_corners):
+    """(mask, value) bit codes of a pattern query string or {corner: state} dict"""
+    if isinstance(query, str):
+        items = {c: s for c, s in enumerate(query.upper(), start=1) if s != ANY}
+    else:
+        items = dict(query)
+    mask = value = 0
+    for corner, state in items.items():
+        if not 1 <= corner <= n_corners:
+            raise ValueError(f"Corner {corner} outside 1..{n_corners}")
+        if state in (FOLLOW, 1, True):
+            value |= 1 << (corner - 1)
+        elif state not in (DEVIATE, 0, False):
+            raise ValueError(f"Unknown state {state!r} at corner {corner}; use 'F', 'D' or '.'")
+        mask |= 1 << (corner - 1)
+    return mask, value
+
+
+def match_patterns(codes, observed, query, n_corners):
+    """Boolean per code: decided at every queried corner and matching the query"""
+    mask, value = parse_query(query, n_corners)
+    codes = np.asarray(codes, dtype=np.int64)
+    observed = np.asarray(observed, dtype=np.int64)
+    return ((observed & mask) == mask) & ((codes & mask) == value)
+
+
+def query_patterns(index, query):
+    """Number and share of participants per condition matching a pattern query
+
+    The share is relative to the participants with a decision at every
+    queried corner (n_eligible).
+    """
+    mask, _ = parse_query(query, index['n_corners'])
+    levels, counts = _with_total(index)
+    eligible = (index['observed'] & mask) == mask
+    matching = match_patterns(index['codes'], index['observed'], query, index['n_corners'])
+    n_matching = counts[:, matching].sum(axis=1)
+    n_eligible = counts[:, eligible].sum(axis=1)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        proportion = n_matching / n_eligible
+    return pd.DataFrame({'condition': levels, 'n_matching': n_matching,
+                         'n_eligible': n_eligible, 'proportion': proportion})
+
+
+def transition_counts(index, from_corners=None):
+    """First-order follow/deviate transition counts and probabilities per condition
+
+    Counts every pair of consecutive decided corners (c, c + 1); from_corners
+    restricts c (e.g. the agent error corners). Probabilities are
+    P(state at c + 1 | state at c) within each condition.
+    """
+    n_corners = index['n_corners']
+    codes, observed = index['codes'], index['observed']
+    starts = range(1, n_corners) if from_corners is None else [c for c in from_corners if c < n_corners]
+    start_mask = sum(1 << (c - 1) for c in starts)
+    # Bit c - 1 of the shifted codes holds the decision at corner c + 1
+    pair = observed & (observed >> 1) & start_mask
+    current, following = codes, codes >> 1
+    states = {
+        (FOLLOW, FOLLOW): current & following & pair,
+        (FOLLOW, DEVIATE): current & ~following & pair,
+        (DEVIATE, FOLLOW): ~current & following & pair,
+        (DEVIATE, DEVIATE): ~current & ~following & pair,
+    }
+    levels, counts = _with_total(index)
+    # (G, U) pattern counts x (U, 4) transitions per pattern
+    per_pattern = np.column_stack([_POPCOUNT[bits] for bits in states.values()])
+    totals = counts @ per_pattern
+    from_totals = np.repeat(totals.reshape(len(levels), 2, 2).sum(axis=2), 2, axis=1)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        probability = totals / from_totals
+    return pd.DataFrame({
+        'condition': np.repeat(np.array(levels, dtype=object), 4),
+        'from_state': np.tile([a for a, _ in states], len(levels)),
+        'to_state': np.tile([b for _, b in states], len(levels)),
+        'count': totals.ravel(), 'probability': probability.ravel(),
+    })
+
+
+def transition_matrices(index, from_corners=None):
+    """{condition: 2 x 2 DataFrame of P(to_state | from_state)}"""
+    table = transition_counts(index, from_corners)
+    order = [FOLLOW, DEVIATE]
+    return {condition: rows.pivot(index='from_state', columns='to_state', values='probability')
+                           .reindex(index=order, columns=order)
+            for condition, rows in table.groupby('condition', sort=False)}
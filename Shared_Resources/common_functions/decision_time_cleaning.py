@@ -0,0 +1,191 @@
+"""
+Decision-Time Outlier Trimming and Transformation
+VR Maze Navigation Studies
+
+Cleans the participant x corner decision-time matrix before any time metric
+is computed. A cleaning configuration is a dict:
+
+    min_time / max_time   absolute cutoffs in seconds (None = no cutoff)
+    rule                  relative outlier rule applied after the cutoffs:
+                            'mad'      robust z within participant
+                                       (median / 1.4826 * MAD over the corners)
+                            'corner_z' z-score within corner across participants
+                            None       no relative rule
+    threshold             cutoff for the relative rule (|z| > threshold)
+    action                'remove' (set to NaN) or 'winsorize' (clip to the
+                          rule's bounds; absolute cutoffs always remove)
+    transform             None, 'log' (log seconds) or 'inverse' (decisions
+                          per second), applied after trimming
+
+Every rule is a set of array operations over all participants at once. The
+trimming masks depend only on the times and the configuration, so they are
+cached (keyed by a hash of the time matrix and the configuration) and every
+metric computed from the same data reuses them. The cache keeps the
+MASK_CACHE_SIZE most recently used entries, so sweeping many cleaning
+variants (e.g. the multiverse) does not grow it without limit.
+
+The study defaults follow METRICS_CALCULATION_GUIDE.md section 3.1: times
+above 60 seconds are excluded and each participant's metrics are means over
+the remaining corners.
+
+Usage:
+    times = clean_times(corner_times(df), STUDY1_TIME_CLEANING)
+    seconds = trim_times(corner_times(df), STUDY1_TIME_CLEANING)      # trimmed, not transformed
+    masks = trim_masks(corner_times(df), {'max_time': 60, 'rule': 'mad', 'threshold': 3.5})
+"""
+
+import hashlib
+import warnings
+from collections import OrderedDict
+
+import numpy as np
+
+STUDY1_TIME_CLEANING = {
+    'min_time': None,
+    'max_time': 60.0,
+    'rule': None,
+    'threshold': 3.5,
+    'action': 'remove',
+    'transform': None,
+}
+
+STUDY2_TIME_CLEANING = dict(STUDY1_TIME_CLEANING)
+
+RULES = (None, 'mad', 'corner_z')
+ACTIONS = ('remove', 'winsorize')
+TRANSFORMS = (None, 'log', 'inverse')
+
+# Scale factor making the MAD a consistent estimator of the normal SD
+MAD_SCALE = 1.4826
+
+# (time matrix hash, configuration) -> trimming masks and rule bounds, least recently used first
+MASK_CACHE_SIZE = 32
+_MASK_CACHE = OrderedDict()
+
+
+def _config_key(config):
+    return tuple(sorted((k, config.get(k)) for k in ('min_time', 'max_time', 'rule', 'threshold')))
+
+
+def _times_key(times):
+    return (times.shape, hashlib.sha1(np.ascontiguousarray(times).tobytes()).hexdigest())
+
+
+def validate_cleaning(config):
+    """Raise ValueError for unknown rules, actions or transforms"""
+    if config.get('rule') not in RULES:
+        raise ValueError(f"Unknown outlier rule {config.get('rule')!r}; use one of {RULES}")
+    if config.get('action', 'remove') not in ACTIONS:
+        raise ValueError(f"Unknown action {config.get('action')!r}; use one of {ACTIONS}")
+    if config.get('transform') not in TRANSFORMS:
+        raise ValueError(f"Unknown transform {config.get('transform')!r}; use one of {TRANSFORMS}")
+
+
+def absolute_outlier_mask(times, min_time=None, max_time=None):
+    """True where a time falls outside the absolute cutoffs"""
+    mask = np.zeros(times.shape, dtype=bool)
+    if min_time is not None:
+        mask |= times < min_time
+    if max_time is not None:
+        mask |= times > max_time
+    return mask
+
+
+def rule_bounds(times, rule, threshold):
+    """(lower, upper) bounds of the relative rule, broadcastable to times
+
+    NaN entries are ignored; rows / columns with too few values give NaN
+    bounds, which flag nothing.
+    """
+    with warnings.catch_warnings():
+        warnings.simplefilter('ignore', category=RuntimeWarning)
+        if rule == 'mad':
+            center = np.nanmedian(times, axis=-1, keepdims=True)
+            spread = MAD_SCALE * np.nanmedian(np.abs(times - center), axis=-1, keepdims=True)
+        elif rule == 'corner_z':
+            center = np.nanmean(times, axis=-2, keepdims=True)
+            spread = np.nanstd(times, axis=-2, ddof=1, keepdims=True)
+        else:
+            return None, None
+    # A zero spread (e.g. identical times) would flag every other value
+    spread = np.where(spread > 0, spread, np.nan)
+    return center - threshold * spread, center + threshold * spread
+
+
+def trim_masks(times, config):
+    """Cached trimming masks for a (..., participant, corner) time matrix
+
+    Returns a dict with boolean arrays 'absolute', 'relative' and 'trimmed'
+    (either rule), plus the relative rule's 'lower' / 'upper' bounds.
+    """
+    validate_cleaning(config)
+    times = np.asarray(times, dtype=float)
+    key = (_times_key(times), _config_key(config))
+    if key in _MASK_CACHE:
+        _MASK_CACHE.move_to_end(key)
+        return _MASK_CACHE[key]
+
+    absolute = absolute_outlier_mask(times, config.get('min_time'), config.get('max_time'))
+    remaining = np.where(absolute, np.nan, times)
+    lower, upper = rule_bounds(remaining, config.get('rule'), config.get('threshold', 3.5))
+    if lower is None:
+        relative = np.zeros(times.shape, dtype=bool)
+    else:
+        with np.errstate(invalid='ignore'):
+            relative = (remaining < lower) | (remaining > upper)
+    masks = {'absolute': absolute, 'relative': relative, 'trimmed': absolute | relative,
+             'lower': lower, 'upper': upper}
+    for value in masks.values():
+        if value is not None:
+            value.setflags(write=False)
+    _MASK_CACHE[key] = masks
+    while len(_MASK_CACHE) > MASK_CACHE_SIZE:
+        _MASK_CACHE.popitem(last=False)
+    return masks
+
+
+def clear_mask_cache():
+    """Drop all cached trimming masks"""
+    _MASK_CACHE.clear()
+
+
+def transform_times(times, transform=None):
+    """Apply the decision-time transform (None, 'log' or 'inverse')"""
+    if transform is None:
+        return times
+    with np.errstate(invalid='ignore', divide='ignore'):
+        if transform == 'log':
+            return np.where(times > 0, np.log(times), np.nan)
+        if transform == 'inverse':
+            return np.where(times > 0, 1.0 / times, np.nan)
+    raise ValueError(f"Unknown transform {transform!r}; use one of {TRANSFORMS}")
+
+
+def clean_times(times, config=None):
+    """Trimmed (or winsorized) and transformed copy of a time matrix
+
+    config=None returns the times unchanged.
+    """
+    times = np.array(times, dtype=float)
+    if config is None:
+        return times
+    masks = trim_masks(times, config)
+    times[masks['absolute']] = np.nan
+    if config.get('action', 'remove') == 'winsorize' and masks['lower'] is not None:
+        times = np.where(masks['relative'], np.clip(times, masks['lower'], masks['upper']), times)
+    else:
+        times[masks['relative']] = np.nan
+    return transform_times(times, config.get('transform'))
+
+
+def trim_times(times, config=None):
+    """Trimmed (or winsorized) copy of a time matrix in seconds, ignoring the transform
+
+    For models that work on the raw or their own log scale.
+    """
+    return clean_times(times, None if config is None else dict(config, transform=None))
+
+
+def trimming_counts(times, config):
+    """Number of trimmed (or winsorized) corner times per participant"""
+    return trim_masks(times, config)['trimmed'].sum(axis=-1)
@@ -0,0 +1,147 @@
+"""
+Precomputed Descriptive-Statistics Cube
+
+The figure and analysis scripts ask for the same cell means and SEMs over and
+over (one DataFrame scan per bar). This module computes count / mean / std /
+sem / median / quantiles for every numeric metric across every grouping
+(single factors and their crossings) in ONE grouped aggregation and stores the
+result per grouping, shaped exactly like df.groupby(grouping)[metrics].agg(...).
+
+Usage:
+    cube = build_descriptive_cube(df)
+    phase1_means = cube_values(cube, 'Display', 'phase1_mean_time', 'mean', conditions)
+    mem_groups = cube_table(cube, 'memory_function', ['Trust_pre', 'Trust_post'])
+"""
+
+import itertools
+
+import numpy as np
+import pandas as pd
+
+DEFAULT_FACTORS = ['Display', 'condition_label', 'memory_function', 'agent_personality',
+                   'match_label', 'participant_intro_extro', 'participant_personality',
+                   'distance_condition']
+
+CUBE_STATS = ['count', 'mean', 'std', 'sem', 'median']
+
+# Numeric columns that are codes or flags rather than measurements (bit-packed
+# decision patterns, trust-update convergence)
+NON_METRIC_COLUMNS = ['follow_pattern', 'follow_observed', 'rl_converged']
+
+
+def grouping_name(grouping):
+    """Key of a grouping in the cube ('All', 'Display', 'match_label x memory_function')"""
+    if grouping is None or (not isinstance(grouping, str) and len(grouping) == 0):
+        return 'All'
+    if isinstance(grouping, str):
+        return grouping
+    return ' x '.join(grouping)
+
+
+def _quantile_name(q):
+    """Column name for a quantile (0.25 -> 'q25')"""
+    return f'q{int(round(q * 100)):02d}'
+
+
+def build_descriptive_cube(df, factors=None, metrics=None, max_order=2,
+                           quantiles=(0.25, 0.5, 0.75)):
+    """Compute the descriptive cube for all metrics x all groupings
+
+    factors: grouping columns (default: the condition/personality columns present)
+    metrics: numeric columns to describe (default: every numeric column that is
+             neither a factor nor in NON_METRIC_COLUMNS)
+    max_order: highest order of factor crossings (2 = all pairwise crossings)
+
+    Returns a dict mapping grouping name -> DataFrame indexed by the cell labels
+    with (metric, stat) columns.
+    """
+    factors = [f for f in (factors or DEFAULT_FACTORS) if f in df.columns]
+    if metrics is None:
+        metrics = [c for c in df.select_dtypes(include='number').columns
+                   if c not in factors and c not in NON_METRIC_COLUMNS]
+    values = df[metrics].apply(pd.to_numeric, errors='coerce').to_numpy(dtype=float)
+
+    groupings = [()] + [combo for order in range(1, max_order + 1)
+                        for combo in itertools.combinations(factors, order)]
+
+    # Stack one copy of the metric rows per grouping, tagged with (grouping id, cell code)
+    row_blocks, grouping_ids, cell_codes, cell_labels = [], [], [], []
+    for gid, grouping in enumerate(groupings):
+        if grouping:
+            keys = df[list(grouping)]
+            grouped = keys.groupby(list(grouping), sort=True, dropna=True, observed=True)
+            codes = grouped.ngroup().to_numpy()
+            labels = grouped.size().index
+        else:
+            codes = np.zeros(len(df), dtype=int)
+            labels = pd.Index(['All'])
+        keep = codes >= 0
+        row_blocks.append(values[keep])
+        grouping_ids.append(np.full(keep.sum(), gid))
+        cell_codes.append(codes[keep])
+        cell_labels.append(labels)
+
+    stacked = pd.DataFrame(np.vstack(row_blocks), columns=metrics)
+    stacked['_grouping'] = np.concatenate(grouping_ids)
+    stacked['_cell'] = np.concatenate(cell_codes)
+
+    grouped = stacked.groupby(['_grouping', '_cell'], sort=True)[metrics]
+    summary = grouped.agg(CUBE_STATS)
+    if quantiles:
+        qs = grouped.quantile(list(quantiles))
+        qs.index = qs.index.set_levels([_quantile_name(q) for q in qs.index.levels[2]], level=2)
+        qs = qs.unstack(level=2)
+        summary = summary.join(qs)
+        stat_order = CUBE_STATS + [_quantile_name(q) for q in quantiles]
+        summary = summary.reindex(columns=pd.MultiIndex.from_product([metrics, stat_order]))
+
+    cube = {}
+    for gid, grouping in enumerate(groupings):
+        block = summary.xs(gid, level='_grouping')
+        block.index = cell_labels[gid][block.index.to_numpy()]
+        cube[grouping_name(grouping)] = block
+    return cube
+
+
+def grouping_block(cube, grouping):
+    """Cube block for a grouping, in the factor order requested"""
+    name = grouping_name(grouping)
+    if name in cube:
+        return cube[name]
+    if not isinstance(grouping, str):
+        for order in itertools.permutations(grouping):
+            if grouping_name(order) in cube:
+                block = cube[grouping_name(order)]
+                return block.reorder_levels(list(grouping)).sort_index()
+    raise KeyError(f"Grouping {name!r} is not in the descriptive cube")
+
+
+def cube_table(cube, grouping, metrics, stats=('mean', 'sem')):
+    """Drop-in replacement for df.groupby(grouping)[metrics].agg(list(stats))"""
+    block = grouping_block(cube, grouping)
+    if isinstance(metrics, str):
+        return block[metrics][list(stats)]
+    return block.loc[:, pd.MultiIndex.from_product([list(metrics), list(stats)])]
+
+
+def cube_values(cube, grouping, metric, stat='mean', cells=None):
+    """Array of one statistic for the requested cells (NaN for empty cells)"""
+    column = grouping_block(cube, grouping)[(metric, stat)]
+    if cells is None:
+        return column.to_numpy()
+    return column.reindex(list(cells)).to_numpy()
+
+
+def cube_series(cube, grouping, metric, stat='mean', within=None):
+    """One statistic over the grouping cells, optionally within one level of the first factor"""
+    column = grouping_block(cube, grouping)[(metric, stat)]
+    if within is None:
+        return column
+    if within not in column.index.get_level_values(0):
+        return column.iloc[:0]
+    return column.xs(within, level=0)
+
+
+def cube_value(cube, metric, stat='mean', grouping='All', cell='All'):
+    """Single statistic from the cube (overall by default)"""
+    return grouping_block(cube, grouping).loc[cell, (metric, stat)]
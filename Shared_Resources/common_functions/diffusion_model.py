@@ -0,0 +1,197 @@
+"""
+Drift-Diffusion Model of Follow Decisions
+VR Maze Navigation Studies
+
+Combines each corner's decision time and follow / deviate choice in a Wiener
+diffusion model, with following the agent as the upper boundary:
+
+    drift (v)         evidence accumulation towards the agent's advice
+    boundary (a)      caution (how much evidence is needed before turning)
+    non-decision (t0) encoding / movement time in seconds
+    bias (w)          relative starting point (0.5 = unbiased)
+
+Two estimators are provided, both with diffusion coefficient s = 1:
+
+    - ez_diffusion(): the closed-form EZ-diffusion estimator (Wagenmakers,
+      van der Maas & Grasman, 2007), vectorized over all participants
+    - fit_diffusion_ml(): full maximum likelihood with the Navarro & Fuss (2009)
+      first-passage-time density, evaluated for all of a participant's
+      decisions at once; participants are fitted in chunks on a process pool
+
+Usage:
+    ez = ez_diffusion_metrics(df, STUDY1_DESIGN)                # ez_* columns
+    ml = fit_diffusion_ml(df, STUDY1_DESIGN, n_jobs=4)          # ddm_* columns
+"""
+
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import pandas as pd
+from scipy import optimize
+from scipy.special import expit, logit
+
+from decision_time_cleaning import trim_times
+from trust_metrics import corner_times, followed_matrix
+
+# Number of series terms used by the first-passage-time density
+SMALL_TIME_TERMS = 5
+LARGE_TIME_TERMS = 20
+
+
+def diffusion_data(df, design):
+    """Decision times (N, K) and choices (N, K; 1 = followed, 0 = deviated)
+
+    Times are trimmed with the design's time_cleaning; corners missing either
+    the time or the direction are set to NaN in both.
+    """
+    times = trim_times(corner_times(df, design['n_corners']), design.get('time_cleaning'))
+    choices = followed_matrix(df, design)
+    missing = np.isnan(times) | np.isnan(choices) | (times <= 0)
+    times[missing] = np.nan
+    choices[missing] = np.nan
+    return times, choices
+
+
+def ez_diffusion(prop_upper, rt_mean, rt_var, n_trials=None, s=1.0):
+    """Closed-form EZ-diffusion estimates (arrays of any shape)
+
+    prop_upper: proportion of upper-boundary (follow) responses; rt_mean /
+    rt_var: mean and variance of the upper-boundary decision times. With
+    n_trials given, proportions of 0 and 1 are nudged by 1/(2n) so the
+    estimator stays finite (edge correction). A proportion of exactly 0.5
+    uses the zero-drift limit: drift 0, boundary s (24 rt_var)^(1/4) and
+    mean decision time boundary^2 / (4 s^2).
+    Returns a dict with drift, boundary and nondecision.
+    """
+    pc = np.asarray(prop_upper, dtype=float)
+    rt_mean = np.asarray(rt_mean, dtype=float)
+    rt_var = np.asarray(rt_var, dtype=float)
+    if n_trials is not None:
+        half = 0.5 / np.maximum(np.asarray(n_trials, dtype=float), 1)
+        pc = np.where(pc >= 1, 1 - half, pc)
+        pc = np.where(pc <= 0, half, pc)
+
+    chance = pc == 0.5
+    with np.errstate(invalid='ignore', divide='ignore'):
+        lg = logit(pc)
+        x = lg * (lg * pc ** 2 - lg * pc + pc - 0.5) / rt_var
+        drift = np.where(chance, 0.0, np.sign(pc - 0.5) * s * np.abs(x) ** 0.25)
+        boundary = np.where(chance, s * (24 * rt_var) ** 0.25, s ** 2 * lg / drift)
+        y = -drift * boundary / s ** 2
+        mean_decision = np.where(chance, boundary ** 2 / (4 * s ** 2),
+                                 (boundary / (2 * drift)) * (1 - np.exp(y)) / (1 + np.exp(y)))
+        nondecision = rt_mean - mean_decision
+    return {'drift': drift, 'boundary': boundary, 'nondecision': nondecision}
+
+
+def ez_diffusion_metrics(df, design, s=1.0):
+    """EZ-diffusion estimates for every participant as ez_* columns"""
+    times, choices = diffusion_data(df, design)
+    n = (~np.isnan(choices)).sum(axis=1)
+    follows = np.nansum(choices, axis=1)
+    upper_times = np.where(choices == 1, times, np.nan)
+    n_upper = (~np.isnan(upper_times)).sum(axis=1)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        prop = np.where(n > 0, follows / np.maximum(n, 1), np.nan)
+        rt_sum = np.nansum(upper_times, axis=1)
+        rt_mean = np.where(n_upper > 0, rt_sum / np.maximum(n_upper, 1), np.nan)
+        dev = np.where(np.isnan(upper_times), 0.0, upper_times - rt_mean[:, None])
+        rt_var = np.where(n_upper > 1, (dev ** 2).sum(axis=1) / np.maximum(n_upper - 1, 1), np.nan)
+    ez = ez_diffusion(prop, rt_mean, rt_var, n_trials=n, s=s)
+    return pd.DataFrame({'ez_drift': ez['drift'], 'ez_boundary': ez['boundary'],
+                         'ez_nondecision': ez['nondecision']}, index=df.index)
+
+
+def wiener_density(t, v, a, w, lower=True):
+    """First-passage-time density of a Wiener process (Navarro & Fuss, 2009)
+
+    Density of hitting the lower (lower=True) or upper boundary at decision time
+    t (seconds, after subtracting t0) for drift v, boundary separation a and
+    relative start point w. Broadcasts over all arguments; t <= 0 gives 0.
+    """
+    t, v, a, w, lower = np.broadcast_arrays(*(np.asarray(x, dtype=float) for x in (t, v, a, w, lower)))
+    # Upper-boundary density = lower-boundary density of the mirrored process
+    v = np.where(lower == 1, v, -v)
+    w = np.where(lower == 1, w, 1 - w)
+    positive = t > 0
+    tt = np.where(positive, t, 1.0) / a ** 2
+
+    # Small-time representation (accurate for small normalised time)
+    k = np.arange(-SMALL_TIME_TERMS, SMALL_TIME_TERMS + 1)
+    shifted = w[..., None] + 2 * k
+    small = (shifted * np.exp(-shifted ** 2 / (2 * tt[..., None]))).sum(axis=-1) \
+        / np.sqrt(2 * np.pi * tt ** 3)
+
+    # Large-time representation
+    j = np.arange(1, LARGE_TIME_TERMS + 1)
+    large = np.pi * (j * np.exp(-j ** 2 * np.pi ** 2 * tt[..., None] / 2)
+                     * np.sin(j * np.pi * w[..., None])).sum(axis=-1)
+
+    base = np.where(tt < 1, small, large)
+    density = base * np.exp(-v * a * w - v ** 2 * np.where(positive, t, 0.0) / 2) / a ** 2
+    return np.where(positive, np.maximum(density, 0.0), 0.0)
+
+
+def diffusion_loglik(params, times, choices, fit_bias=False):
+    """Log-likelihood of one participant's decisions
+
+    params: (v, log a, logit(t0 / min time)[, logit w]) on the unconstrained scale.
+    """
+    v, a = params[0], np.exp(params[1])
+    t0 = expit(params[2]) * np.min(times)
+    w = expit(params[3]) if fit_bias else 0.5
+    density = wiener_density(times - t0, v, a, w, lower=choices == 0)
+    return np.log(np.maximum(density, 1e-300)).sum()
+
+
+def _fit_one(times, choices, fit_bias):
+    """ML fit for a single participant (valid decisions only)"""
+    ez = ez_diffusion(choices.mean(), times.mean(), max(times.var(ddof=1), 1e-3), n_trials=len(times))
+    v0 = float(ez['drift']) if np.isfinite(ez['drift']) else 0.5
+    a0 = float(ez['boundary']) if np.isfinite(ez['boundary']) and ez['boundary'] > 0 else 2.0
+    start = [v0, np.log(a0), 0.0] + ([0.0] if fit_bias else [])
+    result = optimize.minimize(lambda p: -diffusion_loglik(p, times, choices, fit_bias), start,
+                               method='Nelder-Mead', options={'maxiter': 2000, 'xatol': 1e-6, 'fatol': 1e-8})
+    v, a = result.x[0], np.exp(result.x[1])
+    t0 = expit(result.x[2]) * np.min(times)
+    w = expit(result.x[3]) if fit_bias else 0.5
+    return [v, a, t0, w, -result.fun, result.success]
+
+
+def _fit_chunk(task):
+    """Worker: ML fits for a chunk of participants"""
+    times, choices, fit_bias, min_trials = task
+    rows = []
+    for t, c in zip(times, choices):
+        valid = ~np.isnan(t)
+        if valid.sum() < min_trials:
+            rows.append([np.nan] * 5 + [False])
+        else:
+            rows.append(_fit_one(t[valid], c[valid], fit_bias))
+    return rows
+
+
+def fit_diffusion_ml(df, design, fit_bias=False, min_trials=4, n_jobs=None, chunk_size=50):
+    """Maximum-likelihood diffusion parameters for every participant (ddm_* columns)
+
+    Participants are split into chunks of chunk_size and fitted on a process
+    pool with n_jobs workers (default all cores; n_jobs=1 runs in-process).
+    Participants with fewer than min_trials valid decisions get NaN.
+    """
+    times, choices = diffusion_data(df, design)
+    tasks = [(times[i:i + chunk_size], choices[i:i + chunk_size], fit_bias, min_trials)
+             for i in range(0, len(times), chunk_size)]
+    n_jobs = n_jobs or os.cpu_count() or 1
+    if n_jobs == 1:
+        chunks = [_fit_chunk(task) for task in tasks]
+    else:
+        with ProcessPoolExecutor(max_workers=n_jobs) as pool:
+            chunks = list(pool.map(_fit_chunk, tasks))
+    rows = [row for chunk in chunks for row in chunk]
+    result = pd.DataFrame(rows, index=df.index,
+                          columns=['ddm_drift', 'ddm_boundary', 'ddm_nondecision', 'ddm_bias',
+                                   'ddm_loglik', 'ddm_converged'])
+    if not fit_bias:
+        result = result.drop(columns='ddm_bias')
+    return result
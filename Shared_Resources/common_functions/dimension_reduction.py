@@ -0,0 +1,260 @@
+"""
+Factor Analysis / PCA of the Perception and VR Scales
+VR Maze Navigation Studies
+
+The six Godspeed scales and the three VR experience scales are strongly
+correlated, so testing each of them as a separate outcome counts the same
+underlying perception several times. This module summarizes them with a few
+components / factors:
+
+    - PCA of the correlation matrix, or exploratory factor analysis with
+      iterated principal-axis factoring (communalities start at the squared
+      multiple correlations, capped below 1 like the omega loadings of
+      questionnaire_scoring)
+    - the number of factors from Horn's parallel analysis (eigenvalues above
+      the 95th percentile of random-data eigenvalues), or fixed
+    - varimax rotation (Kaiser-normalized) for more than one factor
+    - regression factor scores for the downstream analyses
+    - invariance across conditions: each condition's solution is rotated
+      onto the pooled one (orthogonal Procrustes) and compared with Tucker's
+      congruence coefficient (>= .95 equal, .85-.94 fair similarity;
+      Lorenzo-Seva & ten Berge, 2006)
+    - bootstrap loadings: the resampled correlation matrices are stacked and
+      factored together, so each principal-axis iteration, the varimax and
+      Procrustes steps are single batched eigh / SVD calls over all
+      resamples
+
+Everything works on complete cases of the chosen variables, and every
+function accepts a stack (..., p, p) of correlation matrices, which is how
+the per-condition and bootstrap solutions are computed in one pass.
+
+Usage:
+    X = perception_matrix(df, PERCEPTION_SCALES)
+    fit = fit_factors(X, method='efa')
+    loadings = bootstrap_loadings(X, fit, n_boot=1000)
+    invariance = factor_invariance(X, df.loc[X.index, 'Display'], fit)
+    scores = factor_scores(X, fit)
+"""
+
+import numpy as np
+import pandas as pd
+
+GODSPEED_SCALES = ['Anthropomorphism', 'Animacy', 'Likeability', 'Intelligence', 'Safety', 'Aesthetic']
+
+VR_SCALES = ['Familiarity', 'Immersion', 'Self-efficacy']
+
+PERCEPTION_SCALES = GODSPEED_SCALES + VR_SCALES
+
+FACTOR_METHODS = ['efa', 'pca']
+
+# Principal-axis and varimax iteration limits
+PAF_ITERATIONS = 500
+VARIMAX_ITERATIONS = 200
+
+# Tucker congruence thresholds (Lorenzo-Seva & ten Berge, 2006)
+CONGRUENCE_EQUAL, CONGRUENCE_FAIR = 0.95, 0.85
+
+
+def perception_matrix(df, variables=None):
+    """Complete-case numeric matrix of the variables present in df (index kept)"""
+    variables = [v for v in (variables or PERCEPTION_SCALES) if v in df.columns]
+    return df[variables].apply(pd.to_numeric, errors='coerce').astype(float).dropna()
+
+
+def weighted_correlations(X, weights):
+    """Correlation matrices for a (..., n) stack of row weights (e.g. bootstrap counts)"""
+    X = np.asarray(X, dtype=float)
+    n = weights.sum(axis=-1)
+    mean = np.einsum('...n,ni->...i', weights, X) / n[..., None]
+    cross = np.einsum('...n,ni,nj->...ij', weights, X, X, optimize=True)
+    cov = cross / n[..., None, None] - mean[..., :, None] * mean[..., None, :]
+    sd = np.sqrt(np.diagonal(cov, axis1=-2, axis2=-1))
+    with np.errstate(invalid='ignore', divide='ignore'):
+        return cov / (sd[..., :, None] * sd[..., None, :])
+
+
+def parallel_analysis(n, p, n_iter=200, percentile=95, seed=2024):
+    """Percentile of the eigenvalues of random normal (n x p) correlation matrices"""
+    rng = np.random.default_rng(seed)
+    data = rng.standard_normal((n_iter, n, p))
+    data -= data.mean(axis=1, keepdims=True)
+    cov = np.einsum('bni,bnj->bij', data, data)
+    sd = np.sqrt(np.diagonal(cov, axis1=-2, axis2=-1))
+    values = np.linalg.eigvalsh(cov / (sd[:, :, None] * sd[:, None, :]))[:, ::-1]
+    return np.percentile(values, percentile, axis=0)
+
+
+def _orient(loadings):
+    """Order factors by explained variance and make each factor's loadings sum positive"""
+    order = np.argsort(-(loadings ** 2).sum(axis=-2), axis=-1)
+    loadings = np.take_along_axis(loadings, order[..., None, :], axis=-1)
+    return loadings * np.where(loadings.sum(axis=-2, keepdims=True) < 0, -1.0, 1.0)
+
+
+def pca_loadings(R, n_factors):
+    """Principal-component loadings (..., p, m) of a stack of correlation matrices"""
+    values, vectors = np.linalg.eigh(R)
+    values, vectors = values[..., ::-1][..., :n_factors], vectors[..., ::-1][..., :n_factors]
+    return vectors * np.sqrt(np.maximum(values, 0.0))[..., None, :]
+
+
+def principal_axis_loadings(R, n_factors, max_iter=PAF_ITERATIONS, tol=1e-8):
+    """Iterated principal-axis loadings (..., p, m) of a stack of correlation matrices"""
+    eye = np.eye(R.shape[-1], dtype=bool)
+    # Squared multiple correlations as starting communalities
+    communality = 1 - 1 / np.diagonal(np.linalg.pinv(R), axis1=-2, axis2=-1)
+    for _ in range(max_iter):
+        reduced = np.where(eye, communality[..., None] * eye, R)
+        values, vectors = np.linalg.eigh(reduced)
+        values, vectors = values[..., ::-1][..., :n_factors], vectors[..., ::-1][..., :n_factors]
+        loadings = vectors * np.sqrt(np.maximum(values, 0.0))[..., None, :]
+        updated = np.minimum((loadings ** 2).sum(axis=-1), 0.995)
+        if np.max(np.abs(updated - communality)) < tol:
+            break
+        communality = updated
+    return loadings
+
+
+def varimax(loadings, max_iter=VARIMAX_ITERATIONS, tol=1e-8):
+    """Kaiser-normalized varimax rotation of a stack of (..., p, m) loading matrices"""
+    m = loadings.shape[-1]
+    if m < 2:
+        return loadings
+    h = np.sqrt((loadings ** 2).sum(axis=-1, keepdims=True))
+    A = loadings / np.where(h > 0, h, 1.0)
+    rotation = np.broadcast_to(np.eye(m), loadings.shape[:-2] + (m, m)).copy()
+    criterion = np.zeros(loadings.shape[:-2])
+    for _ in range(max_iter):
+        rotated = A @ rotation
+        gradient = np.swapaxes(A, -1, -2) @ (rotated ** 3 - rotated * (rotated ** 2).mean(axis=-2, keepdims=True))
+        u, s, vt = np.linalg.svd(gradient)
+        rotation = u @ vt
+        updated = s.sum(axis=-1)
+        if np.all(updated <= criterion * (1 + tol)):
+            break
+        criterion = updated
+    return (A @ rotation) * h
+
+
+def procrustes_align(loadings, target):
+    """Orthogonally rotate each loading matrix of a stack onto the target loadings"""
+    u, _, vt = np.linalg.svd(np.swapaxes(loadings, -1, -2) @ target)
+    return loadings @ (u @ vt)
+
+
+def tucker_congruence(A, B):
+    """Tucker's congruence coefficient per factor (column) of two loading stacks"""
+    with np.errstate(invalid='ignore', divide='ignore'):
+        return (A * B).sum(axis=-2) / np.sqrt((A ** 2).sum(axis=-2) * (B ** 2).sum(axis=-2))
+
+
+def factor_loadings(R, n_factors, method='efa', rotate=True):
+    """Oriented (and varimax-rotated) loadings of a stack of correlation matrices"""
+    if method not in FACTOR_METHODS:
+        raise ValueError(f"Unknown factor method {method!r}; use one of {FACTOR_METHODS}")
+    loadings = principal_axis_loadings(R, n_factors) if method == 'efa' else pca_loadings(R, n_factors)
+    return _orient(varimax(loadings) if rotate else loadings)
+
+
+def fit_factors(X, n_factors=None, method='efa', rotate=True, seed=2024):
+    """PCA or EFA of the complete-case matrix X (DataFrame)
+
+    n_factors=None takes the number of eigenvalues above the parallel-analysis
+    threshold (at least 1). Returns a dict with the variables, method,
+    n_factors, eigenvalues, parallel-analysis thresholds, loadings (p, m),
+    communalities, the variance explained by each factor, and R.
+    """
+    R = np.corrcoef(X.to_numpy(dtype=float), rowvar=False)
+    eigenvalues = np.linalg.eigvalsh(R)[::-1]
+    thresholds = parallel_analysis(len(X), R.shape[0], seed=seed)
+    if n_factors is None:
+        above = eigenvalues > thresholds
+        n_factors = len(above) if above.all() else max(1, int(np.argmin(above)))
+    loadings = factor_loadings(R, n_factors, method, rotate and n_factors > 1)
+    return {
+        'variables': list(X.columns), 'method': method, 'rotated': rotate and n_factors > 1,
+        'n_factors': n_factors, 'n': len(X), 'R': R,
+        'eigenvalues': eigenvalues, 'parallel_thresholds': thresholds,
+        'loadings': loadings, 'communalities': (loadings ** 2).sum(axis=1),
+        'explained': (loadings ** 2).sum(axis=0) / R.shape[0],
+    }
+
+
+def factor_names(fit):
+    """'F<k>' names of the factors"""
+    return [f'F{k + 1}' for k in range(fit['n_factors'])]
+
+
+def loading_table(fit):
+    """Variables x factors loading table with communalities"""
+    table = pd.DataFrame(fit['loadings'], index=fit['variables'], columns=factor_names(fit))
+    table['communality'] = fit['communalities']
+    return table
+
+
+def factor_scores(X, fit):
+    """Regression (Thurstone) factor scores, or component scores for PCA, aligned to X.index"""
+    Z = X[fit['variables']].to_numpy(dtype=float)
+    Z = (Z - Z.mean(axis=0)) / Z.std(axis=0, ddof=1)
+    weights = np.linalg.solve(fit['R'], fit['loadings'])
+    return pd.DataFrame(Z @ weights, index=X.index, columns=factor_names(fit))
+
+
+def bootstrap_loadings(X, fit, n_boot=1000, ci=0.95, seed=2024, batch_size=500):
+    """Bootstrap SEs and percentile intervals of the loadings
+
+    Resamples are drawn as (B, n) count weights, their correlation matrices
+    are stacked and factored together, and each resampled solution is
+    Procrustes-rotated onto the full-sample loadings before summarizing.
+    """
+    data = X[fit['variables']].to_numpy(dtype=float)
+    n = len(data)
+    rng = np.random.default_rng(seed)
+    samples = []
+    for start in range(0, n_boot, batch_size):
+        size = min(batch_size, n_boot - start)
+        rows = rng.integers(0, n, size=(size, n))
+        weights = np.zeros((size, n))
+        np.add.at(weights, (np.arange(size)[:, None], rows), 1.0)
+        R = weighted_correlations(data, weights)
+        R = R[np.isfinite(R).all(axis=(-2, -1))]
+        loadings = factor_loadings(R, fit['n_factors'], fit['method'], fit['rotated'])
+        samples.append(procrustes_align(loadings, fit['loadings']))
+    samples = np.concatenate(samples)
+    tail = (1 - ci) / 2 * 100
+    low, high = np.percentile(samples, [tail, 100 - tail], axis=0)
+    rows = []
+    for i, variable in enumerate(fit['variables']):
+        for k, factor in enumerate(factor_names(fit)):
+            rows.append({'variable': variable, 'factor': factor, 'loading': fit['loadings'][i, k],
+                         'boot_mean': samples[:, i, k].mean(), 'boot_se': samples[:, i, k].std(ddof=1),
+                         'ci_low': low[i, k], 'ci_high': high[i, k]})
+    table = pd.DataFrame(rows)
+    table.attrs['n_boot'] = len(samples)
+    return table
+
+
+def factor_invariance(X, groups, fit):
+    """Per-condition solutions rotated onto the pooled one, with Tucker congruence
+
+    All condition correlation matrices are factored in one batched pass.
+    Returns one row per condition x factor with n, congruence and its label.
+    """
+    labels = np.asarray(groups, dtype=object)
+    levels = sorted(pd.unique(labels[pd.notna(labels)]), key=str)
+    weights = np.stack([(labels == level).astype(float) for level in levels])
+    n = weights.sum(axis=1)
+    R = weighted_correlations(X[fit['variables']].to_numpy(dtype=float), weights)
+    usable = np.isfinite(R).all(axis=(-2, -1)) & (n > len(fit['variables']))
+    safe = np.where(usable[:, None, None], R, np.eye(R.shape[-1]))
+    loadings = procrustes_align(factor_loadings(safe, fit['n_factors'], fit['method'], fit['rotated']),
+                                fit['loadings'])
+    congruence = np.where(usable[:, None], tucker_congruence(loadings, fit['loadings']), np.nan)
+    rows = []
+    for g, level in enumerate(levels):
+        for k, factor in enumerate(factor_names(fit)):
+            phi = congruence[g, k]
+            rows.append({'condition': level, 'factor': factor, 'n': int(n[g]), 'congruence': phi,
+                         'similarity': ('equal' if phi >= CONGRUENCE_EQUAL else 'fair' if phi >= CONGRUENCE_FAIR
+                                        else 'different' if np.isfinite(phi) else '')})
+    return pd.DataFrame(rows)
@@ -0,0 +1,120 @@
+"""
+Equivalence Testing (Two One-Sided Tests)
+VR Maze Navigation Studies
+
+A non-significant t-test does not show that two conditions are the same.
+TOST (Schuirmann, 1987; Lakens, 2017) tests whether the group difference
+lies inside equivalence bounds [-delta, +delta]:
+
+    H01: diff <= -delta      t_lower = (diff + delta) / se     (upper tail)
+    H02: diff >= +delta      t_upper = (diff - delta) / se     (lower tail)
+    p_TOST = max(p_lower, p_upper); equivalent when p_TOST < alpha
+
+which is the same as the (1 - 2 alpha) CI lying inside the bounds.
+
+Bounds are set per metric family, either in raw units (e.g. 10 points on the
+0-100 trust scales) or as a standardized effect (Cohen's d, converted to raw
+units with the averaged-variance SD used by the scripts). All metric x
+contrast tests are computed in one vectorized pass over the group counts,
+means and SDs, normally taken from the descriptive cube.
+
+Usage:
+    cube = build_descriptive_cube(df)
+    results = equivalence_tests(cube, 'memory_function', [(True, False)],
+                                ['Trust_pre', 'Trust_post', 'compliance_rate'])
+"""
+
+import numpy as np
+import pandas as pd
+from scipy import stats
+
+from descriptive_cube import grouping_block
+from group_tests import ttest_from_stats
+
+# Smallest effect sizes of interest per metric family
+EQUIVALENCE_BOUNDS = {
+    'trust': {'metrics': ['Trust_pre', 'Trust_post', 'trust_difference', 'trust_pre', 'trust_post'],
+              'bound': 10.0, 'scale': 'raw'},
+    'compliance': {'metrics': ['compliance_rate', 'overall_compliance'], 'bound': 10.0, 'scale': 'raw'},
+    'decision_time': {'metrics': ['phase1_mean_time', 'phase2_mean_time', 'decision_time_change',
+                                  'mean_decision_time_overall', 'error_corner_mean_time'],
+                      'bound': 0.5, 'scale': 'd'},
+    'perception': {'metrics': ['Anthropomorphism', 'Animacy', 'Likeability', 'Intelligence',
+                               'Safety', 'Aesthetic'], 'bound': 0.5, 'scale': 'd'},
+    'default': {'metrics': [], 'bound': 0.5, 'scale': 'd'},
+}
+
+
+def metric_bounds(metrics, bounds=None):
+    """(family, bound, scale) arrays for a list of metrics ('default' when unlisted)"""
+    bounds = EQUIVALENCE_BOUNDS if bounds is None else bounds
+    lookup = {m: name for name, spec in bounds.items() for m in spec['metrics']}
+    families = [lookup.get(m, 'default') for m in metrics]
+    return (np.array(families, dtype=object),
+            np.array([bounds[f]['bound'] for f in families], dtype=float),
+            np.array([bounds[f]['scale'] for f in families], dtype=object))
+
+
+def tost_from_stats(n1, mean1, var1, n2, mean2, var2, bound, scale='raw', equal_var=True, alpha=0.05):
+    """Vectorized TOST for (group 1 - group 2) from summary statistics
+
+    bound: equivalence margin delta (raw units, or Cohen's d where scale == 'd');
+    all arguments broadcast. Returns a dict of arrays.
+    """
+    test = ttest_from_stats(n1, mean1, var1, n2, mean2, var2, equal_var=equal_var)
+    diff, se, dof = test['diff'], test['se'], test['df']
+    sd = np.sqrt((np.asarray(var1, dtype=float) + np.asarray(var2, dtype=float)) / 2)
+    delta = np.where(np.asarray(scale) == 'd', np.asarray(bound) * sd, np.asarray(bound, dtype=float))
+    with np.errstate(invalid='ignore', divide='ignore'):
+        t_lower = (diff + delta) / se
+        t_upper = (diff - delta) / se
+    p_lower = stats.t.sf(t_lower, dof)
+    p_upper = stats.t.cdf(t_upper, dof)
+    p_tost = np.maximum(p_lower, p_upper)
+    t_crit = stats.t.ppf(1 - alpha, dof)
+    equivalent = p_tost < alpha
+    different = test['p'] < alpha
+    conclusion = np.where(equivalent & different, 'equivalent and different',
+                          np.where(equivalent, 'equivalent',
+                                   np.where(different, 'different', 'inconclusive')))
+    return {
+        'diff': diff, 'se': se, 'df': dof, 'd': test['d'], 'p_nhst': test['p'],
+        'bound_lower': -delta, 'bound_upper': delta,
+        't_lower': t_lower, 'p_lower': p_lower, 't_upper': t_upper, 'p_upper': p_upper,
+        'p_tost': p_tost,
+        'ci_lower': diff - t_crit * se, 'ci_upper': diff + t_crit * se,
+        'equivalent': equivalent, 'conclusion': conclusion,
+    }
+
+
+def equivalence_tests(cube, grouping, contrasts, metrics, bounds=None, equal_var=True, alpha=0.05):
+    """TOST for every metric x contrast of one grouping, from the descriptive cube
+
+    contrasts: list of (cell_a, cell_b) labels of the grouping; the difference
+    is cell_a - cell_b. Returns one row per contrast x metric; the CI columns
+    are the (1 - 2 alpha) interval matching the TOST decision.
+    """
+    block = grouping_block(cube, grouping)
+    metrics = [m for m in metrics if m in block.columns.get_level_values(0)]
+    first = [a for a, _ in contrasts]
+    second = [b for _, b in contrasts]
+    gather = lambda cells, stat: block.xs(stat, axis=1, level=1)[metrics].reindex(cells).to_numpy(dtype=float)
+    n1, m1, s1 = (gather(first, stat) for stat in ('count', 'mean', 'std'))
+    n2, m2, s2 = (gather(second, stat) for stat in ('count', 'mean', 'std'))
+    families, bound, scale = metric_bounds(metrics, bounds)
+
+    result = tost_from_stats(n1, m1, s1 ** 2, n2, m2, s2 ** 2, bound[None, :], scale[None, :],
+                             equal_var=equal_var, alpha=alpha)
+    n_contrasts, n_metrics = len(contrasts), len(metrics)
+    table = pd.DataFrame({
+        'grouping': grouping if isinstance(grouping, str) else ' x '.join(grouping),
+        'group_a': np.repeat(np.array(first, dtype=object), n_metrics),
+        'group_b': np.repeat(np.array(second, dtype=object), n_metrics),
+        'metric': np.tile(metrics, n_contrasts),
+        'family': np.tile(families, n_contrasts),
+        'bound_scale': np.tile(scale, n_contrasts),
+        'n_a': n1.ravel(), 'n_b': n2.ravel(), 'mean_a': m1.ravel(), 'mean_b': m2.ravel(),
+    })
+    for key, values in result.items():
+        table[key] = np.broadcast_to(values, n1.shape).ravel()
+    return table
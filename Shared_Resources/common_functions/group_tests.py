@@ -0,0 +1,100 @@
+"""
+Vectorized Group Comparison Tests
+
+Array versions of the tests printed throughout the analysis scripts
+(stats.ttest_ind, stats.pearsonr and the averaged-variance Cohen's d).
+Every function works on summary statistics or on arrays with the
+observations along the last axis, so thousands of contrasts (or simulated
+studies) are tested in one call instead of one scipy call per test.
+"""
+
+import numpy as np
+from scipy import stats
+
+
+def significance_stars(p):
+    """Significance marker used in the printed results"""
+    return '***' if p < 0.001 else '**' if p < 0.01 else '*' if p < 0.05 else '†' if p < 0.10 else ''
+
+
+def summary_stats(values, axis=-1):
+    """n, mean and variance (ddof=1) along axis, ignoring NaN"""
+    values = np.asarray(values, dtype=float)
+    valid = ~np.isnan(values)
+    n = valid.sum(axis=axis)
+    filled = np.where(valid, values, 0.0)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        mean = filled.sum(axis=axis) / n
+        dev = np.where(valid, values - np.expand_dims(mean, axis), 0.0)
+        var = (dev ** 2).sum(axis=axis) / (n - 1)
+    return n, mean, var
+
+
+def cohens_d_from_stats(mean1, var1, mean2, var2):
+    """Cohen's d with the averaged-variance pooled SD used in the scripts"""
+    pooled_sd = np.sqrt((np.asarray(var1) + np.asarray(var2)) / 2)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        return np.where(pooled_sd > 0, (np.asarray(mean1) - np.asarray(mean2)) / pooled_sd, 0.0)
+
+
+def ttest_from_stats(n1, mean1, var1, n2, mean2, var2, equal_var=True):
+    """Two-sample t-test from summary statistics (matches stats.ttest_ind)
+
+    Returns a dict of arrays: t, df, p (two-sided), d and the mean difference.
+    """
+    n1, n2 = np.asarray(n1, dtype=float), np.asarray(n2, dtype=float)
+    var1, var2 = np.asarray(var1, dtype=float), np.asarray(var2, dtype=float)
+    diff = np.asarray(mean1) - np.asarray(mean2)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        if equal_var:
+            dof = n1 + n2 - 2
+            pooled = ((n1 - 1) * var1 + (n2 - 1) * var2) / dof
+            se = np.sqrt(pooled * (1 / n1 + 1 / n2))
+        else:
+            a, b = var1 / n1, var2 / n2
+            se = np.sqrt(a + b)
+            dof = (a + b) ** 2 / (a ** 2 / (n1 - 1) + b ** 2 / (n2 - 1))
+        t = diff / se
+    p = 2 * stats.t.sf(np.abs(t), dof)
+    return {'t': t, 'df': dof, 'p': p, 'd': cohens_d_from_stats(mean1, var1, mean2, var2),
+            'diff': diff, 'se': se}
+
+
+def ttest_ind_arrays(a, b, axis=-1, equal_var=True):
+    """Independent-samples t-test along axis for stacked samples (NaN ignored)"""
+    n1, m1, v1 = summary_stats(a, axis=axis)
+    n2, m2, v2 = summary_stats(b, axis=axis)
+    return ttest_from_stats(n1, m1, v1, n2, m2, v2, equal_var=equal_var)
+
+
+def ttest_rel_arrays(a, b, axis=-1):
+    """Paired t-test along axis (pairs with a missing value are dropped)"""
+    diff = np.asarray(a, dtype=float) - np.asarray(b, dtype=float)
+    n, mean, var = summary_stats(diff, axis=axis)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        t = mean / np.sqrt(var / n)
+    p = 2 * stats.t.sf(np.abs(t), n - 1)
+    return {'t': t, 'df': n - 1, 'p': p, 'diff': mean}
+
+
+def pearson_from_moments(n, r):
+    """Two-sided p-value for Pearson r with n observations (matches stats.pearsonr)"""
+    n = np.asarray(n, dtype=float)
+    r = np.clip(np.asarray(r, dtype=float), -1.0, 1.0)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        t = r * np.sqrt((n - 2) / (1 - r ** 2))
+    return 2 * stats.t.sf(np.abs(t), n - 2)
+
+
+def pearsonr_arrays(x, y, axis=-1):
+    """Pearson correlation along axis using pairwise-complete observations"""
+    x, y = np.asarray(x, dtype=float), np.asarray(y, dtype=float)
+    valid = ~(np.isnan(x) | np.isnan(y))
+    n = valid.sum(axis=axis)
+    x0, y0 = np.where(valid, x, 0.0), np.where(valid, y, 0.0)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        mx = np.expand_dims(x0.sum(axis=axis) / n, axis)
+        my = np.expand_dims(y0.sum(axis=axis) / n, axis)
+        dx, dy = np.where(valid, x - mx, 0.0), np.where(valid, y - my, 0.0)
+        r = (dx * dy).sum(axis=axis) / np.sqrt((dx ** 2).sum(axis=axis) * (dy ** 2).sum(axis=axis))
+    return {'r': r, 'p': pearson_from_moments(n, r), 'n': n}
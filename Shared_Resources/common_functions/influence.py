@@ -0,0 +1,177 @@
+"""
+Leave-One-Out Influence Diagnostics
+VR Maze Navigation Studies
+
+With ~23 participants per cell a single participant can carry a finding.
+This module computes the jackknife (leave-one-out) version of every mean
+difference, t, Cohen's d and Pearson r in closed form from each group's
+sufficient statistics, instead of refitting the test n times.
+
+Removing participant i with deviation e_i = x_i - mean from a group of n:
+
+    mean_(-i) = mean - e_i / (n - 1)
+    SS_(-i)   = SS - e_i^2 * n / (n - 1)           (SS = sum of squared deviations)
+
+and for a correlation, with the centred cross-products
+
+    Sxy_(-i)  = Sxy - ex_i * ey_i * n / (n - 1)
+
+so the n leave-one-out statistics of all findings are a handful of array
+operations on the (participant, finding) deviation matrices. A participant
+outside a test's groups, or with a missing value, leaves it unchanged.
+
+Findings use the same dicts as the multiverse module:
+
+    {'name': 'I+MAPK Phase 2 > I-MAPK', 'test': 'ttest', 'outcome': 'phase2_mean_time',
+     'group_col': 'Display', 'groups': ('I+MAPK', 'I-MAPK')}
+    {'name': 'Intelligence x Trust_post', 'test': 'correlation', 'x': 'Intelligence', 'y': 'Trust_post'}
+
+Usage:
+    participants, summary = influence_analysis(df, findings)
+    summary[['finding', 'p', 'max_loo_p', 'n_flips']]
+"""
+
+import numpy as np
+import pandas as pd
+
+from group_tests import pearson_from_moments, ttest_from_stats
+
+
+def loo_group_stats(values, in_group):
+    """Full and leave-one-out n, mean and variance of each column within a group
+
+    values: (n, M) matrix; in_group: (n,) boolean. Returns (full, loo) dicts;
+    full arrays are (M,), loo arrays (n, M) with row i the group without
+    participant i (unchanged where i is not in the group or missing).
+    """
+    valid = ~np.isnan(values) & in_group[:, None]
+    n = valid.sum(axis=0).astype(float)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        mean = np.where(valid, values, 0.0).sum(axis=0) / n
+        dev = np.where(valid, values - mean, 0.0)
+        ss = (dev ** 2).sum(axis=0)
+        n_loo = n - valid
+        mean_loo = mean - dev / (n - 1) * valid
+        ss_loo = ss - dev ** 2 * n / (n - 1) * valid
+        full = {'n': n, 'mean': mean, 'var': ss / (n - 1)}
+        loo = {'n': n_loo, 'mean': mean_loo, 'var': ss_loo / (n_loo - 1), 'removed': valid}
+    return full, loo
+
+
+def loo_ttests(values, labels, first, second, equal_var=True):
+    """Full and leave-one-out two-sample t-tests (first - second) for every column of values"""
+    labels = np.asarray(labels, dtype=object)
+    full_a, loo_a = loo_group_stats(values, labels == first)
+    full_b, loo_b = loo_group_stats(values, labels == second)
+    full = ttest_from_stats(full_a['n'], full_a['mean'], full_a['var'],
+                            full_b['n'], full_b['mean'], full_b['var'], equal_var=equal_var)
+    loo = ttest_from_stats(loo_a['n'], loo_a['mean'], loo_a['var'],
+                           loo_b['n'], loo_b['mean'], loo_b['var'], equal_var=equal_var)
+    full.update(n=full_a['n'] + full_b['n'], n_a=full_a['n'], n_b=full_b['n'])
+    loo['removed'] = loo_a['removed'] | loo_b['removed']
+    return full, loo
+
+
+def loo_correlations(x, y):
+    """Full and leave-one-out Pearson r for every column pair of x and y (pairwise complete)"""
+    valid = ~(np.isnan(x) | np.isnan(y))
+    n = valid.sum(axis=0).astype(float)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        ex = np.where(valid, x - np.where(valid, x, 0.0).sum(axis=0) / n, 0.0)
+        ey = np.where(valid, y - np.where(valid, y, 0.0).sum(axis=0) / n, 0.0)
+        sxx, syy, sxy = (ex ** 2).sum(axis=0), (ey ** 2).sum(axis=0), (ex * ey).sum(axis=0)
+        shrink = n / (n - 1) * valid
+        r = sxy / np.sqrt(sxx * syy)
+        r_loo = (sxy - ex * ey * shrink) / np.sqrt((sxx - ex ** 2 * shrink) * (syy - ey ** 2 * shrink))
+    n_loo = n - valid
+    full = {'r': r, 'p': pearson_from_moments(n, r), 'n': n}
+    loo = {'r': r_loo, 'p': pearson_from_moments(n_loo, r_loo), 'n': n_loo, 'removed': valid}
+    return full, loo
+
+
+def jackknife(full, loo, removed):
+    """Jackknife bias-corrected estimate and standard error over the contributing participants"""
+    n = removed.sum(axis=0)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        loo_mean = np.where(removed, loo, 0.0).sum(axis=0) / n
+        spread = np.where(removed, (loo - loo_mean) ** 2, 0.0).sum(axis=0)
+        return n * full - (n - 1) * loo_mean, np.sqrt((n - 1) / n * spread)
+
+
+def _numeric(df, columns):
+    return df[columns].apply(pd.to_numeric, errors='coerce').to_numpy(dtype=float)
+
+
+def influence_analysis(df, findings, alpha=0.05, id_col='participant_id', equal_var=True):
+    """Leave-one-out diagnostics for all findings at once
+
+    ttest findings report Cohen's d as the estimate, correlations r.
+    Returns (participant_table, summary): one row per finding x contributing
+    participant with the leave-one-out estimate, p and flip flags, and one
+    row per finding with the jackknife estimate / SE and the participants
+    whose removal changes significance at alpha.
+    """
+    ids = df[id_col].to_numpy() if id_col in df.columns else df.index.to_numpy()
+    results = {}
+
+    # t-tests sharing a grouping are batched over their outcomes
+    batches = {}
+    for f in findings:
+        if f['test'] == 'ttest':
+            batches.setdefault((f['group_col'], tuple(f['groups'])), []).append(f)
+    for (group_col, (first, second)), batch in batches.items():
+        labels = df[group_col].to_numpy(dtype=object)
+        full, loo = loo_ttests(_numeric(df, [f['outcome'] for f in batch]), labels, first, second, equal_var)
+        for k, f in enumerate(batch):
+            results[f['name']] = {
+                'full': {key: value[k] for key, value in full.items()},
+                'estimate': loo['d'][:, k], 'diff': loo['diff'][:, k], 'stat': loo['t'][:, k],
+                'p': loo['p'][:, k], 'removed': loo['removed'][:, k],
+                'group': np.where(labels == first, first, second),
+            }
+            results[f['name']]['full'].update(estimate=full['d'][k], stat=full['t'][k])
+
+    correlations = [f for f in findings if f['test'] == 'correlation']
+    if correlations:
+        full, loo = loo_correlations(_numeric(df, [f['x'] for f in correlations]),
+                                     _numeric(df, [f['y'] for f in correlations]))
+        for k, f in enumerate(correlations):
+            results[f['name']] = {
+                'full': {'estimate': full['r'][k], 'diff': np.nan, 'stat': full['r'][k],
+                         'p': full['p'][k], 'n': full['n'][k]},
+                'estimate': loo['r'][:, k], 'diff': np.full(len(df), np.nan), 'stat': loo['r'][:, k],
+                'p': loo['p'][:, k], 'removed': loo['removed'][:, k],
+                'group': np.full(len(df), None, dtype=object),
+            }
+
+    participant_rows, summary_rows = [], []
+    for f in findings:
+        res = results[f['name']]
+        full, removed = res['full'], res['removed']
+        significant = full['p'] < alpha
+        loo_significant = res['p'] < alpha
+        flips = removed & (loo_significant != significant)
+        direction = removed & (np.sign(res['estimate']) != np.sign(full['estimate']))
+        delta = res['estimate'] - full['estimate']
+        for i in np.flatnonzero(removed):
+            participant_rows.append({
+                'finding': f['name'], 'test': f['test'], 'participant': ids[i], 'group': res['group'][i],
+                'estimate': full['estimate'], 'loo_estimate': res['estimate'][i], 'delta_estimate': delta[i],
+                'loo_diff': res['diff'][i], 'loo_statistic': res['stat'][i], 'loo_p': res['p'][i],
+                'flips_significance': bool(flips[i]), 'flips_direction': bool(direction[i]),
+            })
+        jack_estimate, jack_se = jackknife(full['estimate'], res['estimate'], removed)
+        order = np.argsort(-np.where(removed, np.abs(delta), -np.inf))
+        summary_rows.append({
+            'finding': f['name'], 'test': f['test'], 'n': int(full['n']),
+            'estimate': full['estimate'], 'p': full['p'], 'significant': bool(significant),
+            'jackknife_estimate': jack_estimate, 'jackknife_se': jack_se,
+            'min_loo_estimate': np.nanmin(np.where(removed, res['estimate'], np.nan)) if removed.any() else np.nan,
+            'max_loo_estimate': np.nanmax(np.where(removed, res['estimate'], np.nan)) if removed.any() else np.nan,
+            'max_loo_p': np.nanmax(np.where(removed, res['p'], np.nan)) if removed.any() else np.nan,
+            'most_influential': ids[order[0]] if removed.any() else None,
+            'n_flips': int(flips.sum()),
+            'flipping_participants': ', '.join(str(ids[i]) for i in np.flatnonzero(flips)),
+            'n_direction_flips': int(direction.sum()),
+        })
+    return pd.DataFrame(participant_rows), pd.DataFrame(summary_rows)
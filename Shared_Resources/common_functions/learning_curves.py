@@ -0,0 +1,228 @@
+"""
+Per-Participant Learning-Curve Fitting
+VR Maze Navigation Studies
+
+decision_time_change (Phase 2 - Phase 1) reduces learning to one
+difference. This module fits a learning curve to each participant's
+10-corner decision-time series (METRICS_CALCULATION_GUIDE.md section 3.3):
+
+    exponential   T(c) = A + B * exp(-k * (c - 1)) + E * error(c)
+    power         T(c) = A + B * c ** (-k)         + E * error(c)
+
+with A the asymptote, A + B the initial (corner 1) time, k > 0 the learning
+rate and E the extra time at agent-error corners (error(c) = 1 at the
+design's error corners), which treats errors as perturbations of the curve
+instead of part of it. Both curves are A + B * exp(-k * z) with z = c - 1 or
+log c, so they share one fitter.
+
+All participants are fitted simultaneously with a batched Levenberg-Marquardt
+iteration: residuals and Jacobians are stacked into (participant, corner) and
+(participant, corner, parameter) arrays, missing corners are masked out, and
+every step solves all the damped normal equations with one batched
+np.linalg.solve. Starting values come from a grid over k, where the other
+parameters are linear and are solved in closed form for every grid value.
+The rate is fitted on the log scale within RATE_BOUNDS, which keeps it
+positive and the asymptote identifiable for nearly linear series; the
+asymptote is fitted on the log scale too, so it cannot become a negative
+time.
+
+A fit is only reported when it is identified: parameters are NaN when the
+fit did not converge or the rate ended at a RATE_BOUNDS edge (the curve is
+then a line or a step and A and B extrapolate without limit), and the
+initial time and gain are NaN when corner 1 has no observed time.
+
+Usage:
+    fit = fit_learning_curves(times, STUDY1_DESIGN, model='exponential')
+    metrics = learning_curve_metrics(times, STUDY1_DESIGN)       # lc_* columns
+"""
+
+import numpy as np
+
+LEARNING_CURVE_MODELS = ['exponential', 'power']
+
+LEARNING_CURVE_PARAMETERS = ['asymptote', 'initial', 'gain', 'rate', 'error_effect', 'rmse', 'r2']
+
+# Bounds and starting-value grid for the learning rate k. Below the lower
+# bound the curve is indistinguishable from a straight line over 10 corners and
+# A and B drift apart without limit; above the upper bound it is a step.
+RATE_BOUNDS = (0.05, 5.0)
+RATE_GRID = np.geomspace(*RATE_BOUNDS, 40)
+LOG_RATE_BOUNDS = (np.log(RATE_BOUNDS[0]), np.log(RATE_BOUNDS[1]))
+# Distance (log scale) from a bound within which the rate counts as pinned
+RATE_EDGE_TOLERANCE = 1e-3
+
+# Smallest starting asymptote (seconds) when the linear start is not positive
+MIN_START_ASYMPTOTE = 0.1
+
+# Ridge keeping the normal equations solvable (e.g. all error corners missing)
+RIDGE = 1e-8
+
+
+def learning_curve_columns(models=None, model_errors=True):
+    """Names of the lc_* outcome columns"""
+    models = LEARNING_CURVE_MODELS if models is None else models
+    params = [p for p in LEARNING_CURVE_PARAMETERS if model_errors or p != 'error_effect']
+    return [f'lc_{model}_{param}' for model in models for param in params]
+
+
+def _curve_inputs(design, model, model_errors):
+    """Curve abscissa z per corner and the error-corner indicator"""
+    corners = np.arange(1, design['n_corners'] + 1, dtype=float)
+    if model == 'exponential':
+        z = corners - 1
+    elif model == 'power':
+        z = np.log(corners)
+    else:
+        raise ValueError(f"Unknown learning-curve model {model!r}; use one of {LEARNING_CURVE_MODELS}")
+    errors = np.isin(corners, design.get('error_corners') or []).astype(float)
+    return z, errors if model_errors and errors.any() else None
+
+
+def _linear_design(z, errors, rate):
+    """Columns [1, exp(-k z), error] of the model for fixed rates, shape (..., K, P)"""
+    rate = np.asarray(rate, dtype=float)[..., None]
+    columns = [np.ones(np.broadcast_shapes(rate.shape, z.shape)), np.exp(-rate * z)]
+    if errors is not None:
+        columns.append(np.broadcast_to(errors, columns[0].shape))
+    return np.stack(columns, axis=-1)
+
+
+def _masked_lstsq(X, y, mask):
+    """Batched least squares of y on X over the observed corners; returns (beta, rss)"""
+    Xm = X * mask[..., None]
+    ym = np.where(mask, y, 0.0)
+    xtx = np.einsum('...kp,...kq->...pq', Xm, Xm) + RIDGE * np.eye(X.shape[-1])
+    xty = np.einsum('...kp,...k->...p', Xm, ym)
+    beta = np.linalg.solve(xtx, xty[..., None])[..., 0]
+    resid = np.where(mask, y - np.einsum('...kp,...p->...k', X, beta), 0.0)
+    return beta, (resid ** 2).sum(axis=-1)
+
+
+def _starting_values(times, mask, z, errors):
+    """Best grid rate per participant with the linear parameters solved in closed form
+
+    Grid rates with a positive asymptote are preferred; the asymptote enters
+    on the log scale.
+    """
+    X = _linear_design(z, errors, RATE_GRID)                      # (G, K, P)
+    beta, rss = _masked_lstsq(X[None], times[:, None, :], mask[:, None, :])   # (n, G, P), (n, G)
+    positive = beta[..., 0] > 0
+    rss = np.where(positive | ~positive.any(axis=1, keepdims=True), rss, np.inf)
+    best = np.argmin(rss, axis=1)
+    rows = np.arange(len(times))
+    log_asymptote = np.log(np.maximum(beta[rows, best, 0], MIN_START_ASYMPTOTE))
+    return np.column_stack([log_asymptote, beta[rows, best, 1:2], np.log(RATE_GRID[best]),
+                            beta[rows, best, 2:]])
+
+
+def _evaluate(theta, z, errors):
+    """Fitted curves (n, K) and Jacobians (n, K, P) for parameters [log A, B, log k, (E)]"""
+    A, B, log_rate = np.exp(theta[:, 0:1]), theta[:, 1:2], theta[:, 2:3]
+    rate = np.exp(log_rate)
+    h = np.exp(-rate * z)
+    fitted = A + B * h
+    jac = [np.broadcast_to(A, h.shape), h, -B * z * h * rate]
+    if errors is not None:
+        fitted = fitted + theta[:, 3:4] * errors
+        jac.append(np.broadcast_to(errors, h.shape))
+    return fitted, np.stack(jac, axis=-1)
+
+
+def fit_learning_curves(times, design, model='exponential', model_errors=True, max_iter=200, tol=1e-10):
+    """Fit one learning curve per participant (row of times) with batched Levenberg-Marquardt
+
+    Participants need at least (number of parameters + 2) observed corners.
+    Fits that did not converge or whose rate ended at a RATE_BOUNDS edge
+    (rate_at_bound) get NaN parameters and fit statistics, as do participants
+    with too few corners; initial and gain are also NaN when corner 1 is
+    missing. Returns a dict of (n,) arrays: asymptote, gain, rate,
+    error_effect, initial, rss, rmse, r2, n_corners, converged and
+    rate_at_bound.
+    """
+    times = np.asarray(times, dtype=float)
+    z, errors = _curve_inputs(design, model, model_errors)
+    n_params = 3 if errors is None else 4
+    mask = ~np.isnan(times)
+    n_obs = mask.sum(axis=1)
+    usable = n_obs >= n_params + 2
+    y = np.where(mask, times, 0.0)
+
+    theta = np.zeros((len(times), n_params))
+    if usable.any():
+        theta[usable] = _starting_values(times[usable], mask[usable], z, errors)
+    fitted, jac = _evaluate(theta, z, errors)
+    rss = np.where(mask, y - fitted, 0.0) ** 2
+    rss = rss.sum(axis=1)
+    damping = np.full(len(times), 1e-3)
+    active = usable.copy()
+    eye = np.eye(n_params)
+
+    for _ in range(max_iter):
+        if not active.any():
+            break
+        resid = np.where(mask, y - fitted, 0.0)
+        J = jac * mask[..., None]
+        jtj = np.einsum('nkp,nkq->npq', J, J)
+        jtr = np.einsum('nkp,nk->np', J, resid)
+        scaled = jtj + damping[:, None, None] * (jtj * eye) + RIDGE * eye
+        step = np.linalg.solve(scaled, jtr[..., None])[..., 0]
+        candidate = theta + np.where(active[:, None], step, 0.0)
+        candidate[:, 2] = np.clip(candidate[:, 2], *LOG_RATE_BOUNDS)
+        new_fitted, new_jac = _evaluate(candidate, z, errors)
+        new_rss = (np.where(mask, y - new_fitted, 0.0) ** 2).sum(axis=1)
+
+        improved = active & (new_rss < rss)
+        change = np.where(improved, (rss - new_rss) / np.maximum(rss, 1e-12), 0.0)
+        theta = np.where(improved[:, None], candidate, theta)
+        fitted = np.where(improved[:, None], new_fitted, fitted)
+        jac = np.where(improved[:, None, None], new_jac, jac)
+        rss = np.where(improved, new_rss, rss)
+        damping = np.where(improved, damping / 10, damping * 10)
+        # Stop a participant once the fit no longer improves (or damping has exploded)
+        active &= ~((improved & (change < tol)) | (damping > 1e10))
+
+    converged = usable & ~active
+    rate_at_bound = usable & ((theta[:, 2] <= LOG_RATE_BOUNDS[0] + RATE_EDGE_TOLERANCE)
+                              | (theta[:, 2] >= LOG_RATE_BOUNDS[1] - RATE_EDGE_TOLERANCE))
+    identified = converged & ~rate_at_bound
+    with np.errstate(invalid='ignore', divide='ignore'):
+        mean = np.where(mask, times, 0.0).sum(axis=1) / n_obs
+        tss = (np.where(mask, times - mean[:, None], 0.0) ** 2).sum(axis=1)
+        r2 = 1 - rss / tss
+        rmse = np.sqrt(rss / n_obs)
+    nan = lambda values, keep=identified: np.where(keep, values, np.nan)
+    # A + B is only anchored by data when corner 1 itself was observed
+    anchored = identified & mask[:, 0]
+    asymptote = np.exp(theta[:, 0])
+    error_effect = theta[:, 3] if errors is not None else np.zeros(len(times))
+    return {
+        'asymptote': nan(asymptote),
+        'gain': nan(theta[:, 1], anchored),
+        'rate': nan(np.exp(theta[:, 2])),
+        'error_effect': nan(error_effect) if errors is not None else np.full(len(times), np.nan),
+        'initial': nan(asymptote + theta[:, 1] + error_effect * (errors[0] if errors is not None else 0),
+                       anchored),
+        'rss': nan(rss), 'rmse': nan(rmse), 'r2': nan(r2),
+        'n_corners': n_obs, 'converged': converged, 'rate_at_bound': rate_at_bound,
+    }
+
+
+def predicted_times(fit, design, model='exponential'):
+    """Fitted decision time at every corner, shape (n, K), from a fit_learning_curves result"""
+    z, errors = _curve_inputs(design, model, model_errors=True)
+    curve = fit['asymptote'][:, None] + fit['gain'][:, None] * np.exp(-fit['rate'][:, None] * z)
+    if errors is not None and not np.isnan(fit['error_effect']).all():
+        curve = curve + fit['error_effect'][:, None] * errors
+    return curve
+
+
+def learning_curve_metrics(times, design, models=None, model_errors=True):
+    """lc_<model>_<parameter> outcome columns for every participant"""
+    models = LEARNING_CURVE_MODELS if models is None else models
+    metrics = {}
+    for model in models:
+        fit = fit_learning_curves(times, design, model=model, model_errors=model_errors)
+        for param in LEARNING_CURVE_PARAMETERS:
+            if model_errors or param != 'error_effect':
+                metrics[f'lc_{model}_{param}'] = fit[param]
+    return metrics
@@ -0,0 +1,158 @@
+"""
+Bootstrap Mediation Analysis
+VR Maze Navigation Studies
+
+Tests chains such as agent perception -> Trust_post -> compliance_rate for
+many predictor / mediator / outcome combinations at once:
+
+    a  : M ~ X (+ covariates)
+    b  : Y ~ X + M (+ covariates)     (c' is the X coefficient)
+    c  : Y ~ X (+ covariates)         (total effect)
+    indirect effect = a * b
+
+Every regression is solved from the Gram matrix (cross-products) of one
+design matrix holding all variables of the analysis, so the point estimates
+for all combinations come from a single set of sufficient statistics. For
+the bootstrap, one (n_boot, n) matrix of resampled row indices is drawn once
+and shared by every path and combination; each resample's Gram matrix is
+a weighted cross-product, and all resamples of a chunk are solved together
+with batched linear solves. Chunks run on a process pool.
+
+Rows with a missing value on any analysed variable are dropped (complete
+cases), so all combinations use the same participants.
+
+Usage:
+    results = mediation_analysis(df, ['Intelligence', 'Likeability'], ['Trust_post'],
+                                 ['compliance_rate', 'mean_decision_time_overall'])
+"""
+
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import pandas as pd
+from scipy import stats
+
+
+def mediation_combinations(predictors, mediators, outcomes):
+    """All (X, M, Y) triples with three distinct variables"""
+    return [(x, m, y) for x in predictors for m in mediators for y in outcomes
+            if len({x, m, y}) == 3]
+
+
+def bootstrap_indices(n, n_boot, seed=2024):
+    """Shared (n_boot, n) matrix of resampled row indices"""
+    rng = np.random.default_rng(seed)
+    return rng.integers(0, n, size=(n_boot, n))
+
+
+def _index_counts(indices, n):
+    """How often each row appears in each resample, shape (n_boot, n)"""
+    n_boot = len(indices)
+    offsets = (np.arange(n_boot)[:, None] * n + indices).ravel()
+    return np.bincount(offsets, minlength=n_boot * n).reshape(n_boot, n).astype(float)
+
+
+def _solve_paths(gram, combos, covariates):
+    """a, b, c' and c for every combination from (batched) Gram matrices
+
+    gram: (B, p, p) with column 0 = intercept; combos: list of (x, m, y)
+    column indices; covariates: list of covariate column indices.
+    Returns an array (B, n_combos, 4) of a, b, c_prime, c.
+    """
+    base = [0] + list(covariates)
+    paths = np.empty((gram.shape[0], len(combos), 4))
+    for k, (x, m, y) in enumerate(combos):
+        # a and c share the predictor set [1, covariates, X]
+        preds = base + [x]
+        lhs = gram[:, preds][:, :, preds]
+        rhs = gram[:, preds][:, :, [m, y]]
+        coef = np.linalg.solve(lhs, rhs)
+        paths[:, k, 0] = coef[:, -1, 0]
+        paths[:, k, 3] = coef[:, -1, 1]
+        preds = base + [x, m]
+        coef = np.linalg.solve(gram[:, preds][:, :, preds], gram[:, preds, y][..., None])[..., 0]
+        paths[:, k, 1] = coef[:, -1]
+        paths[:, k, 2] = coef[:, -2]
+    return paths
+
+
+def _bootstrap_chunk(task):
+    """Worker: bootstrap paths for one chunk of resamples"""
+    design, indices, combos, covariates = task
+    counts = _index_counts(indices, len(design))
+    gram = np.einsum('bn,ni,nj->bij', counts, design, design, optimize=True)
+    return _solve_paths(gram, combos, covariates)
+
+
+def _ols_standard_errors(gram, n, preds, y):
+    """Coefficients and OLS standard errors from the full-sample Gram matrix"""
+    lhs = gram[np.ix_(preds, preds)]
+    coef = np.linalg.solve(lhs, gram[preds, y])
+    rss = gram[y, y] - coef @ gram[preds, y]
+    sigma2 = rss / (n - len(preds))
+    return coef, np.sqrt(np.diag(sigma2 * np.linalg.inv(lhs)))
+
+
+def mediation_analysis(df, predictors, mediators, outcomes, covariates=None, n_boot=5000,
+                       ci=0.95, n_jobs=None, chunk_size=500, seed=2024):
+    """Indirect effects with percentile bootstrap CIs for all X -> M -> Y combinations
+
+    Returns one row per combination with a, b, c_prime, c and the indirect
+    effect, their bootstrap CIs, the Sobel test and the proportion mediated.
+    """
+    covariates = list(covariates or [])
+    if isinstance(predictors, str):
+        predictors = [predictors]
+    if isinstance(mediators, str):
+        mediators = [mediators]
+    if isinstance(outcomes, str):
+        outcomes = [outcomes]
+    variables = list(dict.fromkeys(list(predictors) + list(mediators) + list(outcomes) + covariates))
+    data = df[variables].apply(pd.to_numeric, errors='coerce').dropna()
+    n = len(data)
+    column = {name: i + 1 for i, name in enumerate(variables)}
+    design = np.column_stack([np.ones(n), data.to_numpy(dtype=float)])
+
+    triples = mediation_combinations(predictors, mediators, outcomes)
+    combos = [(column[x], column[m], column[y]) for x, m, y in triples]
+    cov_cols = [column[c] for c in covariates]
+
+    gram = design.T @ design
+    estimates = _solve_paths(gram[None], combos, cov_cols)[0]
+
+    indices = bootstrap_indices(n, n_boot, seed)
+    tasks = [(design, indices[i:i + chunk_size], combos, cov_cols) for i in range(0, n_boot, chunk_size)]
+    n_jobs = n_jobs or os.cpu_count() or 1
+    if n_jobs == 1:
+        chunks = [_bootstrap_chunk(task) for task in tasks]
+    else:
+        with ProcessPoolExecutor(max_workers=n_jobs) as pool:
+            chunks = list(pool.map(_bootstrap_chunk, tasks))
+    boot = np.concatenate(chunks)                       # (n_boot, n_combos, 4)
+    boot_indirect = boot[..., 0] * boot[..., 1]
+
+    tail = (1 - ci) / 2 * 100
+    rows = []
+    for k, (x, m, y) in enumerate(triples):
+        a, b, c_prime, c = estimates[k]
+        base = [0] + cov_cols
+        a_coef, a_se = _ols_standard_errors(gram, n, base + [column[x]], column[m])
+        b_coef, b_se = _ols_standard_errors(gram, n, base + [column[x], column[m]], column[y])
+        sobel_se = np.sqrt(b ** 2 * a_se[-1] ** 2 + a ** 2 * b_se[-1] ** 2)
+        sobel_z = a * b / sobel_se
+        lower, upper = np.percentile(boot_indirect[:, k], [tail, 100 - tail])
+        path_ci = np.percentile(boot[:, k], [tail, 100 - tail], axis=0)
+        rows.append({
+            'predictor': x, 'mediator': m, 'outcome': y, 'n': n,
+            'a': a, 'a_ci_lower': path_ci[0, 0], 'a_ci_upper': path_ci[1, 0],
+            'b': b, 'b_ci_lower': path_ci[0, 1], 'b_ci_upper': path_ci[1, 1],
+            'c_prime': c_prime, 'c_prime_ci_lower': path_ci[0, 2], 'c_prime_ci_upper': path_ci[1, 2],
+            'c': c, 'c_ci_lower': path_ci[0, 3], 'c_ci_upper': path_ci[1, 3],
+            'indirect': a * b, 'indirect_se': boot_indirect[:, k].std(ddof=1),
+            'indirect_ci_lower': lower, 'indirect_ci_upper': upper,
+            'proportion_mediated': a * b / c if c != 0 else np.nan,
+            'sobel_z': sobel_z, 'sobel_p': 2 * stats.norm.sf(abs(sobel_z)),
+            'significant': bool(lower > 0 or upper < 0),
+        })
+    return pd.DataFrame(rows)
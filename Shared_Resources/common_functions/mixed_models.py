@@ -0,0 +1,280 @@
+"""
+Sparse-Design Linear Mixed Model for Corner-Level Decision Times
+VR Maze Navigation Studies
+
+The scripts collapse the ten corner{c}_decision1_time values into phase means.
+This module keeps every corner decision (long format, one row per participant
+x corner) and fits
+
+    y = X beta + Z b + e,   b_i ~ N(0, sigma^2 L L'),   e ~ N(0, sigma^2 I)
+
+with participant random intercepts (and optionally a random corner or phase
+slope), and corner / phase / error-corner / condition fixed effects.
+
+X is a scipy.sparse matrix and participants enter only through a sparse
+indicator matrix, so the data are reduced once to per-participant blocks
+(Z_i'Z_i, Z_i'X_i, Z_i'y_i). For each value of the relative covariance factor L
+the profiled (RE)ML criterion then only needs a batch of q x q inverses
+(Woodbury identity per participant), which scales linearly in the number of
+participants and never forms a dense N x N or N x n_participants matrix.
+
+Usage:
+    long = corner_long_format(df, STUDY1_DESIGN)
+    fit = fit_corner_mixed_model(long, STUDY1_DESIGN, random_slope='corner')
+    print(fit['fixed_effects'])
+"""
+
+import numpy as np
+import pandas as pd
+from scipy import optimize, sparse, stats
+
+from decision_time_cleaning import trim_times
+from trust_metrics import corner_numbers, corner_times, error_corner_mask, phase1_mask
+
+DEFAULT_TERMS = ['corner', 'phase', 'error_corner', 'condition', 'condition:phase']
+
+
+def corner_long_format(df, design, log_time=True, id_col='participant_id'):
+    """One row per participant x corner decision (trimmed, missing / non-positive times dropped)
+
+    Columns: participant, condition, corner, corner_c (centred), phase2,
+    error_corner, time and y (log time when log_time=True).
+    """
+    times = trim_times(corner_times(df, design['n_corners']), design.get('time_cleaning'))
+    n_part, n_corners = times.shape
+    corners = corner_numbers(design)
+    ids = df[id_col].to_numpy() if id_col in df.columns else df.index.to_numpy()
+
+    long = pd.DataFrame({
+        'participant': np.repeat(ids, n_corners),
+        'condition': np.repeat(df[design['condition_col']].to_numpy(), n_corners),
+        'corner': np.tile(corners, n_part),
+        'corner_c': np.tile(corners - corners.mean(), n_part),
+        'phase2': np.tile((~phase1_mask(design)).astype(float), n_part),
+        'error_corner': np.tile(error_corner_mask(design).astype(float), n_part),
+        'time': times.ravel(),
+    })
+    keep = np.isfinite(long['time']) & (long['time'] > 0 if log_time else True)
+    keep &= long['condition'].isin(design['conditions'])
+    long = long[keep].reset_index(drop=True)
+    long['y'] = np.log(long['time']) if log_time else long['time']
+    return long
+
+
+def _sparse_column(values):
+    """n x 1 sparse column holding the non-zero entries of values"""
+    rows = np.flatnonzero(values)
+    return sparse.coo_matrix((values[rows], (rows, np.zeros(len(rows), dtype=int))), shape=(len(values), 1))
+
+
+def _indicator_columns(codes, values, n_columns):
+    """n x n_columns sparse matrix with values[i] in column codes[i] (rows with code -1 stay empty)"""
+    rows = np.flatnonzero((codes >= 0) & (values != 0))
+    return sparse.coo_matrix((values[rows], (rows, codes[rows])), shape=(len(codes), n_columns))
+
+
+def fixed_effects_matrix(long, design, terms=None):
+    """Sparse fixed-effects design matrix and column names
+
+    terms: any of 'corner' (linear, centred), 'phase', 'error_corner',
+    'condition' (treatment coded against the first condition) and
+    'condition:phase'. An intercept is always included.
+    """
+    terms = DEFAULT_TERMS if terms is None else terms
+    n = len(long)
+    blocks, names = [_sparse_column(np.ones(n))], ['Intercept']
+    if 'corner' in terms:
+        blocks.append(_sparse_column(long['corner_c'].to_numpy(dtype=float)))
+        names.append('corner')
+    if 'phase' in terms:
+        blocks.append(_sparse_column(long['phase2'].to_numpy(dtype=float)))
+        names.append('phase2')
+    if 'error_corner' in terms:
+        blocks.append(_sparse_column(long['error_corner'].to_numpy(dtype=float)))
+        names.append('error_corner')
+    levels = list(design['conditions'])[1:]
+    # Column of each row's condition among the non-reference levels (-1 = reference / other)
+    level_codes = pd.Categorical(long['condition'], categories=levels).codes
+    if 'condition' in terms:
+        blocks.append(_indicator_columns(level_codes, np.ones(n), len(levels)))
+        names.extend(f'condition[{level}]' for level in levels)
+    if 'condition:phase' in terms:
+        blocks.append(_indicator_columns(level_codes, long['phase2'].to_numpy(dtype=float), len(levels)))
+        names.extend(f'condition[{level}]:phase2' for level in levels)
+    X = sparse.hstack(blocks, format='csr')
+    return X, names
+
+
+def random_effects_matrix(long, random_slope=None):
+    """Dense N x q random-effects covariates (intercept and optional slope)"""
+    columns, names = [np.ones(len(long))], ['Intercept']
+    if random_slope == 'corner':
+        columns.append(long['corner_c'].to_numpy(dtype=float))
+        names.append('corner')
+    elif random_slope == 'phase':
+        columns.append(long['phase2'].to_numpy(dtype=float))
+        names.append('phase2')
+    elif random_slope is not None:
+        raise ValueError(f"Unknown random slope {random_slope!r} (use 'corner', 'phase' or None)")
+    return np.column_stack(columns), names
+
+
+def participant_blocks(y, X, Z, groups):
+    """Reduce the data to the per-participant cross-products used by the likelihood
+
+    groups: integer participant codes 0..G-1. Returns global X'X, X'y, y'y and
+    per-participant Z'Z (G, q, q), Z'X (G, q, p) and Z'y (G, q).
+    """
+    X = sparse.csr_matrix(X)
+    n_groups = int(groups.max()) + 1
+    q = Z.shape[1]
+    indicator = sparse.csr_matrix((np.ones(len(y)), (np.arange(len(y)), groups)),
+                                  shape=(len(y), n_groups))
+    indicator_t = indicator.T.tocsr()
+
+    ztz = np.empty((n_groups, q, q))
+    for a in range(q):
+        for b in range(a, q):
+            ztz[:, a, b] = ztz[:, b, a] = indicator_t @ (Z[:, a] * Z[:, b])
+    ztx = np.stack([(indicator_t @ X.multiply(Z[:, [a]]).tocsr()).toarray() for a in range(q)], axis=1)
+    zty = np.column_stack([indicator_t @ (Z[:, a] * y) for a in range(q)])
+
+    return {
+        'xtx': (X.T @ X).toarray(),
+        'xty': X.T @ y,
+        'yty': float(y @ y),
+        'ztz': ztz,
+        'ztx': ztx,
+        'zty': zty,
+        'n_obs': len(y),
+        'n_groups': n_groups,
+    }
+
+
+def _theta_to_factor(theta, q):
+    """Lower-triangular relative covariance factor from its packed parameters"""
+    factor = np.zeros((q, q))
+    factor[np.tril_indices(q)] = theta
+    return factor
+
+
+def _theta_bounds(q):
+    """Non-negative diagonal, unbounded off-diagonal elements of the factor"""
+    rows, cols = np.tril_indices(q)
+    return [(0.0, None) if r == c else (None, None) for r, c in zip(rows, cols)]
+
+
+def _profiled_terms(theta, blocks, q):
+    """Quantities shared by the ML / REML criteria for one value of theta"""
+    factor = _theta_to_factor(theta, q)
+    # A_i = I + L' Z_i'Z_i L, and the Woodbury-reduced cross-products
+    a = np.eye(q) + factor.T @ blocks['ztz'] @ factor
+    a_inv = np.linalg.inv(a)
+    logdet_a = np.linalg.slogdet(a)[1].sum()
+    b = factor.T @ blocks['ztx']
+    c = blocks['zty'] @ factor
+    a_inv_b = a_inv @ b
+    a_inv_c = (a_inv @ c[..., None])[..., 0]
+
+    g = blocks['n_groups']
+    xvx = blocks['xtx'] - b.reshape(g * q, -1).T @ a_inv_b.reshape(g * q, -1)
+    xvy = blocks['xty'] - b.reshape(g * q, -1).T @ a_inv_c.ravel()
+    yvy = blocks['yty'] - c.ravel() @ a_inv_c.ravel()
+    beta = np.linalg.solve(xvx, xvy)
+    rss = max(yvy - beta @ xvy, 1e-300)
+    return {'factor': factor, 'a_inv': a_inv, 'b': b, 'c': c, 'logdet_a': logdet_a,
+            'xvx': xvx, 'beta': beta, 'rss': rss}
+
+
+def _deviance(theta, blocks, q, reml):
+    """Profiled -2 log-likelihood (ML) or -2 restricted log-likelihood (REML)"""
+    terms = _profiled_terms(theta, blocks, q)
+    n, p = blocks['n_obs'], len(terms['beta'])
+    if reml:
+        _, logdet_x = np.linalg.slogdet(terms['xvx'])
+        dof = n - p
+        return terms['logdet_a'] + logdet_x + dof * (1 + np.log(2 * np.pi * terms['rss'] / dof))
+    return terms['logdet_a'] + n * (1 + np.log(2 * np.pi * terms['rss'] / n))
+
+
+def fit_mixed_model(y, X, Z, groups, fixed_names=None, random_names=None, reml=True,
+                    group_labels=None):
+    """Fit a linear mixed model with one grouping factor
+
+    y: (N,) response; X: (N, p) sparse or dense fixed-effects design;
+    Z: (N, q) dense random-effects covariates; groups: (N,) participant labels.
+    Returns a dict with fixed_effects, random_cov, residual_var, random_effects,
+    loglik / aic / bic and convergence information.
+    """
+    y = np.asarray(y, dtype=float)
+    Z = np.asarray(Z, dtype=float)
+    codes, uniques = pd.factorize(np.asarray(groups))
+    group_labels = uniques if group_labels is None else group_labels
+    q = Z.shape[1]
+    p = X.shape[1]
+    fixed_names = fixed_names or [f'x{j}' for j in range(p)]
+    random_names = random_names or [f'z{j}' for j in range(q)]
+
+    blocks = participant_blocks(y, X, Z, codes)
+    start = _theta_to_factor(np.zeros(q * (q + 1) // 2), q)
+    start[np.diag_indices(q)] = 0.5
+    result = optimize.minimize(_deviance, start[np.tril_indices(q)], args=(blocks, q, reml),
+                               method='L-BFGS-B', bounds=_theta_bounds(q))
+
+    terms = _profiled_terms(result.x, blocks, q)
+    n = blocks['n_obs']
+    sigma2 = terms['rss'] / (n - p if reml else n)
+    beta = terms['beta']
+    cov_beta = sigma2 * np.linalg.inv(terms['xvx'])
+    se = np.sqrt(np.diag(cov_beta))
+    z = beta / se
+    crit = stats.norm.ppf(0.975)
+
+    fixed = pd.DataFrame({
+        'coef': beta, 'se': se, 'z': z, 'p': 2 * stats.norm.sf(np.abs(z)),
+        'ci_lower': beta - crit * se, 'ci_upper': beta + crit * se,
+    }, index=fixed_names)
+
+    factor = terms['factor']
+    random_cov = pd.DataFrame(sigma2 * factor @ factor.T, index=random_names, columns=random_names)
+
+    # Conditional modes: u_i = A_i^-1 (c_i - B_i beta), b_i = L u_i
+    u = (terms['a_inv'] @ (terms['c'] - terms['b'] @ beta)[..., None])[..., 0]
+    random_effects = pd.DataFrame(u @ factor.T, index=pd.Index(group_labels, name='participant'),
+                                  columns=random_names)
+
+    deviance = float(result.fun)
+    n_params = p + len(result.x) + 1
+    return {
+        'fixed_effects': fixed,
+        'cov_fixed': pd.DataFrame(cov_beta, index=fixed_names, columns=fixed_names),
+        'random_cov': random_cov,
+        'residual_var': sigma2,
+        'random_effects': random_effects,
+        'theta': result.x,
+        'method': 'REML' if reml else 'ML',
+        'loglik': -deviance / 2,
+        'aic': deviance + 2 * n_params,
+        'bic': deviance + np.log(n) * n_params,
+        'n_obs': n,
+        'n_groups': blocks['n_groups'],
+        'converged': bool(result.success),
+    }
+
+
+def fit_corner_mixed_model(long, design, terms=None, random_slope=None, reml=True):
+    """Mixed model of corner decision times from corner_long_format() output"""
+    X, fixed_names = fixed_effects_matrix(long, design, terms)
+    Z, random_names = random_effects_matrix(long, random_slope)
+    return fit_mixed_model(long['y'].to_numpy(), X, Z, long['participant'].to_numpy(),
+                           fixed_names=fixed_names, random_names=random_names, reml=reml)
+
+
+def likelihood_ratio_test(reduced, full):
+    """LR test between two nested ML fits"""
+    if reduced['method'] != 'ML' or full['method'] != 'ML':
+        raise ValueError("Likelihood ratio tests need models fitted with reml=False")
+    chi2 = 2 * (full['loglik'] - reduced['loglik'])
+    dof = (len(full['fixed_effects']) + len(full['theta'])) \
+        - (len(reduced['fixed_effects']) + len(reduced['theta']))
+    return {'chi2': chi2, 'df': dof, 'p': stats.chi2.sf(max(chi2, 0.0), dof)}
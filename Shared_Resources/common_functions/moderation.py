@@ -0,0 +1,271 @@
+"""
+Condition x Moderator Analysis
+VR Maze Navigation Studies
+
+Tests whether continuous participant characteristics (e.g. Familiarity,
+Immersion, Self-efficacy) moderate a two-level condition effect (memory
+function in Study 1, distance in Study 2):
+
+    Y = b0 + b1 * X + b2 * W + b3 * X * W (+ covariates)
+
+with X = 0 / 1 for the reference / focal condition and W the moderator
+(mean-centred by default). b1 is then the condition effect at the average
+moderator value and b3 the change in that effect per unit of W.
+
+Every moderator / outcome pair has its own complete cases, so the pairs are
+stacked into one (P, n, q) design array with per-pair row weights; the Gram
+matrices of all pairs are formed with a single einsum and all models are
+solved together with one batched inversion. Simple slopes of the
+condition (b1 + b3 * w) and their standard errors are evaluated over a
+(grid x pairs) array, and the Johnson-Neyman boundaries (moderator values
+where the condition effect crosses significance) come from the roots of one
+quadratic per pair.
+
+Usage:
+    fit = fit_moderation_models(df, 'memory_function', ['Familiarity', 'Immersion'],
+                                ['Trust_post', 'compliance_rate'], levels=(False, True))
+    table = moderation_table(fit)          # one row per moderator / outcome
+    curves = simple_slope_grid(fit)        # long format, for plotting
+"""
+
+import numpy as np
+import pandas as pd
+from scipy import stats
+
+COEFFICIENTS = ['intercept', 'condition', 'moderator', 'interaction']
+
+
+def moderation_pairs(moderators, outcomes):
+    """All (moderator, outcome) pairs with two distinct variables"""
+    return [(w, y) for w in moderators for y in outcomes if w != y]
+
+
+def condition_indicator(values, levels=None):
+    """0 / 1 coding of a two-level condition (NaN for any other value)
+
+    levels: (reference, focal); defaults to the two sorted observed values.
+    Returns (indicator, levels).
+    """
+    values = pd.Series(values)
+    if levels is None:
+        levels = tuple(sorted(values.dropna().unique()))
+    if len(levels) != 2:
+        raise ValueError(f"Condition must have exactly two levels, got {list(levels)}")
+    indicator = np.where(values == levels[1], 1.0, np.where(values == levels[0], 0.0, np.nan))
+    return indicator, tuple(levels)
+
+
+def fit_moderation_models(df, condition, moderators, outcomes, levels=None, covariates=None,
+                          center=True):
+    """OLS condition x moderator models for every moderator / outcome pair
+
+    Returns a dict of arrays indexed by pair: coef (P, q), cov (P, q, q),
+    df_resid, r_squared, n and the moderator's mean / SD / range among each
+    pair's complete cases, plus the pair labels and condition levels.
+    """
+    if isinstance(moderators, str):
+        moderators = [moderators]
+    if isinstance(outcomes, str):
+        outcomes = [outcomes]
+    covariates = list(covariates or [])
+    pairs = moderation_pairs(moderators, outcomes)
+
+    x, levels = condition_indicator(df[condition].to_numpy(), levels)
+    numeric = lambda name: pd.to_numeric(df[name], errors='coerce').to_numpy(dtype=float)
+    w = np.stack([numeric(m) for m, _ in pairs])                       # (P, n)
+    y = np.stack([numeric(o) for _, o in pairs])
+    cov_values = np.stack([numeric(c) for c in covariates], axis=1) if covariates else np.empty((len(x), 0))
+
+    valid = ~(np.isnan(w) | np.isnan(y) | np.isnan(x)[None] | np.isnan(cov_values).any(axis=1)[None])
+    weight = valid.astype(float)
+    n = weight.sum(axis=1)
+    w = np.where(valid, w, 0.0)
+    y = np.where(valid, y, 0.0)
+    x = np.where(np.isnan(x), 0.0, x)
+    cov_values = np.where(np.isnan(cov_values), 0.0, cov_values)
+
+    with np.errstate(invalid='ignore', divide='ignore'):
+        w_mean = (weight * w).sum(axis=1) / n
+        w_sd = np.sqrt((weight * (w - w_mean[:, None]) ** 2).sum(axis=1) / (n - 1))
+    w_min = np.where(valid, w, np.inf).min(axis=1)
+    w_max = np.where(valid, w, -np.inf).max(axis=1)
+    shift = w_mean if center else np.zeros(len(pairs))
+    wc = np.where(valid, w - shift[:, None], 0.0)
+
+    n_pairs, n_rows = w.shape
+    design = np.empty((n_pairs, n_rows, 4 + len(covariates)))
+    design[..., 0] = 1.0
+    design[..., 1] = x
+    design[..., 2] = wc
+    design[..., 3] = x * wc
+    design[..., 4:] = cov_values
+    gram = np.einsum('pn,pni,pnj->pij', weight, design, design, optimize=True)
+    xty = np.einsum('pn,pni,pn->pi', weight, design, y, optimize=True)
+
+    # Pairs with too few complete cases (singular Gram matrix) get NaN estimates
+    singular = ~(np.linalg.cond(gram) < 1 / np.finfo(float).eps)
+    gram[singular] = np.eye(design.shape[2])
+    inverse = np.linalg.inv(gram)
+    inverse[singular] = np.nan
+    coef = (inverse @ xty[..., None])[..., 0]
+    df_resid = n - design.shape[2]
+    y_mean = (weight * y).sum(axis=1) / n
+    tss = (weight * y ** 2).sum(axis=1) - n * y_mean ** 2
+    rss = (weight * y ** 2).sum(axis=1) - (coef * xty).sum(axis=1)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        sigma2 = rss / df_resid
+    return {
+        'pairs': pairs, 'condition': condition, 'levels': levels, 'covariates': covariates,
+        'coef': coef, 'cov': sigma2[:, None, None] * inverse, 'df_resid': df_resid, 'n': n,
+        'r_squared': 1 - rss / tss, 'center': shift,
+        'moderator_mean': w_mean, 'moderator_sd': w_sd, 'moderator_min': w_min, 'moderator_max': w_max,
+    }
+
+
+def simple_slopes(fit, values):
+    """Condition effect b1 + b3 * w at raw moderator values
+
+    values: (P,) or (G, P) array in the moderator's original units.
+    Returns (slope, se) with the shape of values.
+    """
+    wc = np.asarray(values, dtype=float) - fit['center']
+    b1, b3 = fit['coef'][:, 1], fit['coef'][:, 3]
+    cov = fit['cov']
+    slope = b1 + b3 * wc
+    var = cov[:, 1, 1] + 2 * wc * cov[:, 1, 3] + wc ** 2 * cov[:, 3, 3]
+    return slope, np.sqrt(np.maximum(var, 0.0))
+
+
+def johnson_neyman(fit, alpha=0.05):
+    """Johnson-Neyman boundaries of the condition effect for every pair
+
+    The effect is significant where (b1 + b3 w)^2 >= t^2 Var(b1 + b3 w), i.e.
+    where A w^2 + B w + C >= 0. Returns (lower, upper, region): the roots in
+    raw moderator units (NaN if not real) and 'inside' / 'outside' for whether
+    the significant region lies between or beyond them ('all' / 'none' when
+    the quadratic has no real roots).
+    """
+    b1, b3 = fit['coef'][:, 1], fit['coef'][:, 3]
+    cov = fit['cov']
+    t2 = stats.t.ppf(1 - alpha / 2, fit['df_resid']) ** 2
+    a = b3 ** 2 - t2 * cov[:, 3, 3]
+    b = 2 * (b1 * b3 - t2 * cov[:, 1, 3])
+    c = b1 ** 2 - t2 * cov[:, 1, 1]
+    disc = b ** 2 - 4 * a * c
+    real = (disc >= 0) & (a != 0)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        root = np.sqrt(np.where(real, disc, np.nan))
+        r1, r2 = (-b - root) / (2 * a), (-b + root) / (2 * a)
+    lower = np.fmin(r1, r2) + fit['center']
+    upper = np.fmax(r1, r2) + fit['center']
+    region = np.where(real, np.where(a < 0, 'inside', 'outside'),
+                      np.where(c >= 0, 'all', 'none'))
+    return lower, upper, region
+
+
+def significant_intervals(lower, upper, region, w_min, w_max):
+    """Johnson-Neyman region of significance within the observed range [w_min, w_max]
+
+    Returns a list of (from, to) intervals; a boundary outside the observed
+    range is replaced by the range limit, so one-sided regions end at
+    w_min / w_max.
+    """
+    if region == 'all':
+        intervals = [(w_min, w_max)]
+    elif region == 'inside':
+        intervals = [(max(lower, w_min), min(upper, w_max))]
+    elif region == 'outside':
+        intervals = [(w_min, min(lower, w_max)), (max(upper, w_min), w_max)]
+    else:
+        intervals = []
+    return [(a, b) for a, b in intervals if a <= b]
+
+
+def describe_intervals(intervals, moderator, w_min, w_max):
+    """Readable region of significance, e.g. 'Familiarity >= 4.16'"""
+    if not intervals:
+        return 'nowhere in the observed range'
+    parts = []
+    for a, b in intervals:
+        if a <= w_min and b >= w_max:
+            parts.append('the whole observed range')
+        elif a <= w_min:
+            parts.append(f'{moderator} <= {b:.2f}')
+        elif b >= w_max:
+            parts.append(f'{moderator} >= {a:.2f}')
+        else:
+            parts.append(f'{a:.2f} <= {moderator} <= {b:.2f}')
+    return ' or '.join(parts)
+
+
+def simple_slope_grid(fit, n_grid=101, alpha=0.05):
+    """Simple slopes with CIs over each pair's observed moderator range (long format)"""
+    steps = np.linspace(0, 1, n_grid)[:, None]
+    grid = fit['moderator_min'] + steps * (fit['moderator_max'] - fit['moderator_min'])   # (G, P)
+    slope, se = simple_slopes(fit, grid)
+    t_crit = stats.t.ppf(1 - alpha / 2, fit['df_resid'])
+    moderators, outcomes = zip(*fit['pairs'])
+    return pd.DataFrame({
+        'moderator': np.tile(moderators, n_grid),
+        'outcome': np.tile(outcomes, n_grid),
+        'moderator_value': grid.ravel(),
+        'slope': slope.ravel(),
+        'se': se.ravel(),
+        'ci_lower': (slope - t_crit * se).ravel(),
+        'ci_upper': (slope + t_crit * se).ravel(),
+        'significant': (np.abs(slope) >= t_crit * se).ravel(),
+    })
+
+
+def moderation_table(fit, alpha=0.05, n_grid=1001):
+    """One row per moderator / outcome pair with coefficients, simple slopes and J-N regions
+
+    jn_lower / jn_upper are the Johnson-Neyman boundaries clipped to the
+    observed moderator range (NaN when the quadratic has no real roots) and
+    jn_significant describes the significant part of that range in words.
+    """
+    coef, cov, dfr = fit['coef'], fit['cov'], fit['df_resid']
+    se = np.sqrt(np.diagonal(cov, axis1=1, axis2=2))
+    with np.errstate(invalid='ignore', divide='ignore'):
+        t = coef / se
+    p = 2 * stats.t.sf(np.abs(t), dfr[:, None])
+    # R^2 change for adding the interaction, from its t statistic
+    delta_r2 = t[:, 3] ** 2 * (1 - fit['r_squared']) / dfr
+
+    mean, sd = fit['moderator_mean'], fit['moderator_sd']
+    probes = np.stack([mean - sd, mean, mean + sd])
+    slope, slope_se = simple_slopes(fit, probes)
+    slope_p = 2 * stats.t.sf(np.abs(slope / slope_se), dfr)
+    lower, upper, region = johnson_neyman(fit, alpha)
+
+    steps = np.linspace(0, 1, n_grid)[:, None]
+    grid = fit['moderator_min'] + steps * (fit['moderator_max'] - fit['moderator_min'])
+    grid_slope, grid_se = simple_slopes(fit, grid)
+    significant = np.abs(grid_slope) >= stats.t.ppf(1 - alpha / 2, dfr) * grid_se
+
+    rows = []
+    for k, (moderator, outcome) in enumerate(fit['pairs']):
+        row = {'moderator': moderator, 'outcome': outcome, 'n': int(fit['n'][k]),
+               'reference': fit['levels'][0], 'focal': fit['levels'][1]}
+        for j, name in enumerate(COEFFICIENTS):
+            row.update({f'b_{name}': coef[k, j], f'se_{name}': se[k, j],
+                        f't_{name}': t[k, j], f'p_{name}': p[k, j]})
+        row.update({'r_squared': fit['r_squared'][k], 'delta_r_squared_interaction': delta_r2[k]})
+        for i, label in enumerate(['low', 'mean', 'high']):
+            row.update({f'slope_{label}': slope[i, k], f'slope_{label}_se': slope_se[i, k],
+                        f'slope_{label}_p': slope_p[i, k]})
+        w_min, w_max = fit['moderator_min'][k], fit['moderator_max'][k]
+        intervals = significant_intervals(lower[k], upper[k], region[k], w_min, w_max)
+        row.update({'jn_lower': np.clip(lower[k], w_min, w_max), 'jn_upper': np.clip(upper[k], w_min, w_max),
+                    'jn_region': region[k],
+                    'jn_significant': describe_intervals(intervals, moderator, w_min, w_max),
+                    'percent_range_significant': 100 * significant[:, k].mean()})
+        rows.append(row)
+    return pd.DataFrame(rows)
+
+
+def moderation_analysis(df, condition, moderators, outcomes, levels=None, covariates=None,
+                        center=True, alpha=0.05):
+    """Fit all condition x moderator models and return the summary table"""
+    fit = fit_moderation_models(df, condition, moderators, outcomes, levels, covariates, center)
+    return moderation_table(fit, alpha)
@@ -0,0 +1,247 @@
+"""
+Multiple Imputation by Chained Equations
+VR Maze Navigation Studies
+
+Replaces listwise / pairwise deletion of missing corner times and
+questionnaire scores with M imputed datasets whose analyses are pooled with
+Rubin's rules, so every test uses all participants.
+
+Imputation model (van Buuren's MICE): every incomplete variable is regressed
+on all other variables in turn, for n_iter sweeps, with
+
+    'pmm'   predictive mean matching (default): a missing value is copied
+            from one of the `donors` observed cases with the closest predicted
+            value, so imputations stay within the observed range (positive
+            times, scale bounds)
+    'norm'  Bayesian linear regression draws
+
+Coefficients are drawn from their posterior in every step, so the spread
+between the imputed datasets reflects the imputation uncertainty.
+
+The M chains are independent and run on a process pool. Instead of M
+DataFrame copies, the store keeps the observed matrix once and only the
+imputed cells: an (M, n_missing) float64 np.memmap on disk that every
+worker writes its row into. imputed_dataset() rebuilds any single dataset
+on demand.
+
+Usage:
+    store = mice_impute(df, ['corner1_decision1_time', ..., 'Likeability'], m=20)
+    pooled = pooled_analysis(store, df, lambda d: correlation_estimates(d, [('Likeability', 'Trust_post')]))
+"""
+
+import json
+import os
+import tempfile
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import pandas as pd
+from scipy import stats
+
+from group_tests import ttest_ind_arrays
+
+# Ridge added to the normal equations so near-collinear predictors stay solvable
+RIDGE = 1e-5
+
+
+def _draw_regression(X, y, rng):
+    """Posterior draw of (beta, sigma) for y ~ X plus the least-squares beta"""
+    n, q = X.shape
+    xtx = X.T @ X + RIDGE * np.eye(q)
+    chol = np.linalg.cholesky(np.linalg.inv(xtx))
+    beta_hat = np.linalg.solve(xtx, X.T @ y)
+    rss = np.sum((y - X @ beta_hat) ** 2)
+    sigma = np.sqrt(rss / rng.chisquare(max(n - q, 1)))
+    beta = beta_hat + sigma * chol @ rng.standard_normal(q)
+    return beta_hat, beta, sigma
+
+
+def _impute_chain(data, missing, n_iter, method, donors, rng):
+    """One chained-equations run; returns the completed (n, p) matrix"""
+    data = data.copy()
+    n, p = data.shape
+    observed = ~missing
+    targets = [j for j in range(p) if missing[:, j].any() and observed[:, j].sum() > 1]
+
+    # Start from random draws of each variable's observed values
+    for j in targets:
+        pool = data[observed[:, j], j]
+        data[missing[:, j], j] = rng.choice(pool, size=missing[:, j].sum())
+
+    for _ in range(n_iter):
+        for j in targets:
+            others = np.delete(data, j, axis=1)
+            others = others[:, ~np.isnan(others).any(axis=0)]
+            X = np.column_stack([np.ones(n), others])
+            obs, mis = observed[:, j], missing[:, j]
+            beta_hat, beta, sigma = _draw_regression(X[obs], data[obs, j], rng)
+            if method == 'pmm':
+                fitted_obs = X[obs] @ beta_hat
+                fitted_mis = X[mis] @ beta
+                k = min(donors, obs.sum())
+                distance = np.abs(fitted_mis[:, None] - fitted_obs[None, :])
+                nearest = np.argpartition(distance, k - 1, axis=1)[:, :k]
+                chosen = nearest[np.arange(len(nearest)), rng.integers(0, k, size=len(nearest))]
+                data[mis, j] = data[obs, j][chosen]
+            else:
+                data[mis, j] = X[mis] @ beta + sigma * rng.standard_normal(mis.sum())
+    return data
+
+
+def _impute_worker(task):
+    """Worker: run chain m and write its imputed cells into the memory-mapped store"""
+    data, m, n_imputations, n_iter, method, donors, seed, values_path = task
+    missing = np.isnan(data)
+    completed = _impute_chain(data, missing, n_iter, method, donors, np.random.default_rng(seed))
+    values = np.memmap(values_path, dtype=np.float64, mode='r+',
+                       shape=(n_imputations, int(missing.sum())))
+    values[m] = completed[missing]
+    values.flush()
+    del values
+    return m
+
+
+def mice_impute(df, columns, m=20, n_iter=10, method='pmm', donors=5, n_jobs=None, seed=2024,
+                path=None):
+    """Create M imputed datasets for the given numeric columns
+
+    Returns the store dict (see load_imputations); files are written to path
+    (default: a new temporary directory).
+    """
+    if method not in ('pmm', 'norm'):
+        raise ValueError(f"Unknown imputation method {method!r}; use 'pmm' or 'norm'")
+    columns = list(columns)
+    data = df[columns].apply(pd.to_numeric, errors='coerce').to_numpy(dtype=float)
+    missing = np.isnan(data)
+    path = path or tempfile.mkdtemp(prefix='mice_')
+    os.makedirs(path, exist_ok=True)
+
+    np.save(os.path.join(path, 'observed.npy'), data)
+    values_path = os.path.join(path, 'imputed_values.dat')
+    values = np.memmap(values_path, dtype=np.float64, mode='w+', shape=(m, max(int(missing.sum()), 1)))
+    del values
+    with open(os.path.join(path, 'store.json'), 'w') as f:
+        json.dump({'columns': columns, 'm': m, 'n_missing': int(missing.sum()), 'method': method,
+                   'n_iter': n_iter}, f)
+
+    if missing.any():
+        seeds = np.random.SeedSequence(seed).spawn(m)
+        tasks = [(data, i, m, n_iter, method, donors, seeds[i], values_path) for i in range(m)]
+        n_jobs = n_jobs or os.cpu_count() or 1
+        if n_jobs == 1:
+            for task in tasks:
+                _impute_worker(task)
+        else:
+            with ProcessPoolExecutor(max_workers=n_jobs) as pool:
+                list(pool.map(_impute_worker, tasks))
+    return load_imputations(path)
+
+
+def load_imputations(path):
+    """Open an imputation store: observed matrix, missing mask and read-only imputed values"""
+    with open(os.path.join(path, 'store.json')) as f:
+        meta = json.load(f)
+    observed = np.load(os.path.join(path, 'observed.npy'))
+    values = np.memmap(os.path.join(path, 'imputed_values.dat'), dtype=np.float64, mode='r',
+                       shape=(meta['m'], max(meta['n_missing'], 1)))
+    return dict(meta, path=path, observed=observed, missing=np.isnan(observed), values=values)
+
+
+def imputed_matrix(store, m):
+    """Completed (n, p) matrix of imputation m"""
+    data = store['observed'].copy()
+    if store['n_missing']:
+        data[store['missing']] = store['values'][m]
+    return data
+
+
+def imputed_dataset(store, m, df=None):
+    """Imputation m as a DataFrame (or df with the imputed columns replaced)"""
+    data = imputed_matrix(store, m)
+    if df is None:
+        return pd.DataFrame(data, columns=store['columns'])
+    completed = df.copy()
+    completed[store['columns']] = data
+    return completed
+
+
+def rubin_pool(estimates, variances, df_complete=None, ci=0.95):
+    """Pool (M, K) estimates and sampling variances with Rubin's rules
+
+    Degrees of freedom use the Barnard-Rubin small-sample adjustment when
+    df_complete (complete-data df, scalar or (K,)) is given.
+    """
+    q = np.asarray(estimates, dtype=float)
+    u = np.asarray(variances, dtype=float)
+    m = q.shape[0]
+    q_bar, u_bar = q.mean(axis=0), u.mean(axis=0)
+    between = q.var(axis=0, ddof=1)
+    total = u_bar + (1 + 1 / m) * between
+    dfc = np.inf if df_complete is None else np.asarray(df_complete, dtype=float)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        riv = (1 + 1 / m) * between / u_bar
+        lam = (1 + 1 / m) * between / total
+        dof_old = (m - 1) / lam ** 2
+        dof_obs = np.where(np.isfinite(dfc), (dfc + 1) / (dfc + 3) * dfc * (1 - lam), np.inf)
+        dof = 1 / (1 / dof_old + 1 / dof_obs)
+        fmi = (riv + 2 / (dof + 3)) / (riv + 1)
+        se = np.sqrt(total)
+        t = q_bar / se
+    t_crit = stats.t.ppf(1 - (1 - ci) / 2, dof)
+    return {'estimate': q_bar, 'se': se, 'within_var': u_bar, 'between_var': between,
+            'df': dof, 't': t, 'p': 2 * stats.t.sf(np.abs(t), dof),
+            'ci_lower': q_bar - t_crit * se, 'ci_upper': q_bar + t_crit * se,
+            'riv': riv, 'fmi': fmi}
+
+
+def group_difference_estimates(df, group_col, levels, outcomes, labels=None):
+    """Mean difference (levels[1] - levels[0]) per outcome, for use with pooled_analysis
+
+    labels: optional display names for the two levels used in the row names.
+    """
+    labels = labels or levels
+    rows = []
+    for outcome in outcomes:
+        values = pd.to_numeric(df[outcome], errors='coerce').to_numpy(dtype=float)
+        focal = values[(df[group_col] == levels[1]).to_numpy()]
+        reference = values[(df[group_col] == levels[0]).to_numpy()]
+        test = ttest_ind_arrays(focal, reference)
+        rows.append({'name': f'{outcome}: {labels[1]} - {labels[0]}', 'estimate': float(test['diff']),
+                     'variance': float(test['se']) ** 2, 'df_complete': float(test['df'])})
+    return rows
+
+
+def correlation_estimates(df, pairs):
+    """Fisher-z correlations for (x, y) pairs, for use with pooled_analysis"""
+    rows = []
+    for x, y in pairs:
+        data = df[[x, y]].apply(pd.to_numeric, errors='coerce').dropna()
+        r = np.corrcoef(data[x], data[y])[0, 1]
+        rows.append({'name': f'{x} ~ {y}', 'estimate': np.arctanh(r), 'variance': 1 / (len(data) - 3),
+                     'df_complete': np.inf, 'scale': 'fisher_z'})
+    return rows
+
+
+def pooled_analysis(store, df, analysis, ci=0.95):
+    """Run analysis on every imputed dataset and pool with Rubin's rules
+
+    analysis(dataset) returns a list of dicts with 'name', 'estimate',
+    'variance' and optionally 'df_complete' and 'scale' ('fisher_z' rows are
+    pooled on the z scale; their estimate and CI are back-transformed to r,
+    while se, t and p stay on the z scale). The analysis sees df with the
+    imputed columns replaced.
+    """
+    runs = [analysis(imputed_dataset(store, m, df)) for m in range(store['m'])]
+    names = [row['name'] for row in runs[0]]
+    estimates = np.array([[row['estimate'] for row in run] for run in runs])
+    variances = np.array([[row['variance'] for row in run] for run in runs])
+    dfc = np.array([row.get('df_complete', np.inf) for row in runs[0]], dtype=float)
+    pooled = rubin_pool(estimates, variances, dfc, ci)
+
+    result = pd.DataFrame({'name': names, **pooled})
+    fisher = np.array([row.get('scale') == 'fisher_z' for row in runs[0]])
+    for col in ('estimate', 'ci_lower', 'ci_upper'):
+        result[col] = np.where(fisher, np.tanh(result[col]), result[col])
+    result.insert(1, 'scale', np.where(fisher, 'r', 'raw'))
+    result['m'] = store['m']
+    return result
@@ -0,0 +1,312 @@
+"""
+Multiverse / Specification-Curve Analysis
+VR Maze Navigation Studies
+
+Many results depend on analytic choices fixed in the scripts: which corners
+count as agent errors, where Phase 1 ends, how decision times are trimmed,
+whether participants with missing corners keep their remaining-corner means,
+the len(data) > 5 rule for reporting a correlation and the text_length > 10
+filter for open-ended responses. This module runs the metric + test pipeline
+for every combination of such choices (a "universe") and returns one result
+row per analysis x universe, from which the specification curve is drawn.
+
+A choice grid is a dict of dimension -> options:
+
+    time_cleaning        name -> cleaning configuration (decision_time_cleaning)
+    missing_corners      'available' (mean over the remaining corners) or
+                         'complete' (time metrics only for participants with
+                         all corner times after cleaning)
+    phase1_last_corner   last corner of Phase 1
+    error_corners        tuple of agent error corners
+    min_correlation_n    a correlation is reported only when n > this value
+    min_text_length      responses must be longer than this many characters
+
+Work is shared between universes that differ only downstream:
+
+    - an analysis only varies over the dimensions that can change it (e.g. a
+      Likeability ~ Trust_post correlation does not depend on the phase
+      split), so duplicate universes are never computed
+    - cleaned time matrices are cached per (cleaning, missing) and the time
+      metrics per pipeline key, inside each worker process
+    - the downstream dimensions (min_correlation_n, min_text_length) are
+      stacked along a leading array axis and tested in one vectorized call
+
+Pipeline keys are distributed over a process pool in cleaning order, so
+neighbouring tasks reuse the same cached time matrix.
+
+Usage:
+    analyses = [{'name': 'Memory -> decision_time_change', 'test': 'ttest',
+                 'outcome': 'decision_time_change', 'group_col': 'memory_function',
+                 'groups': (True, False)},
+                {'name': 'Likeability ~ Trust_post', 'test': 'correlation',
+                 'x': 'Likeability', 'y': 'Trust_post'}]
+    results = run_multiverse(df, analyses)
+    curve = specification_curve(results, 'Memory -> decision_time_change')
+    summary = multiverse_summary(results)
+"""
+
+import itertools
+import math
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import pandas as pd
+
+from decision_time_cleaning import STUDY1_TIME_CLEANING, clean_times
+from group_tests import pearsonr_arrays, ttest_ind_arrays
+from trust_metrics import STUDY1_DESIGN, TIME_METRICS, corner_times, time_metrics
+
+STUDY1_MULTIVERSE = {
+    'time_cleaning': {
+        'raw': None,
+        'max60': STUDY1_TIME_CLEANING,
+        'max60_mad3.5': dict(STUDY1_TIME_CLEANING, rule='mad', threshold=3.5),
+        'max60_mad2.5': dict(STUDY1_TIME_CLEANING, rule='mad', threshold=2.5),
+        'max60_log': dict(STUDY1_TIME_CLEANING, transform='log'),
+    },
+    'missing_corners': ['available', 'complete'],
+    'phase1_last_corner': [4, 5, 6],
+    'error_corners': [(3, 7, 9), (3, 7), (3, 9), (7, 9)],
+    'min_correlation_n': [5, 10, 20],
+    'min_text_length': [0, 10, 20],
+}
+
+# The choices made in the analysis scripts
+STUDY1_REPORTED = {
+    'time_cleaning': 'max60',
+    'missing_corners': 'available',
+    'phase1_last_corner': 5,
+    'error_corners': (3, 7, 9),
+    'min_correlation_n': 5,
+    'min_text_length': 10,
+}
+
+PIPELINE_DIMENSIONS = ['time_cleaning', 'missing_corners', 'phase1_last_corner', 'error_corners']
+DOWNSTREAM_DIMENSIONS = ['min_correlation_n', 'min_text_length']
+DIMENSIONS = PIPELINE_DIMENSIONS + DOWNSTREAM_DIMENSIONS
+
+PHASE_METRICS = ['phase1_mean_time', 'phase2_mean_time', 'decision_time_change']
+
+# Base arrays and per-process stage caches for the workers
+_MULTIVERSE_CACHE = {}
+
+
+def analysis_variables(analysis):
+    """Variables an analysis reads ('word_count' for text analyses)"""
+    if analysis['test'] == 'correlation':
+        return [analysis['x'], analysis['y']]
+    return [analysis['outcome']]
+
+
+def relevant_dimensions(analysis):
+    """Choice dimensions that can change the result of an analysis"""
+    variables = analysis_variables(analysis)
+    dims = []
+    if any(v in TIME_METRICS for v in variables):
+        dims += ['time_cleaning', 'missing_corners']
+        if any(v in PHASE_METRICS for v in variables):
+            dims.append('phase1_last_corner')
+        if 'error_corner_mean_time' in variables:
+            dims.append('error_corners')
+    if analysis['test'] == 'correlation':
+        dims.append('min_correlation_n')
+    if analysis.get('text_col') is not None:
+        dims.append('min_text_length')
+    return dims
+
+
+def specification_grid(choices=None):
+    """Every universe of a choice grid, one row per combination"""
+    choices = STUDY1_MULTIVERSE if choices is None else choices
+    options = [list(choices[d]) for d in DIMENSIONS]
+    grid = pd.DataFrame(list(itertools.product(*options)), columns=DIMENSIONS)
+    grid.insert(0, 'universe', np.arange(len(grid)))
+    return grid
+
+
+def multiverse_inputs(df, analyses, design=STUDY1_DESIGN):
+    """Arrays shared by every universe: raw corner times, analysis variables, groups, text"""
+    times = corner_times(df, design['n_corners'])
+    columns = {}
+    for analysis in analyses:
+        for v in analysis_variables(analysis):
+            if v not in TIME_METRICS and v != 'word_count' and v in df.columns:
+                columns[v] = pd.to_numeric(df[v], errors='coerce').to_numpy(dtype=float)
+    groups, text = {}, {}
+    for analysis in analyses:
+        if analysis['test'] == 'ttest':
+            groups[analysis['group_col']] = df[analysis['group_col']].to_numpy(dtype=object)
+        if analysis.get('text_col') is not None and analysis['text_col'] in df.columns:
+            responses = df[analysis['text_col']].fillna('').astype(str)
+            text[analysis['text_col']] = (responses.str.len().to_numpy(dtype=float),
+                                          responses.str.split().str.len().to_numpy(dtype=float))
+    return {'times': times, 'columns': columns, 'groups': groups, 'text': text, 'design': design}
+
+
+def _init_worker(inputs, analyses, choices):
+    """Store the shared arrays once per worker process and reset the stage caches"""
+    _MULTIVERSE_CACHE.clear()
+    _MULTIVERSE_CACHE.update(inputs=inputs, analyses=analyses, choices=choices,
+                             cleaned={}, metrics={})
+
+
+def _cleaned_times(cleaning, missing):
+    """Stage 1: cleaned time matrix, cached per (cleaning, missing)"""
+    key = (cleaning, missing)
+    cache = _MULTIVERSE_CACHE['cleaned']
+    if key not in cache:
+        times = clean_times(_MULTIVERSE_CACHE['inputs']['times'],
+                            _MULTIVERSE_CACHE['choices']['time_cleaning'][cleaning])
+        if missing == 'complete':
+            times[np.isnan(times).any(axis=1)] = np.nan
+        cache[key] = times
+    return cache[key]
+
+
+def _pipeline_metrics(key):
+    """Stage 2: time metrics for a pipeline key, cached"""
+    cache = _MULTIVERSE_CACHE['metrics']
+    if key not in cache:
+        cleaning, missing, phase_end, errors = key
+        design = dict(_MULTIVERSE_CACHE['inputs']['design'], phase1_last_corner=phase_end,
+                      error_corners=list(errors))
+        cache[key] = time_metrics(_cleaned_times(cleaning, missing), design)
+    return cache[key]
+
+
+def _variable(name, metrics, analysis):
+    inputs = _MULTIVERSE_CACHE['inputs']
+    if name in metrics:
+        return metrics[name]
+    if name == 'word_count':
+        return inputs['text'][analysis['text_col']][1]
+    return inputs['columns'][name]
+
+
+def _run_pipeline_key(task):
+    """Worker: every analysis x downstream universe sharing one pipeline key"""
+    key, jobs = task
+    analyses = _MULTIVERSE_CACHE['analyses']
+    inputs = _MULTIVERSE_CACHE['inputs']
+    metrics = _pipeline_metrics(key) if key is not None else {}
+    rows = []
+    for index, downstream in jobs:
+        analysis = analyses[index]
+        # Dimensions that do not apply to the analysis are None (NaN here)
+        min_n = np.array([d['min_correlation_n'] for d in downstream], dtype=float)
+        min_text = np.array([d['min_text_length'] for d in downstream], dtype=float)
+        n = len(inputs['times'])
+        # (D, n) sample masks, one row per downstream universe
+        keep = np.ones((len(downstream), n), dtype=bool)
+        if analysis.get('text_col') is not None:
+            keep &= inputs['text'][analysis['text_col']][0][None, :] > min_text[:, None]
+
+        if analysis['test'] == 'correlation':
+            x = np.where(keep, _variable(analysis['x'], metrics, analysis)[None, :], np.nan)
+            y = np.where(keep, _variable(analysis['y'], metrics, analysis)[None, :], np.nan)
+            test = pearsonr_arrays(x, y)
+            reported = test['n'] > min_n
+            estimate = np.where(reported, test['r'], np.nan)
+            p = np.where(reported, test['p'], np.nan)
+            result = {'estimate': estimate, 'p': p, 'n': test['n'], 'n_a': np.full(len(downstream), np.nan),
+                      'n_b': np.full(len(downstream), np.nan), 'diff': estimate}
+        else:
+            values = np.where(keep, _variable(analysis['outcome'], metrics, analysis)[None, :], np.nan)
+            labels = inputs['groups'][analysis['group_col']]
+            first, second = analysis['groups']
+            a = np.where(labels == first, values, np.nan)
+            b = np.where(labels == second, values, np.nan)
+            test = ttest_ind_arrays(a, b)
+            n_a, n_b = (~np.isnan(a)).sum(axis=-1), (~np.isnan(b)).sum(axis=-1)
+            result = {'estimate': test['d'], 'p': test['p'], 'n': n_a + n_b, 'n_a': n_a, 'n_b': n_b,
+                      'diff': test['diff']}
+        for d, spec in enumerate(downstream):
+            rows.append(dict(spec, analysis=analysis['name'], test=analysis['test'],
+                             **{k: float(v[d]) for k, v in result.items()}))
+    return rows
+
+
+def _pipeline_key(universe, dims, reported):
+    """Pipeline stage key; dimensions irrelevant to the analysis take the reported choice"""
+    if not any(d in PIPELINE_DIMENSIONS for d in dims):
+        return None
+    return tuple(universe[d] if d in dims else reported[d] for d in PIPELINE_DIMENSIONS)
+
+
+def run_multiverse(df, analyses, choices=None, reported=None, design=STUDY1_DESIGN,
+                   alpha=0.05, n_jobs=None):
+    """Run every analysis in every distinct universe of the choice grid
+
+    Each analysis is evaluated once per combination of its relevant
+    dimensions; the other dimensions are reported as None. ttest estimates are
+    Cohen's d (comparable across time transforms), correlation estimates r.
+    Returns one row per analysis x distinct universe, with is_reported marking
+    the universe matching the scripts' choices.
+    """
+    choices = STUDY1_MULTIVERSE if choices is None else choices
+    reported = STUDY1_REPORTED if reported is None else reported
+    grid = specification_grid(choices)
+    inputs = multiverse_inputs(df, analyses, design)
+
+    # Distinct universes per analysis, grouped by pipeline key
+    tasks = {}
+    for index, analysis in enumerate(analyses):
+        dims = relevant_dimensions(analysis)
+        distinct = grid[dims].drop_duplicates() if dims else grid.iloc[:1][[]]
+        for universe in distinct.to_dict('records'):
+            spec = {d: universe.get(d) for d in DIMENSIONS}
+            tasks.setdefault(_pipeline_key(universe, dims, reported), {}).setdefault(index, []).append(spec)
+    ordered = sorted(tasks, key=lambda k: (k is not None, str(k)))
+    task_list = [(key, [(index, specs) for index, specs in tasks[key].items()]) for key in ordered]
+
+    n_jobs = n_jobs or os.cpu_count() or 1
+    if n_jobs == 1 or len(task_list) == 1:
+        _init_worker(inputs, analyses, choices)
+        chunks = [_run_pipeline_key(task) for task in task_list]
+    else:
+        chunksize = max(1, math.ceil(len(task_list) / (4 * n_jobs)))
+        with ProcessPoolExecutor(max_workers=n_jobs, initializer=_init_worker,
+                                 initargs=(inputs, analyses, choices)) as pool:
+            chunks = list(pool.map(_run_pipeline_key, task_list, chunksize=chunksize))
+
+    rows = [row for chunk in chunks for row in chunk]
+    results = pd.DataFrame(rows)
+    # Keep the choices as given (None where a dimension does not apply)
+    for d in DIMENSIONS:
+        results[d] = pd.Series([row[d] for row in rows], dtype=object)
+    results['is_reported'] = [all(row[d] is None or row[d] == reported[d] for d in DIMENSIONS)
+                              for row in rows]
+    results['significant'] = results['p'] < alpha
+    order = ['analysis', 'test'] + DIMENSIONS + ['estimate', 'diff', 'p', 'significant',
+                                                 'n', 'n_a', 'n_b', 'is_reported']
+    return results[order].reset_index(drop=True)
+
+
+def specification_curve(results, analysis):
+    """Universes of one analysis ranked by estimate (the specification curve)"""
+    curve = results[(results['analysis'] == analysis) & results['estimate'].notna()]
+    curve = curve.sort_values('estimate').reset_index(drop=True)
+    curve.insert(0, 'rank', np.arange(1, len(curve) + 1))
+    return curve
+
+
+def multiverse_summary(results):
+    """Per-analysis spread of estimates and share of significant universes"""
+    rows = []
+    for name, group in results.groupby('analysis', sort=False):
+        valid = group[group['estimate'].notna()]
+        median = valid['estimate'].median()
+        same_sign = np.sign(valid['estimate']) == np.sign(median)
+        reported = valid[valid['is_reported']]
+        rows.append({
+            'analysis': name, 'test': group['test'].iloc[0],
+            'n_universes': len(group), 'n_reported_universes': len(valid),
+            'median_estimate': median,
+            'min_estimate': valid['estimate'].min(), 'max_estimate': valid['estimate'].max(),
+            'share_significant': valid['significant'].mean(),
+            'share_significant_same_sign': (valid['significant'] & same_sign).mean(),
+            'reported_estimate': reported['estimate'].iloc[0] if len(reported) else np.nan,
+            'reported_p': reported['p'].iloc[0] if len(reported) else np.nan,
+        })
+    return pd.DataFrame(rows)
@@ -0,0 +1,202 @@
+"""
+Online (Streaming) Statistics Accumulators
+VR Maze Navigation Studies
+
+While a study is still collecting data, condition means, variances,
+correlations and t-tests can be kept up to date after each session without
+re-reading and re-aggregating the whole file. Each accumulator stores, for
+every pair of metrics (i, j), the pairwise-complete count, means, second
+moments and co-moment, so
+
+    - adding a participant costs O(K^2) for K metrics, independent of n
+    - two accumulators (sites, shards, days) merge exactly (Chan et al.)
+    - the diagonal gives Welford means / variances per metric and the
+      off-diagonal gives the same pairwise-complete Pearson r as the scripts
+
+Accumulators are plain dicts of arrays, one per condition cell, plus the set of
+participant_ids already added so re-reading the growing file only adds new rows.
+
+Usage:
+    state = new_cell_accumulators(['Trust_pre', 'Trust_post'], cell_col='Display')
+    state = update_cell_accumulators(state, load_data())   # after each session
+    print(accumulator_summary(combined_accumulator(state)))
+    print(accumulator_ttest(state, 'Trust_post', 'I+MAPK', 'I-MAPK'))
+    save_cell_accumulators(state, 'trust_accumulators.npz')
+"""
+
+import numpy as np
+import pandas as pd
+
+from group_tests import pearson_from_moments, ttest_from_stats
+
+
+def new_accumulator(n_metrics):
+    """Empty accumulator for n_metrics metrics"""
+    shape = (n_metrics, n_metrics)
+    return {'n': np.zeros(shape), 'mean': np.zeros(shape),
+            'm2': np.zeros(shape), 'cm': np.zeros(shape)}
+
+
+def accumulator_from_rows(values):
+    """Accumulator for a block of rows (participants x metrics, NaN = missing)
+
+    mean[i, j] / m2[i, j] are the mean and sum of squared deviations of metric i
+    over the rows where both i and j are observed; cm[i, j] is their co-moment.
+    """
+    values = np.atleast_2d(np.asarray(values, dtype=float))
+    valid = ~np.isnan(values)
+    # Shift by the column means so the sum-of-squares identities stay well conditioned
+    counts = valid.sum(axis=0)
+    shift = np.where(valid, values, 0.0).sum(axis=0) / np.maximum(counts, 1)
+    x = np.where(valid, values - shift, 0.0)
+    w = valid.astype(float)
+
+    n = w.T @ w
+    sums = x.T @ w
+    sumsq = (x ** 2).T @ w
+    cross = x.T @ x
+    with np.errstate(invalid='ignore', divide='ignore'):
+        mean = np.where(n > 0, sums / np.maximum(n, 1), 0.0)
+    m2 = np.maximum(sumsq - n * mean ** 2, 0.0)
+    cm = cross - n * mean * mean.T
+    return {'n': n, 'mean': mean + shift[:, None], 'm2': m2, 'cm': cm}
+
+
+def merge_accumulators(a, b):
+    """Exact merge of two accumulators (Chan's parallel update)"""
+    n = a['n'] + b['n']
+    delta = b['mean'] - a['mean']
+    with np.errstate(invalid='ignore', divide='ignore'):
+        weight = np.where(n > 0, a['n'] * b['n'] / np.maximum(n, 1), 0.0)
+        mean = np.where(n > 0, a['mean'] + delta * b['n'] / np.maximum(n, 1), 0.0)
+    return {
+        'n': n,
+        'mean': mean,
+        'm2': a['m2'] + b['m2'] + delta ** 2 * weight,
+        'cm': a['cm'] + b['cm'] + delta * delta.T * weight,
+    }
+
+
+def update_accumulator(acc, values):
+    """Add one participant (vector) or a block of participants to an accumulator"""
+    return merge_accumulators(acc, accumulator_from_rows(values))
+
+
+def accumulator_moments(acc):
+    """Per-metric n, mean and variance (ddof=1) from the accumulator diagonal"""
+    n = np.diag(acc['n']).copy()
+    mean = np.diag(acc['mean']).copy()
+    with np.errstate(invalid='ignore', divide='ignore'):
+        var = np.where(n > 1, np.diag(acc['m2']) / np.maximum(n - 1, 1), np.nan)
+    mean[n == 0] = np.nan
+    return n, mean, var
+
+
+def accumulator_correlation(acc):
+    """Pairwise-complete Pearson r, p and n matrices"""
+    with np.errstate(invalid='ignore', divide='ignore'):
+        r = acc['cm'] / np.sqrt(acc['m2'] * acc['m2'].T)
+    r[acc['n'] < 2] = np.nan
+    return {'r': r, 'p': pearson_from_moments(acc['n'], r), 'n': acc['n']}
+
+
+def new_cell_accumulators(metrics, cell_col, id_col='participant_id'):
+    """Empty set of per-cell accumulators for the given metrics"""
+    return {'metrics': list(metrics), 'cell_col': cell_col, 'id_col': id_col,
+            'cells': {}, 'seen_ids': set()}
+
+
+def update_cell_accumulators(state, df):
+    """Add the participants of df that have not been added yet
+
+    Rows whose id_col value is already in the state are skipped, so the whole
+    (growing) data file can be passed after every session. Rows without an id
+    are always added. Ids are compared as strings.
+    """
+    ids = df[state['id_col']] if state['id_col'] in df.columns else pd.Series(np.nan, index=df.index)
+    ids = ids.astype(object).where(ids.isna(), ids.astype(str))
+    new = ids.isna() | ~ids.isin(state['seen_ids'])
+    if not new.any():
+        return state
+    rows = df.loc[new]
+    values = rows.reindex(columns=state['metrics']).apply(pd.to_numeric, errors='coerce')
+    k = len(state['metrics'])
+    for cell, block in values.groupby(rows[state['cell_col']], sort=False):
+        acc = state['cells'].get(cell, new_accumulator(k))
+        state['cells'][cell] = update_accumulator(acc, block.to_numpy(dtype=float))
+    state['seen_ids'].update(ids[new].dropna())
+    return state
+
+
+def merge_cell_accumulators(a, b):
+    """Merge two per-cell accumulator sets (e.g. two sites) with the same metrics"""
+    if a['metrics'] != b['metrics']:
+        raise ValueError("Accumulator sets track different metrics")
+    merged = new_cell_accumulators(a['metrics'], a['cell_col'], a['id_col'])
+    for cell in list(a['cells']) + [c for c in b['cells'] if c not in a['cells']]:
+        if cell in a['cells'] and cell in b['cells']:
+            merged['cells'][cell] = merge_accumulators(a['cells'][cell], b['cells'][cell])
+        else:
+            merged['cells'][cell] = dict(a['cells'].get(cell) or b['cells'][cell])
+    merged['seen_ids'] = a['seen_ids'] | b['seen_ids']
+    return merged
+
+
+def combined_accumulator(state, cells=None):
+    """Accumulator pooling the given cells (all cells by default)"""
+    if isinstance(cells, str):
+        cells = [cells]
+    acc = new_accumulator(len(state['metrics']))
+    for cell in (state['cells'] if cells is None else cells):
+        if cell in state['cells']:
+            acc = merge_accumulators(acc, state['cells'][cell])
+    return acc
+
+
+def accumulator_summary(acc, metrics=None):
+    """n / mean / std / sem per metric as a DataFrame"""
+    n, mean, var = accumulator_moments(acc)
+    std = np.sqrt(var)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        sem = std / np.sqrt(n)
+    return pd.DataFrame({'n': n.astype(int), 'mean': mean, 'std': std, 'sem': sem},
+                        index=metrics)
+
+
+def cell_summary(state):
+    """n / mean / std / sem for every cell x metric"""
+    frames = {cell: accumulator_summary(acc, state['metrics']) for cell, acc in state['cells'].items()}
+    return pd.concat(frames, names=[state['cell_col'], 'metric'])
+
+
+def accumulator_ttest(state, metric, cells_a, cells_b, equal_var=True):
+    """Two-sample t-test of metric between two cells (or lists of pooled cells)"""
+    i = state['metrics'].index(metric)
+    n1, m1, v1 = (x[i] for x in accumulator_moments(combined_accumulator(state, cells_a)))
+    n2, m2, v2 = (x[i] for x in accumulator_moments(combined_accumulator(state, cells_b)))
+    result = ttest_from_stats(n1, m1, v1, n2, m2, v2, equal_var=equal_var)
+    result.update({'n1': n1, 'n2': n2, 'mean1': m1, 'mean2': m2})
+    return {key: float(value) for key, value in result.items()}
+
+
+def save_cell_accumulators(state, path):
+    """Store an accumulator set as a .npz file"""
+    cells = list(state['cells'])
+    stacked = {key: np.array([state['cells'][c][key] for c in cells])
+               for key in ('n', 'mean', 'm2', 'cm')}
+    np.savez_compressed(path, metrics=np.array(state['metrics'], dtype=str),
+                        cells=np.array(cells, dtype=str),
+                        seen_ids=np.array(sorted(state['seen_ids']), dtype=str),
+                        columns=np.array([state['cell_col'], state['id_col']], dtype=str),
+                        **stacked)
+
+
+def load_cell_accumulators(path):
+    """Load an accumulator set written by save_cell_accumulators"""
+    with np.load(path) as data:
+        cell_col, id_col = data['columns'].tolist()
+        state = new_cell_accumulators(data['metrics'].tolist(), cell_col, id_col)
+        for i, cell in enumerate(data['cells'].tolist()):
+            state['cells'][cell] = {key: data[key][i] for key in ('n', 'mean', 'm2', 'cm')}
+        state['seen_ids'] = set(data['seen_ids'].tolist())
+    return state
@@ -0,0 +1,273 @@
+"""
+Partial-Correlation Networks of Perceptions, Trust and Behaviour
+VR Maze Navigation Studies
+
+The correlation heatmaps show marginal associations, so a perception that
+only tracks another perception looks as related to trust as the one that
+drives it. This module estimates the network of partial correlations
+(each pair controlling for all other variables):
+
+    - 'glasso': graphical lasso on the correlation matrix, with the penalty
+      chosen by the extended BIC (gamma = 0.5; Foygel & Drton, 2010) over a
+      log-spaced grid, as in qgraph's EBICglasso
+    - 'pinv': unregularized partial correlations from the inverted
+      correlation matrix
+
+    partial correlation   w_ij = -P_ij / sqrt(P_ii P_jj)   (P = precision matrix)
+
+Centrality indices work on stacks (..., p, p) of edge-weight matrices:
+strength (sum of |w|), expected influence (sum of w) and closeness
+(shortest path lengths with distance 1 / |w|; Floyd-Warshall with one
+broadcast minimum per intermediate node). Glasso networks are often not
+connected, so closeness is computed within each node's component with the
+Wasserman-Faust correction, (r / (p - 1)) * r / sum of distances to the r
+reachable nodes; isolated nodes get 0.
+
+Edge stability is bootstrapped from stacked resampled correlation matrices
+(count weights, see dimension_reduction.weighted_correlations): 'pinv'
+inverts the whole stack in one call; 'glasso' fits the resamples at the
+selected penalty in chunks on a process pool that receives the stack once
+through the pool initializer.
+
+Usage:
+    X = network_matrix(df, NETWORK_VARIABLES)
+    net = estimate_network(X)
+    edges, centrality = bootstrap_network(X, net, n_boot=1000)
+    by_condition, global_strength = condition_networks(X, df.loc[X.index, 'Display'], net)
+"""
+
+import os
+import warnings
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import pandas as pd
+from sklearn.covariance import graphical_lasso
+from sklearn.exceptions import ConvergenceWarning
+
+from dimension_reduction import GODSPEED_SCALES, weighted_correlations
+
+NETWORK_VARIABLES = GODSPEED_SCALES + ['Trust_post', 'compliance_rate', 'overcompliance',
+                                       'phase1_mean_time', 'phase2_mean_time']
+
+NETWORK_METHODS = ['glasso', 'pinv']
+
+# EBIC tuning (qgraph defaults)
+EBIC_GAMMA = 0.5
+N_LAMBDA = 50
+LAMBDA_MIN_RATIO = 0.01
+
+# Partial correlations below this are treated as absent edges
+EDGE_TOLERANCE = 1e-8
+
+CENTRALITY_INDICES = ['strength', 'expected_influence', 'closeness']
+
+# Bootstrap correlation matrices shared with the worker processes (set by _init_worker)
+_NETWORK_CACHE = {}
+
+
+def network_matrix(df, variables=None):
+    """Complete-case numeric matrix of the network variables present in df (index kept)"""
+    variables = [v for v in (variables or NETWORK_VARIABLES) if v in df.columns]
+    return df[variables].apply(pd.to_numeric, errors='coerce').astype(float).dropna()
+
+
+def partial_correlations(precision):
+    """Partial-correlation (edge-weight) matrices from a stack of precision matrices"""
+    d = np.sqrt(np.diagonal(precision, axis1=-2, axis2=-1))
+    weights = -precision / (d[..., :, None] * d[..., None, :])
+    weights[..., np.arange(weights.shape[-1]), np.arange(weights.shape[-1])] = 0.0
+    return np.where(np.abs(weights) < EDGE_TOLERANCE, 0.0, weights)
+
+
+def _glasso_precision(R, alpha):
+    """Graphical-lasso precision matrix of one correlation matrix (NaN when it fails)"""
+    with warnings.catch_warnings():
+        warnings.simplefilter('ignore', ConvergenceWarning)
+        try:
+            return graphical_lasso(R, alpha=alpha, max_iter=500)[1]
+        except (FloatingPointError, ValueError):
+            return np.full(R.shape, np.nan)
+
+
+def ebic_glasso(R, n, gamma=EBIC_GAMMA, n_lambda=N_LAMBDA, min_ratio=LAMBDA_MIN_RATIO):
+    """Graphical lasso with the EBIC-optimal penalty; returns (precision, alpha, path table)"""
+    p = R.shape[0]
+    off = np.abs(R[~np.eye(p, dtype=bool)])
+    alpha_max = off.max() if off.size else 1.0
+    alphas = np.geomspace(alpha_max * min_ratio, alpha_max, n_lambda)
+    precisions = np.stack([_glasso_precision(R, alpha) for alpha in alphas])
+    ok = np.isfinite(precisions).all(axis=(-2, -1))
+    safe = np.where(ok[:, None, None], precisions, np.eye(p))
+    _, logdet = np.linalg.slogdet(safe)
+    loglik = n / 2 * (logdet - np.einsum('ij,aji->a', R, safe))
+    n_edges = (np.abs(partial_correlations(safe)) > 0).sum(axis=(-2, -1)) / 2
+    ebic = np.where(ok, -2 * loglik + n_edges * np.log(n) + 4 * n_edges * gamma * np.log(p), np.inf)
+    best = int(np.argmin(ebic))
+    path = pd.DataFrame({'alpha': alphas, 'n_edges': n_edges, 'ebic': ebic})
+    return precisions[best], alphas[best], path
+
+
+def network_precision(R, method='glasso', alpha=None):
+    """Precision matrices of a stack of correlation matrices (glasso at a fixed alpha, or inverse)"""
+    if method == 'pinv':
+        return np.linalg.pinv(R)
+    if method != 'glasso':
+        raise ValueError(f"Unknown network method {method!r}; use one of {NETWORK_METHODS}")
+    stack = R.reshape((-1,) + R.shape[-2:])
+    return np.stack([_glasso_precision(r, alpha) for r in stack]).reshape(R.shape)
+
+
+def estimate_network(X, method='glasso', alpha=None):
+    """Partial-correlation network of the complete-case matrix X (DataFrame)
+
+    For glasso, alpha=None selects the penalty by EBIC. Returns a dict with
+    the variables, method, alpha, n, correlation matrix R, the edge weights
+    (p, p) and, for glasso, the EBIC path.
+    """
+    R = np.corrcoef(X.to_numpy(dtype=float), rowvar=False)
+    path = None
+    if method == 'glasso' and alpha is None:
+        precision, alpha, path = ebic_glasso(R, len(X))
+    else:
+        precision = network_precision(R, method, alpha)
+    return {'variables': list(X.columns), 'method': method, 'alpha': alpha, 'n': len(X),
+            'R': R, 'weights': partial_correlations(precision), 'path': path}
+
+
+def centrality(weights):
+    """Strength, expected influence and closeness for a stack of (..., p, p) weight matrices
+
+    Closeness is computed within components (see the module docstring).
+    """
+    p = weights.shape[-1]
+    absolute = np.abs(weights)
+    with np.errstate(divide='ignore'):
+        distance = np.where(absolute > 0, 1 / absolute, np.inf)
+    distance[..., np.arange(p), np.arange(p)] = 0.0
+    # Floyd-Warshall: one broadcast minimum per intermediate node
+    for k in range(p):
+        distance = np.minimum(distance, distance[..., :, k:k + 1] + distance[..., k:k + 1, :])
+    reachable = np.isfinite(distance) & (distance > 0)
+    n_reachable = reachable.sum(axis=-1)
+    total = np.where(reachable, distance, 0.0).sum(axis=-1)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        closeness = np.where(n_reachable > 0, n_reachable / (p - 1) * n_reachable / total, 0.0)
+    return {'strength': absolute.sum(axis=-1), 'expected_influence': weights.sum(axis=-1),
+            'closeness': closeness}
+
+
+def edge_table(network):
+    """One row per variable pair with its partial and marginal correlation"""
+    i, j = np.triu_indices(len(network['variables']), k=1)
+    variables = np.array(network['variables'], dtype=object)
+    return pd.DataFrame({'node1': variables[i], 'node2': variables[j],
+                         'partial_r': network['weights'][i, j], 'marginal_r': network['R'][i, j]})
+
+
+def centrality_table(network):
+    """Raw and standardized (z) centrality indices per node
+
+    z-scores are NaN for an index that is constant over the nodes (e.g.
+    closeness in a network without edges).
+    """
+    indices = centrality(network['weights'])
+    table = pd.DataFrame(indices, index=network['variables'])
+    for index in CENTRALITY_INDICES:
+        values = table[index]
+        spread = values.std(ddof=1)
+        table[f'{index}_z'] = (values - values.mean()) / spread if spread > 0 else np.nan
+    return table.rename_axis('node').reset_index()
+
+
+def _init_worker(R):
+    """Store the stacked bootstrap correlation matrices once per worker process"""
+    _NETWORK_CACHE['R'] = R
+
+
+def _fit_chunk(task):
+    """Worker: glasso edge weights for one chunk of bootstrap correlation matrices"""
+    start, stop, alpha = task
+    return partial_correlations(network_precision(_NETWORK_CACHE['R'][start:stop], 'glasso', alpha))
+
+
+def bootstrap_weights(X, network, n_boot=1000, seed=2024, n_jobs=None, chunk_size=50):
+    """(B, p, p) edge weights of the network refitted on bootstrap resamples"""
+    data = X[network['variables']].to_numpy(dtype=float)
+    n = len(data)
+    rng = np.random.default_rng(seed)
+    rows = rng.integers(0, n, size=(n_boot, n))
+    counts = np.zeros((n_boot, n))
+    np.add.at(counts, (np.arange(n_boot)[:, None], rows), 1.0)
+    R = weighted_correlations(data, counts)
+    R = R[np.isfinite(R).all(axis=(-2, -1))]
+    if network['method'] == 'pinv':
+        return partial_correlations(network_precision(R, 'pinv'))
+
+    tasks = [(start, min(start + chunk_size, len(R)), network['alpha'])
+             for start in range(0, len(R), chunk_size)]
+    n_jobs = n_jobs or os.cpu_count() or 1
+    if n_jobs == 1 or len(tasks) == 1:
+        _init_worker(R)
+        chunks = [_fit_chunk(task) for task in tasks]
+    else:
+        with ProcessPoolExecutor(max_workers=n_jobs, initializer=_init_worker, initargs=(R,)) as pool:
+            chunks = list(pool.map(_fit_chunk, tasks))
+    weights = np.concatenate(chunks)
+    return weights[np.isfinite(weights).all(axis=(-2, -1))]
+
+
+def bootstrap_network(X, network, n_boot=1000, ci=0.95, seed=2024, n_jobs=None):
+    """Edge and centrality stability over bootstrap resamples
+
+    Returns (edges, centrality): the edge table with the bootstrap mean,
+    percentile interval and inclusion proportion (share of resamples with a
+    non-zero edge), and the centrality table with bootstrap mean and interval
+    per node and index.
+    """
+    weights = bootstrap_weights(X, network, n_boot, seed, n_jobs)
+    tail = (1 - ci) / 2 * 100
+    i, j = np.triu_indices(len(network['variables']), k=1)
+    edge_samples = weights[:, i, j]
+    edges = edge_table(network)
+    edges['boot_mean'] = edge_samples.mean(axis=0)
+    edges['ci_low'], edges['ci_high'] = np.percentile(edge_samples, [tail, 100 - tail], axis=0)
+    edges['inclusion'] = (edge_samples != 0).mean(axis=0)
+    edges.attrs['n_boot'] = len(weights)
+
+    table = centrality_table(network)
+    for index, samples in centrality(weights).items():
+        table[f'{index}_boot_mean'] = samples.mean(axis=0)
+        table[f'{index}_ci_low'], table[f'{index}_ci_high'] = np.percentile(samples, [tail, 100 - tail], axis=0)
+    return edges, table
+
+
+def condition_networks(X, groups, network):
+    """Networks per condition at the pooled penalty, with edge and global-strength summaries
+
+    Returns (edges, global_strength): one row per condition x edge with the
+    condition's partial correlation, and the sum of absolute edge weights per
+    condition (including the pooled 'All' network).
+    """
+    labels = np.asarray(groups, dtype=object)
+    levels = sorted(pd.unique(labels[pd.notna(labels)]), key=str)
+    weights = np.stack([(labels == level).astype(float) for level in levels])
+    n = weights.sum(axis=1)
+    R = weighted_correlations(X[network['variables']].to_numpy(dtype=float), weights)
+    usable = np.isfinite(R).all(axis=(-2, -1)) & (n > len(network['variables']))
+    safe = np.where(usable[:, None, None], R, np.eye(R.shape[-1]))
+    edge_weights = partial_correlations(network_precision(safe, network['method'], network['alpha']))
+    edge_weights = np.where(usable[:, None, None], edge_weights, np.nan)
+
+    i, j = np.triu_indices(len(network['variables']), k=1)
+    variables = np.array(network['variables'], dtype=object)
+    table = pd.DataFrame({
+        'condition': np.repeat(np.array(levels, dtype=object), len(i)),
+        'n': np.repeat(n, len(i)).astype(int),
+        'node1': np.tile(variables[i], len(levels)), 'node2': np.tile(variables[j], len(levels)),
+        'partial_r': edge_weights[:, i, j].ravel(),
+    })
+    strength = np.abs(edge_weights[:, i, j]).sum(axis=1)
+    global_strength = pd.Series([np.abs(network['weights'][i, j]).sum()] + list(strength),
+                                index=['All'] + levels, name='global_strength')
+    return table, global_strength
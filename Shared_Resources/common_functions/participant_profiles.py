@@ -0,0 +1,217 @@
+"""
+Participant Behavioural Profiles (Clustering)
+VR Maze Navigation Studies
+
+Segments participants into behavioural types (blind followers, calibrated
+users, skeptics) from their compliance, overcompliance, phase decision
+times, help use and agent perceptions, and compares how common each type is
+across conditions.
+
+    - profile features are median-imputed and standardized; the fitted
+      imputer and scaler are stored with the model
+    - mini-batch k-means (criterion: inertia, k chosen by silhouette) or
+      Gaussian mixtures (criterion: -log-likelihood, k chosen by BIC)
+    - every (k, restart) fit is an independent task with its own seed; the
+      tasks run on a process pool that receives the standardized matrix once
+      through the pool initializer, and the best restart per k is kept
+    - profiles are named from their centres: the highest overcompliance is
+      'Blind followers', the lowest 'Skeptics', the rest 'Calibrated users'
+
+New participants are assigned with the stored imputer, scaler and model, so
+nothing is refitted on the full history; for mini-batch k-means,
+update=True additionally moves the centres with one partial_fit step on the
+new batch.
+
+Usage:
+    model = fit_profiles(df, PROFILE_FEATURES, k_values=(2, 3, 4))
+    df['profile'] = model['profiles']
+    prevalence, test = profile_prevalence(df['profile'], df['Display'])
+    new = assign_profiles(model, new_df, update=True)
+"""
+
+import copy
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import pandas as pd
+from scipy import stats
+from sklearn.cluster import MiniBatchKMeans
+from sklearn.impute import SimpleImputer
+from sklearn.metrics import silhouette_score
+from sklearn.mixture import GaussianMixture
+from sklearn.preprocessing import StandardScaler
+
+PROFILE_FEATURES = ['compliance_rate', 'overcompliance', 'phase1_mean_time', 'phase2_mean_time',
+                    'total_help_requests', 'Trust_post', 'Likeability', 'Intelligence']
+
+PROFILE_METHODS = {
+    'minibatch_kmeans': lambda k, seed: MiniBatchKMeans(n_clusters=k, batch_size=64, n_init=1,
+                                                        random_state=seed),
+    'gmm': lambda k, seed: GaussianMixture(n_components=k, covariance_type='diag', n_init=1,
+                                           random_state=seed),
+}
+
+# Feature ordering the clusters when they are named (first one available)
+NAMING_FEATURES = ['overcompliance', 'compliance_rate']
+
+# Standardized feature matrix shared with the worker processes (set by _init_worker)
+_PROFILE_CACHE = {}
+
+
+def profile_features(df, features=None):
+    """Numeric participant x feature matrix of the profile features present in df"""
+    features = [f for f in (features or PROFILE_FEATURES) if f in df.columns]
+    return df[features].apply(pd.to_numeric, errors='coerce').astype(float)
+
+
+def _init_worker(Z):
+    """Store the standardized matrix once per worker process"""
+    _PROFILE_CACHE['Z'] = Z
+
+
+def _fit_restart(task):
+    """Worker: one clustering fit; returns (k, seed, criterion, selection score, estimator)"""
+    method, k, seed = task
+    Z = _PROFILE_CACHE['Z']
+    estimator = PROFILE_METHODS[method](k, seed).fit(Z)
+    if method == 'gmm':
+        criterion = -estimator.score(Z) * len(Z)
+        selection = estimator.bic(Z)
+    else:
+        criterion = estimator.inertia_
+        labels = estimator.predict(Z)
+        # Higher silhouette is better, so its negative is minimized like the BIC
+        selection = -silhouette_score(Z, labels) if len(np.unique(labels)) > 1 else np.inf
+    return k, seed, criterion, selection, estimator
+
+
+def _profile_names(centers, features):
+    """Profile name per cluster, ordered by the centre of the naming feature"""
+    column = next((features.index(f) for f in NAMING_FEATURES if f in features), 0)
+    order = np.argsort(-centers[:, column])
+    names = np.empty(len(centers), dtype=object)
+    middle = order[1:-1]
+    names[order[0]] = 'Blind followers'
+    names[order[-1]] = 'Skeptics'
+    for rank, cluster in enumerate(middle, start=1):
+        names[cluster] = 'Calibrated users' if len(middle) == 1 else f'Calibrated users {rank}'
+    return names
+
+
+def _cluster_centers(estimator):
+    return estimator.means_ if isinstance(estimator, GaussianMixture) else estimator.cluster_centers_
+
+
+def fit_profiles(df, features=None, k_values=(2, 3, 4), method='minibatch_kmeans', n_restarts=10,
+                 n_jobs=None, seed=2024):
+    """Fit the profile model for every k with parallel restarts and keep the best k
+
+    Participants missing every feature are left unassigned. Returns a dict
+    with the features, imputer, scaler, chosen k, estimator, profile names,
+    the per-participant labels / profiles (aligned to df.index), the
+    (k, restart) fit table and the per-k selection table.
+    """
+    if method not in PROFILE_METHODS:
+        raise ValueError(f"Unknown profile method {method!r}; use one of {list(PROFILE_METHODS)}")
+    X = profile_features(df, features)
+    usable = X.notna().any(axis=1).to_numpy()
+    imputer = SimpleImputer(strategy='median').fit(X[usable])
+    scaler = StandardScaler().fit(imputer.transform(X[usable]))
+    Z = scaler.transform(imputer.transform(X[usable]))
+
+    seeds = np.random.SeedSequence(seed).generate_state(n_restarts)
+    k_values = [k for k in k_values if 1 < k < len(Z)]
+    tasks = [(method, k, int(s)) for k in k_values for s in seeds]
+    n_jobs = n_jobs or os.cpu_count() or 1
+    if n_jobs == 1:
+        _init_worker(Z)
+        fits = [_fit_restart(task) for task in tasks]
+    else:
+        with ProcessPoolExecutor(max_workers=n_jobs, initializer=_init_worker, initargs=(Z,)) as pool:
+            fits = list(pool.map(_fit_restart, tasks))
+
+    restarts = pd.DataFrame([(k, s, crit, sel) for k, s, crit, sel, _ in fits],
+                            columns=['k', 'seed', 'criterion', 'selection'])
+    best = restarts.groupby('k')['criterion'].idxmin()
+    selection = restarts.loc[best].reset_index(drop=True)
+    selection['selection_score'] = 'BIC' if method == 'gmm' else 'negative silhouette'
+    chosen = int(best[selection.loc[selection['selection'].idxmin(), 'k']])
+    k, estimator = fits[chosen][0], fits[chosen][4]
+
+    names = _profile_names(_cluster_centers(estimator), list(X.columns))
+    labels = np.full(len(df), -1)
+    labels[usable] = estimator.predict(Z)
+    return {
+        'features': list(X.columns), 'method': method, 'k': k,
+        'imputer': imputer, 'scaler': scaler, 'estimator': estimator, 'names': names,
+        'labels': pd.Series(labels, index=df.index, name='profile_label'),
+        'profiles': pd.Series(np.where(labels >= 0, names[labels], None), index=df.index, name='profile'),
+        'restarts': restarts, 'selection': selection,
+    }
+
+
+def profile_centers(model):
+    """Profile centres in standardized and original units (one row per profile)"""
+    z = _cluster_centers(model['estimator'])
+    raw = model['scaler'].inverse_transform(z)
+    centers = pd.DataFrame(raw, columns=model['features'])
+    centers = centers.join(pd.DataFrame(z, columns=[f'{f}_z' for f in model['features']]))
+    centers.insert(0, 'profile', model['names'])
+    centers.insert(1, 'n', np.bincount(model['labels'][model['labels'] >= 0], minlength=model['k']))
+    return centers
+
+
+def assign_profiles(model, df, update=False):
+    """Assign new participants to the fitted profiles without refitting
+
+    Uses the stored imputer, scaler and model. With update=True a mini-batch
+    k-means model is first moved towards the new batch with one partial_fit
+    step (returned as a new model; the original is not modified). Returns
+    (assignments, model): a DataFrame with the label, profile name and, for
+    Gaussian mixtures, the membership probability of each profile.
+    """
+    X = profile_features(df, model['features']).reindex(columns=model['features'])
+    usable = X.notna().any(axis=1).to_numpy()
+    Z = model['scaler'].transform(model['imputer'].transform(X[usable]))
+    if update:
+        if model['method'] != 'minibatch_kmeans':
+            raise ValueError("Incremental updates need the minibatch_kmeans method")
+        model = dict(model, estimator=copy.deepcopy(model['estimator']))
+        if len(Z):
+            model['estimator'].partial_fit(Z)
+
+    labels = np.full(len(df), -1)
+    if len(Z):
+        labels[usable] = model['estimator'].predict(Z)
+    assignments = pd.DataFrame({
+        'profile_label': labels,
+        'profile': np.where(labels >= 0, model['names'][labels], None),
+    }, index=df.index)
+    if model['method'] == 'gmm':
+        probabilities = np.full((len(df), model['k']), np.nan)
+        if len(Z):
+            probabilities[usable] = model['estimator'].predict_proba(Z)
+        for j, name in enumerate(model['names']):
+            assignments[f'p_{name}'] = probabilities[:, j]
+    return assignments, model
+
+
+def profile_prevalence(profiles, groups):
+    """Profile counts and shares per condition with a chi-square test of independence
+
+    Returns (table, test): table has one row per condition x profile with
+    count and proportion within the condition; test is a dict with chi2, df,
+    p and Cramer's V.
+    """
+    data = pd.DataFrame({'condition': np.asarray(groups, dtype=object),
+                         'profile': np.asarray(profiles, dtype=object)}).dropna()
+    counts = pd.crosstab(data['condition'], data['profile'])
+    table = counts.stack().rename('count').reset_index()
+    table['proportion'] = table['count'] / table.groupby('condition')['count'].transform('sum')
+    if counts.shape[0] > 1 and counts.shape[1] > 1:
+        chi2, p, dof, _ = stats.chi2_contingency(counts)
+        v = np.sqrt(chi2 / (counts.to_numpy().sum() * (min(counts.shape) - 1)))
+    else:
+        chi2, p, dof, v = np.nan, np.nan, 0, np.nan
+    return table, {'chi2': chi2, 'df': dof, 'p': p, 'cramers_v': v}
@@ -0,0 +1,192 @@
+"""
+Monte Carlo Power and Sample-Size Simulation
+VR Maze Navigation Studies
+
+Generates synthetic studies from the current design (corners, agent error
+corners, conditions) with cell effects estimated from the existing data, runs
+the same metric definitions and two-sample t-tests as the analysis scripts,
+and reports power as a function of n per cell. Simulated studies are stacked
+along the leading array axis, so one chunk of studies is analysed with a single
+set of array reductions, and chunks are spread over a process pool.
+
+Two kinds of simulation are supported:
+    - corner_times: log-normal corner decision times with participant random
+      intercepts, analysed via the phase / error-corner metrics
+      (e.g. the Memory x Phase interaction, which is the memory contrast on
+      decision_time_change = phase2 - phase1)
+    - outcome: normally distributed participant-level outcomes
+      (e.g. Study 2 distance effect on trust_difference)
+
+Usage:
+    params = estimate_corner_parameters(df, STUDY1_DESIGN)
+    contrast = {'metric': 'decision_time_change',
+                'groups': (['I+MAPK', 'E+MAPK'], ['I-MAPK', 'E-MAPK'])}
+    curve = power_curve(params, contrast, n_grid=range(10, 61, 5))
+"""
+
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import pandas as pd
+
+from decision_time_cleaning import trim_times
+from group_tests import ttest_ind_arrays
+from trust_metrics import corner_times, time_metrics
+
+
+def estimate_corner_parameters(df, design):
+    """Estimate per-cell corner time parameters (log scale) from existing data
+
+    Uses a method-of-moments random-intercept decomposition within each cell:
+    corner means, participant intercept SD and residual SD of log decision time
+    (after trimming with the design's time_cleaning).
+    """
+    with np.errstate(invalid='ignore', divide='ignore'):
+        log_times = np.log(trim_times(corner_times(df, design['n_corners']), design.get('time_cleaning')))
+    log_times[~np.isfinite(log_times)] = np.nan
+    cells = list(design['conditions'])
+    labels = df[design['condition_col']].to_numpy()
+
+    corner_means = np.full((len(cells), design['n_corners']), np.nan)
+    participant_sd = np.zeros(len(cells))
+    residual_sd = np.zeros(len(cells))
+    for i, cell in enumerate(cells):
+        cell_times = log_times[labels == cell]
+        if len(cell_times) < 2:
+            raise ValueError(f"Cell {cell!r} has fewer than 2 participants")
+        corner_means[i] = np.nanmean(cell_times, axis=0)
+        resid = cell_times - corner_means[i]
+        person_means = np.nanmean(resid, axis=1, keepdims=True)
+        within = resid - person_means
+        k = (~np.isnan(resid)).sum(axis=1)
+        resid_var = np.nansum(within ** 2) / max((k - 1).clip(min=0).sum(), 1)
+        mean_k = k[k > 0].mean()
+        intercept_var = np.nanvar(person_means, ddof=1) - resid_var / mean_k
+        residual_sd[i] = np.sqrt(resid_var)
+        participant_sd[i] = np.sqrt(max(intercept_var, 0.0))
+
+    return {
+        'kind': 'corner_times',
+        'design': design,
+        'cells': cells,
+        'corner_log_means': corner_means,
+        'participant_sd': participant_sd,
+        'residual_sd': residual_sd,
+    }
+
+
+def estimate_outcome_parameters(df, outcome, group_col, groups):
+    """Estimate per-cell mean and SD of a participant-level outcome"""
+    means, sds = [], []
+    for group in groups:
+        values = df.loc[df[group_col] == group, outcome].dropna()
+        if len(values) < 2:
+            raise ValueError(f"Group {group!r} has fewer than 2 observations of {outcome}")
+        means.append(values.mean())
+        sds.append(values.std())
+    return {
+        'kind': 'outcome',
+        'metric': outcome,
+        'cells': list(groups),
+        'means': np.array(means),
+        'sds': np.array(sds),
+    }
+
+
+def scale_effects(params, factor):
+    """Shrink (factor < 1) or inflate cell effects around the grand mean"""
+    scaled = dict(params)
+    if params['kind'] == 'corner_times':
+        means = params['corner_log_means']
+        grand = means.mean(axis=0, keepdims=True)
+        scaled['corner_log_means'] = grand + factor * (means - grand)
+    else:
+        grand = params['means'].mean()
+        scaled['means'] = grand + factor * (params['means'] - grand)
+    return scaled
+
+
+def simulate_corner_times(params, n_per_cell, n_sims, rng):
+    """Simulated corner decision times, shape (n_sims, cells, n_per_cell, corners)"""
+    mu = params['corner_log_means'][None, :, None, :]
+    n_cells, n_corners = params['corner_log_means'].shape
+    intercepts = rng.standard_normal((n_sims, n_cells, n_per_cell, 1)) \
+        * params['participant_sd'][None, :, None, None]
+    noise = rng.standard_normal((n_sims, n_cells, n_per_cell, n_corners)) \
+        * params['residual_sd'][None, :, None, None]
+    return np.exp(mu + intercepts + noise)
+
+
+def simulate_outcome(params, n_per_cell, n_sims, rng):
+    """Simulated participant outcomes, shape (n_sims, cells, n_per_cell)"""
+    n_cells = len(params['cells'])
+    return params['means'][None, :, None] \
+        + params['sds'][None, :, None] * rng.standard_normal((n_sims, n_cells, n_per_cell))
+
+
+def _cell_index(params, groups):
+    """Indices of the cells pooled into one side of a contrast"""
+    if isinstance(groups, str):
+        groups = [groups]
+    return [params['cells'].index(g) for g in groups]
+
+
+def simulated_contrast_pvalues(params, contrast, n_per_cell, n_sims, rng):
+    """Run the analysis pipeline on n_sims simulated studies and return the p-values"""
+    if params['kind'] == 'corner_times':
+        times = simulate_corner_times(params, n_per_cell, n_sims, rng)
+        values = time_metrics(times, params['design'])[contrast['metric']]
+    else:
+        values = simulate_outcome(params, n_per_cell, n_sims, rng)
+
+    group_a, group_b = contrast['groups']
+    a = values[:, _cell_index(params, group_a)].reshape(n_sims, -1)
+    b = values[:, _cell_index(params, group_b)].reshape(n_sims, -1)
+    return ttest_ind_arrays(a, b, axis=-1, equal_var=contrast.get('equal_var', True))['p']
+
+
+def _power_chunk(task):
+    """Worker: number of significant simulated studies in one chunk"""
+    params, contrast, n_per_cell, n_sims, seed, alpha = task
+    rng = np.random.default_rng(seed)
+    p = simulated_contrast_pvalues(params, contrast, n_per_cell, n_sims, rng)
+    return n_per_cell, int((p < alpha).sum()), n_sims
+
+
+def power_curve(params, contrast, n_grid, n_sims=2000, alpha=0.05, n_jobs=None,
+                chunk_size=500, seed=2024):
+    """Power as a function of participants per cell
+
+    Each n in n_grid is simulated n_sims times in chunks of chunk_size studies;
+    chunks run on a process pool (n_jobs workers, default all cores; n_jobs=1
+    runs in-process). Returns a DataFrame with power and its Monte Carlo SE.
+    """
+    n_grid = [int(n) for n in n_grid]
+    tasks = []
+    seeds = np.random.SeedSequence(seed).spawn(len(n_grid))
+    for n, seq in zip(n_grid, seeds):
+        sizes = [chunk_size] * (n_sims // chunk_size)
+        if n_sims % chunk_size:
+            sizes.append(n_sims % chunk_size)
+        for size, chunk_seed in zip(sizes, seq.spawn(len(sizes))):
+            tasks.append((params, contrast, n, size, chunk_seed, alpha))
+
+    n_jobs = n_jobs or os.cpu_count() or 1
+    if n_jobs == 1:
+        results = [_power_chunk(task) for task in tasks]
+    else:
+        with ProcessPoolExecutor(max_workers=n_jobs) as pool:
+            results = list(pool.map(_power_chunk, tasks))
+
+    hits = pd.DataFrame(results, columns=['n_per_cell', 'significant', 'n_sims'])
+    curve = hits.groupby('n_per_cell', sort=True)[['significant', 'n_sims']].sum().reset_index()
+    curve['power'] = curve['significant'] / curve['n_sims']
+    curve['mc_se'] = np.sqrt(curve['power'] * (1 - curve['power']) / curve['n_sims'])
+    return curve[['n_per_cell', 'n_sims', 'power', 'mc_se']]
+
+
+def required_n(curve, target_power=0.80):
+    """Smallest simulated n per cell reaching the target power (None if not reached)"""
+    reached = curve.loc[curve['power'] >= target_power, 'n_per_cell']
+    return int(reached.min()) if len(reached) else None
@@ -0,0 +1,180 @@
+"""
+Cross-Validated Prediction of Trust Outcomes
+VR Maze Navigation Studies
+
+Estimates how well participant-level predictors (Godspeed perceptions, VR
+experience, personality) predict outcomes such as compliance_rate,
+overcompliance and Trust_post out of sample:
+
+    - repeated k-fold cross-validation (outer loop) for the performance estimate
+    - nested grid search (inner k-fold on the outer training rows only) to
+      tune each model family's hyperparameters
+    - model families: mean baseline, ridge, elastic net, random forest
+
+Imputation (training medians) and standardization are fitted once per outer
+fold on that fold's training rows, so no information from the test rows
+leaks into the preprocessing. The resulting fold matrices are computed once,
+handed to every worker process a single time through the pool initializer
+and reused for every model family and outcome. Tasks (one per outer fold x
+model family) then run on a process pool.
+
+Usage:
+    X = prediction_features(df, ['Likeability', 'Immersion'], ['participant_intro_extro'])
+    results = cross_validated_prediction(X, df[['compliance_rate', 'Trust_post']])
+    summary = prediction_summary(results)
+"""
+
+import json
+import os
+from collections import Counter
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import pandas as pd
+from sklearn.dummy import DummyRegressor
+from sklearn.ensemble import RandomForestRegressor
+from sklearn.impute import SimpleImputer
+from sklearn.linear_model import ElasticNet, Ridge
+from sklearn.metrics import mean_absolute_error, mean_squared_error, r2_score
+from sklearn.model_selection import GridSearchCV, KFold, RepeatedKFold
+from sklearn.preprocessing import StandardScaler
+
+# Model family -> (estimator factory, hyperparameter grid for the inner search)
+PREDICTION_MODELS = {
+    'mean_baseline': (lambda seed: DummyRegressor(strategy='mean'), {}),
+    'ridge': (lambda seed: Ridge(), {'alpha': [0.1, 1.0, 10.0, 100.0]}),
+    'elastic_net': (lambda seed: ElasticNet(max_iter=10000, random_state=seed),
+                    {'alpha': [0.01, 0.1, 1.0], 'l1_ratio': [0.2, 0.5, 0.8]}),
+    'random_forest': (lambda seed: RandomForestRegressor(n_estimators=50, random_state=seed),
+                      {'max_depth': [2, 4], 'min_samples_leaf': [3, 10]}),
+}
+
+# Fold matrices shared with the worker processes (set by _init_worker)
+_FOLD_CACHE = {}
+
+
+def prediction_features(df, numeric, categorical=None):
+    """Numeric feature matrix with one-hot (drop-first) dummies for categorical columns
+
+    Missing categories stay NaN in every dummy so they are imputed like any
+    other missing value.
+    """
+    features = df[list(numeric)].apply(pd.to_numeric, errors='coerce').astype(float)
+    for column in categorical or []:
+        dummies = pd.get_dummies(df[column], prefix=column, drop_first=True, dtype=float)
+        dummies[df[column].isna().to_numpy()] = np.nan
+        features = features.join(dummies)
+    return features
+
+
+def outer_folds(n, n_splits=5, n_repeats=5, seed=2024):
+    """(repeat, fold, train_idx, test_idx) for repeated k-fold cross-validation"""
+    splitter = RepeatedKFold(n_splits=n_splits, n_repeats=n_repeats, random_state=seed)
+    return [(i // n_splits, i % n_splits, train, test)
+            for i, (train, test) in enumerate(splitter.split(np.arange(n)))]
+
+
+def fold_matrices(X, folds):
+    """Imputed and standardized (X_train, X_test) for every outer fold
+
+    Medians, means and SDs come from the fold's training rows only. Columns
+    with no observed value in the training rows carry no information for the
+    fold and are dropped.
+    """
+    X = np.asarray(X, dtype=float)
+    matrices = []
+    for _, _, train, test in folds:
+        observed = ~np.isnan(X[train]).all(axis=0)
+        X_train, X_test = X[train][:, observed], X[test][:, observed]
+        imputer = SimpleImputer(strategy='median').fit(X_train)
+        scaler = StandardScaler().fit(imputer.transform(X_train))
+        matrices.append((scaler.transform(imputer.transform(X_train)),
+                         scaler.transform(imputer.transform(X_test))))
+    return matrices
+
+
+def _init_worker(matrices, targets):
+    """Store the fold matrices and targets once per worker process"""
+    _FOLD_CACHE['matrices'] = matrices
+    _FOLD_CACHE['targets'] = targets
+
+
+def _fit_fold(task):
+    """Worker: nested search and test-fold scores for one fold, model family and all outcomes"""
+    fold_index, train, test, model, inner_splits, seed = task
+    X_train, X_test = _FOLD_CACHE['matrices'][fold_index]
+    targets = _FOLD_CACHE['targets']
+    factory, grid = PREDICTION_MODELS[model]
+    rows = []
+    for k in range(targets.shape[1]):
+        y_train, y_test = targets[train, k], targets[test, k]
+        keep_train, keep_test = ~np.isnan(y_train), ~np.isnan(y_test)
+        if keep_train.sum() < 2 * inner_splits or keep_test.sum() < 2:
+            rows.append((fold_index, k, model, int(keep_train.sum()), int(keep_test.sum()),
+                         np.nan, np.nan, np.nan, '{}'))
+            continue
+        estimator = factory(seed)
+        if grid:
+            search = GridSearchCV(estimator, grid, scoring='neg_mean_squared_error',
+                                  cv=KFold(inner_splits, shuffle=True, random_state=seed), n_jobs=1)
+            search.fit(X_train[keep_train], y_train[keep_train])
+            estimator, params = search.best_estimator_, search.best_params_
+        else:
+            estimator.fit(X_train[keep_train], y_train[keep_train])
+            params = {}
+        predicted = estimator.predict(X_test[keep_test])
+        observed = y_test[keep_test]
+        rows.append((fold_index, k, model, int(keep_train.sum()), int(keep_test.sum()),
+                     r2_score(observed, predicted),
+                     np.sqrt(mean_squared_error(observed, predicted)),
+                     mean_absolute_error(observed, predicted),
+                     json.dumps(params, sort_keys=True)))
+    return rows
+
+
+def cross_validated_prediction(X, y, models=None, n_splits=5, n_repeats=5, inner_splits=3,
+                               n_jobs=None, seed=2024):
+    """Repeated k-fold, nested-search performance of every model family and outcome
+
+    X: DataFrame of features (may contain NaN); y: Series or DataFrame of
+    outcomes (rows with a missing outcome are dropped per outcome).
+    Returns one row per outcome x model x repeat x fold with the test-fold
+    R^2, RMSE, MAE and the selected hyperparameters.
+    """
+    y = y.to_frame() if isinstance(y, pd.Series) else y
+    outcomes = list(y.columns)
+    targets = y.apply(pd.to_numeric, errors='coerce').to_numpy(dtype=float)
+    models = list(models or PREDICTION_MODELS)
+
+    folds = outer_folds(len(X), n_splits, n_repeats, seed)
+    matrices = fold_matrices(X, folds)
+    tasks = [(i, train, test, model, inner_splits, seed)
+             for i, (_, _, train, test) in enumerate(folds) for model in models]
+
+    n_jobs = n_jobs or os.cpu_count() or 1
+    if n_jobs == 1:
+        _init_worker(matrices, targets)
+        chunks = [_fit_fold(task) for task in tasks]
+    else:
+        with ProcessPoolExecutor(max_workers=n_jobs, initializer=_init_worker,
+                                 initargs=(matrices, targets)) as pool:
+            chunks = list(pool.map(_fit_fold, tasks))
+
+    results = pd.DataFrame([row for chunk in chunks for row in chunk],
+                           columns=['fold_index', 'outcome_index', 'model', 'n_train', 'n_test',
+                                    'r2', 'rmse', 'mae', 'best_params'])
+    results.insert(0, 'outcome', [outcomes[k] for k in results.pop('outcome_index')])
+    fold_index = results.pop('fold_index')
+    results.insert(2, 'repeat', [folds[i][0] for i in fold_index])
+    results.insert(3, 'fold', [folds[i][1] for i in fold_index])
+    return results.sort_values(['outcome', 'model', 'repeat', 'fold']).reset_index(drop=True)
+
+
+def prediction_summary(results):
+    """Mean and SD of the fold scores per outcome and model, with the modal hyperparameters"""
+    grouped = results.groupby(['outcome', 'model'], sort=False)
+    summary = grouped[['r2', 'rmse', 'mae']].agg(['mean', 'std'])
+    summary.columns = [f'{metric}_{stat}' for metric, stat in summary.columns]
+    summary['n_folds'] = grouped['r2'].count()
+    summary['modal_params'] = grouped['best_params'].agg(lambda p: Counter(p).most_common(1)[0][0])
+    return summary.reset_index()
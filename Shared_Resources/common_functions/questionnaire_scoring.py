@@ -0,0 +1,196 @@
+"""
+Item-Level Questionnaire Scoring and Reliability
+VR Maze Navigation Studies
+
+Builds the questionnaire scales (trust, Godspeed, VR experience) from their
+item-level responses as described in METRICS_CALCULATION_GUIDE.md
+(sections 1.1, 6.1 and 7) and reports their reliability.
+
+Scoring works on one participant x item matrix holding every item of every
+scale:
+
+    - reverse-keyed items are mirrored (min + max - response)
+    - a 0/1 item x scale membership matrix turns item sums and answered-item
+      counts into all scale means with two matrix products
+    - a scale score is the mean of the answered items, and missing when fewer
+      than min_fraction of its items were answered (prorating rule)
+    - 'percent' scales are rescaled to 0-100 as percent of the maximum
+      possible score, (mean - min) / (max - min) * 100
+
+Reliability is computed for every scale x condition cell at once: one
+batched einsum gives each cell's item covariance matrix (participants with
+all items of the scale answered), from which Cronbach's alpha, corrected
+item-total correlations and alpha-if-item-deleted follow with array
+reductions. McDonald's omega uses a one-factor principal-axis solution
+obtained with batched eigendecompositions (scales with at least 3 items).
+
+Item columns are named '<scale>_<item number>' (e.g. Intelligence_1); other
+layouts can be described with a custom scale dict.
+
+Usage:
+    scores = score_scales(df)                               # one column per scale
+    scale_table, item_table = reliability_analysis(df, condition_col='Display')
+"""
+
+import numpy as np
+import pandas as pd
+
+MIN_ITEM_FRACTION = 0.75
+
+
+def _scale(name, n_items, low, high, score='mean', reverse=()):
+    return {'items': [f'{name}_{i}' for i in range(1, n_items + 1)], 'min': low, 'max': high,
+            'score': score, 'reverse': [f'{name}_{i}' for i in reverse]}
+
+
+QUESTIONNAIRE_SCALES = {
+    'Trust_pre': _scale('Trust_pre', 7, 1, 7, score='percent'),
+    'Trust_post': _scale('Trust_post', 7, 1, 7, score='percent'),
+    'Anthropomorphism': _scale('Anthropomorphism', 5, 1, 5),
+    'Animacy': _scale('Animacy', 5, 1, 5),
+    'Likeability': _scale('Likeability', 5, 1, 5),
+    'Intelligence': _scale('Intelligence', 5, 1, 5),
+    'Safety': _scale('Safety', 3, 1, 5),
+    'Aesthetic': _scale('Aesthetic', 2, 1, 5),
+    'Familiarity': _scale('Familiarity', 3, 1, 5),
+    'Immersion': _scale('Immersion', 4, 1, 7),
+    'Self-efficacy': _scale('Self-efficacy', 3, 1, 7),
+}
+
+# Principal-axis iterations for the omega loadings
+OMEGA_ITERATIONS = 200
+
+
+def available_scales(df, scales=None):
+    """Subset of the scale definitions whose item columns are all present"""
+    scales = QUESTIONNAIRE_SCALES if scales is None else scales
+    return {name: spec for name, spec in scales.items() if all(item in df.columns for item in spec['items'])}
+
+
+def item_matrix(df, scales):
+    """Reverse-keyed participant x item matrix and the item x scale membership matrix
+
+    Out-of-range responses are treated as missing.
+    Returns (responses (n, T), membership (T, S), item names).
+    """
+    items = [item for spec in scales.values() for item in spec['items']]
+    responses = df[items].apply(pd.to_numeric, errors='coerce').to_numpy(dtype=float)
+    membership = np.zeros((len(items), len(scales)))
+    low = np.concatenate([[spec['min']] * len(spec['items']) for spec in scales.values()])
+    high = np.concatenate([[spec['max']] * len(spec['items']) for spec in scales.values()])
+    reverse = np.array([item in spec['reverse'] for spec in scales.values() for item in spec['items']])
+    start = 0
+    for s, spec in enumerate(scales.values()):
+        membership[start:start + len(spec['items']), s] = 1
+        start += len(spec['items'])
+    with np.errstate(invalid='ignore'):
+        responses = np.where((responses < low) | (responses > high), np.nan, responses)
+    responses = np.where(reverse, low + high - responses, responses)
+    return responses, membership, items
+
+
+def score_scales(df, scales=None, min_fraction=MIN_ITEM_FRACTION):
+    """Scale scores for every participant (one column per scale with items present)"""
+    scales = available_scales(df, scales)
+    if not scales:
+        return pd.DataFrame(index=df.index)
+    responses, membership, _ = item_matrix(df, scales)
+    answered = ~np.isnan(responses)
+    sums = np.where(answered, responses, 0.0) @ membership
+    counts = answered.astype(float) @ membership
+    n_items = membership.sum(axis=0)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        means = np.where(counts >= np.ceil(min_fraction * n_items), sums / counts, np.nan)
+    low = np.array([spec['min'] for spec in scales.values()], dtype=float)
+    high = np.array([spec['max'] for spec in scales.values()], dtype=float)
+    percent = np.array([spec['score'] == 'percent' for spec in scales.values()])
+    scores = np.where(percent, (means - low) / (high - low) * 100, means)
+    return pd.DataFrame(scores, index=df.index, columns=list(scales))
+
+
+def _cell_covariances(responses, weights):
+    """Item covariance matrices (ddof=1) for a (..., n) stack of 0/1 row weights"""
+    filled = np.where(np.isnan(responses), 0.0, responses)
+    n = weights.sum(axis=-1)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        mean = np.einsum('...n,ni->...i', weights, filled) / n[..., None]
+        cross = np.einsum('...n,ni,nj->...ij', weights, filled, filled, optimize=True)
+        cov = (cross - n[..., None, None] * mean[..., :, None] * mean[..., None, :]) / (n[..., None, None] - 1)
+    return n, mean, cov
+
+
+def _omega_loadings(cov):
+    """One-factor principal-axis loadings for a batch of (masked) covariance matrices"""
+    diag = np.diagonal(cov, axis1=-2, axis2=-1)
+    eye = np.eye(cov.shape[-1], dtype=bool)
+    # Start from each item's largest absolute covariance with another item
+    off = np.where(eye, 0.0, np.abs(cov))
+    communality = off.max(axis=-1)
+    for _ in range(OMEGA_ITERATIONS):
+        reduced = np.where(eye, communality[..., None] * eye, cov)
+        values, vectors = np.linalg.eigh(reduced)
+        loadings = vectors[..., -1] * np.sqrt(np.maximum(values[..., -1], 0.0))[..., None]
+        updated = np.minimum(loadings ** 2, 0.995 * diag)
+        if np.allclose(updated, communality, atol=1e-10):
+            break
+        communality = updated
+    # Orient the factor so that the loadings sum to a positive value
+    sign = np.where(loadings.sum(axis=-1) < 0, -1.0, 1.0)
+    return loadings * sign[..., None], diag - loadings ** 2
+
+
+def reliability_analysis(df, scales=None, condition_col=None):
+    """Cronbach's alpha, McDonald's omega and item statistics per scale x condition
+
+    Participants enter a scale's statistics when all its items are answered.
+    Returns (scale_table, item_table); the condition 'All' pools everyone.
+    """
+    scales = available_scales(df, scales)
+    if not scales:
+        return pd.DataFrame(), pd.DataFrame()
+    responses, membership, items = item_matrix(df, scales)
+    names = list(scales)
+    complete = (~np.isnan(responses)).astype(float) @ membership == membership.sum(axis=0)   # (n, S)
+
+    groups = [('All', np.ones(len(df), dtype=bool))]
+    if condition_col is not None:
+        values = df[condition_col]
+        groups += [(level, (values == level).to_numpy()) for level in sorted(values.dropna().unique())]
+    in_group = np.stack([mask for _, mask in groups])                      # (G, n)
+    weights = (in_group[:, None, :] & complete.T[None, :, :]).astype(float)  # (G, S, n)
+
+    n, mean, cov = _cell_covariances(responses, weights)                  # cov (G, S, T, T)
+    block = membership.T[:, :, None] * membership.T[:, None, :]            # (S, T, T)
+    cov = np.where(block[None] > 0, cov, 0.0)
+    k = membership.sum(axis=0)                                            # (S,)
+    item_var = np.diagonal(cov, axis1=-2, axis2=-1)                       # (G, S, T)
+    total_var = cov.sum(axis=(-2, -1))                                    # (G, S)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        alpha = k / (k - 1) * (1 - item_var.sum(axis=-1) / total_var)
+        # Corrected item-total statistics (item vs. the sum of the other items)
+        item_cov_total = cov.sum(axis=-1)                                 # (G, S, T)
+        rest_var = total_var[..., None] - 2 * item_cov_total + item_var
+        item_total_r = (item_cov_total - item_var) / np.sqrt(item_var * rest_var)
+        alpha_deleted = (k[:, None] - 1) / (k[:, None] - 2) * (
+            1 - (item_var.sum(axis=-1, keepdims=True) - item_var) / rest_var)
+
+    usable = np.isfinite(cov).all(axis=(-2, -1)) & (k[None] >= 3) & (n > k[None])
+    safe = np.where(usable[..., None, None], cov, np.eye(cov.shape[-1]))
+    loadings, uniqueness = _omega_loadings(safe)
+    member = membership.T[None] > 0
+    common = np.where(member, loadings, 0.0).sum(axis=-1) ** 2
+    unique = np.where(member, uniqueness, 0.0).sum(axis=-1)
+    omega = np.where(usable, common / (common + unique), np.nan)
+
+    scale_rows, item_rows = [], []
+    for g, (level, _) in enumerate(groups):
+        for s, name in enumerate(names):
+            scale_rows.append({'scale': name, 'condition': level, 'n_complete': int(n[g, s]),
+                               'n_items': int(k[s]), 'alpha': alpha[g, s], 'omega': omega[g, s]})
+            for t in np.flatnonzero(membership[:, s]):
+                item_rows.append({'scale': name, 'condition': level, 'item': items[t],
+                                  'mean': mean[g, s, t], 'sd': np.sqrt(item_var[g, s, t]),
+                                  'item_total_r': item_total_r[g, s, t],
+                                  'alpha_if_deleted': alpha_deleted[g, s, t] if k[s] > 2 else np.nan,
+                                  'loading': loadings[g, s, t] if usable[g, s] else np.nan})
+    return pd.DataFrame(scale_rows), pd.DataFrame(item_rows)
@@ -0,0 +1,185 @@
+"""
+Sequential (Post-Error) Effects
+VR Maze Navigation Studies
+
+error_corner_mean_time describes the agent error corners themselves; this
+module describes what happens after them, i.e. how trust is repaired:
+
+    seq_pes_lag{L}                 post-error slowing, robust form (Dutilh et
+                                   al., 2012): time at corner e + L minus time at
+                                   the corner before the error, e - 1
+    seq_post_error_time_lag{L}     mean time L corners after an error
+    seq_post_correct_time_lag{L}   mean time L corners after a correct corner
+    seq_post_error_compliance_lag{L}, seq_post_correct_compliance_lag{L}
+                                   the same for following the agent (0-100 %)
+    seq_compliance_drop_lag{L}     compliance at e - 1 minus compliance at e + L
+    seq_recovery_follow_length     corners after an error until the agent is
+                                   followed again (1 = at the next corner)
+    seq_recovery_time_length       corners after an error until the decision
+                                   time is back at or below its pre-error level
+    seq_recovery_censored          errors without recovery before the maze ends
+
+Errors are either the design's agent error corners ('agent_error') or only
+those where the participant followed the wrong advice ('misled'). Targets
+that are themselves error corners are excluded, so post-error values are not
+mixed with the slowing at the next error.
+
+Lags are shifted views of the participant x corner matrices, and all lags are
+stacked along a leading axis, so every participant, lag and metric comes out
+of one set of array reductions; sequential_summary() then aggregates all
+conditions in one stacked reduction as well.
+
+Usage:
+    seq = sequential_metrics(corner_times(df), followed_matrix(df, design), design, lags=(1, 2))
+    summary = sequential_summary(pd.DataFrame(seq), df['Display'])
+"""
+
+import numpy as np
+import pandas as pd
+from scipy import stats
+
+from group_tests import summary_stats
+
+EVENTS = ('agent_error', 'misled')
+
+
+def shift_corners(values, lag, fill=np.nan):
+    """View of values shifted along the corner axis: result[..., c] = values[..., c + lag]"""
+    values = np.asarray(values, dtype=float)
+    shifted = np.full(values.shape, fill, dtype=float)
+    if lag > 0:
+        shifted[..., :-lag] = values[..., lag:]
+    elif lag < 0:
+        shifted[..., -lag:] = values[..., :lag]
+    else:
+        shifted[...] = values
+    return shifted
+
+
+def error_events(design, followed=None, event='agent_error', n=None):
+    """Boolean (n, K) matrix of error events"""
+    if event not in EVENTS:
+        raise ValueError(f"Unknown event {event!r}; use one of {EVENTS}")
+    corners = np.arange(1, design['n_corners'] + 1)
+    errors = np.isin(corners, design['error_corners'])
+    n = len(followed) if followed is not None else n
+    events = np.broadcast_to(errors, (n, len(corners))).copy()
+    if event == 'misled':
+        if followed is None:
+            raise ValueError("event='misled' needs the follow matrix")
+        events &= np.asarray(followed) == 1
+    return events
+
+
+def _masked_mean(values, mask, axis=-1):
+    valid = mask & ~np.isnan(values)
+    counts = valid.sum(axis=axis)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        return np.where(counts > 0, np.where(valid, values, 0.0).sum(axis=axis) / counts, np.nan)
+
+
+def _lagged(values, lags):
+    """(L, n, K) stack of values shifted by each lag"""
+    return np.stack([shift_corners(values, lag) for lag in lags])
+
+
+def _recovery_length(condition, events):
+    """Corners from each event to the first later corner where condition holds
+
+    condition: (n, K) or (E, n, K) boolean (one matrix per event column).
+    Returns (mean length per participant over recovered events, censored count).
+    """
+    n, K = events.shape
+    index = np.arange(K)
+    lengths = np.full((n, K), np.nan)
+    censored = np.zeros(n, dtype=int)
+    for e in np.flatnonzero(events.any(axis=0)):
+        cond = condition[e] if condition.ndim == 3 else condition
+        later = cond & (index > e)
+        found = later.any(axis=1)
+        first = np.argmax(later, axis=1)
+        lengths[:, e] = np.where(events[:, e] & found, first - e, np.nan)
+        censored += events[:, e] & ~found
+    return _masked_mean(lengths, ~np.isnan(lengths)), censored
+
+
+def sequential_metrics(times, followed, design, lags=(1,), event='agent_error', exclude_error_targets=True):
+    """Post-error slowing, compliance change and recovery for every participant and lag
+
+    times: (n, K) decision times (NaN = missing); followed: (n, K) follow
+    matrix (1 / 0 / NaN) or None when the agent route is not coded (compliance
+    metrics are then omitted; 'misled' needs it). Returns a dict of (n,) arrays.
+    """
+    times = np.asarray(times, dtype=float)
+    n, K = times.shape
+    lags = list(lags)
+    events = error_events(design, followed, event, n=n)
+    corners = np.arange(1, K + 1)
+    design_errors = np.isin(corners, design['error_corners'])
+    non_error = ~design_errors
+    # Each lag's target corner c + L must exist (and not be an error corner)
+    target_ok = _lagged(non_error if exclude_error_targets else np.ones(K), lags) == 1   # (L, K)
+    # Correct corners: no error event there
+    correct = ~design_errors[None, :] & np.ones((n, 1), dtype=bool)
+    pre_ok = shift_corners(non_error, -1) == 1                   # corner e - 1 exists and is not an error
+
+    post_event = events[None] & target_ok[:, None, :]            # (L, n, K)
+    post_correct = correct[None] & target_ok[:, None, :]
+    robust = post_event & pre_ok[None, None, :]
+
+    metrics = {}
+    post_times = _lagged(times, lags)                            # (L, n, K): time at c + L
+    pre_times = shift_corners(times, -1)                         # time at c - 1
+    pes = _masked_mean(post_times - pre_times[None], robust)
+    post_error_time = _masked_mean(post_times, post_event)
+    post_correct_time = _masked_mean(post_times, post_correct)
+    for i, lag in enumerate(lags):
+        metrics[f'seq_pes_lag{lag}'] = pes[i]
+        metrics[f'seq_post_error_time_lag{lag}'] = post_error_time[i]
+        metrics[f'seq_post_correct_time_lag{lag}'] = post_correct_time[i]
+
+    if followed is not None:
+        followed = np.asarray(followed, dtype=float) * 100
+        post_follow = _lagged(followed, lags)
+        pre_follow = shift_corners(followed, -1)
+        drop = _masked_mean(pre_follow[None] - post_follow, robust)
+        post_error_follow = _masked_mean(post_follow, post_event)
+        post_correct_follow = _masked_mean(post_follow, post_correct)
+        for i, lag in enumerate(lags):
+            metrics[f'seq_post_error_compliance_lag{lag}'] = post_error_follow[i]
+            metrics[f'seq_post_correct_compliance_lag{lag}'] = post_correct_follow[i]
+            metrics[f'seq_compliance_drop_lag{lag}'] = drop[i]
+        metrics['seq_recovery_follow_length'], follow_censored = _recovery_length(followed == 100, events)
+
+    # Time recovery: back at or below the time at the corner before each error
+    baseline = shift_corners(times, -1)                          # (n, K): pre-error time at each e
+    back = np.stack([times <= baseline[:, [e]] for e in range(K)])   # (K, n, K)
+    metrics['seq_recovery_time_length'], time_censored = _recovery_length(back, events & pre_ok[None, :])
+    metrics['seq_recovery_censored'] = time_censored + (follow_censored if followed is not None else 0)
+    return metrics
+
+
+def sequential_summary(metrics, groups, columns=None):
+    """Per-condition mean, SD and n of every sequential metric, with a one-sample t-test against 0
+
+    metrics: DataFrame of sequential_metrics columns; groups: condition label
+    per participant ('All' pools everyone). The t-test is meaningful for the
+    difference metrics (seq_pes_*, seq_compliance_drop_*).
+    """
+    columns = [c for c in (columns or metrics.columns) if c != 'seq_recovery_censored']
+    values = metrics[columns].to_numpy(dtype=float)
+    labels = np.asarray(groups, dtype=object)
+    levels = ['All'] + sorted(pd.unique(labels[pd.notna(labels)]), key=str)
+    masks = np.stack([np.ones(len(labels), dtype=bool)] + [labels == level for level in levels[1:]])
+    # (G, M, n) stack: every condition x metric in one reduction
+    stacked = np.where(masks[:, None, :], values.T[None], np.nan)
+    n, mean, var = summary_stats(stacked)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        t = mean / np.sqrt(var / n)
+    p = 2 * stats.t.sf(np.abs(t), n - 1)
+    return pd.DataFrame({
+        'condition': np.repeat(np.array(levels, dtype=object), len(columns)),
+        'metric': np.tile(columns, len(levels)),
+        'n': n.ravel(), 'mean': mean.ravel(), 'sd': np.sqrt(var).ravel(),
+        't_vs_0': t.ravel(), 'p_vs_0': p.ravel(),
+    })
@@ -0,0 +1,91 @@
+"""
+Signal-Detection Metrics for Follow Decisions
+VR Maze Navigation Studies
+
+Implements the signal-detection formulation of compliance discrimination
+(METRICS_CALCULATION_GUIDE.md, section 4.2). Each corner decision is
+classified against the agent route:
+
+                          followed agent      deviated
+    agent correct         hit                 miss
+    agent wrong (error)   false alarm         correct rejection
+
+so the "signal" is a correct recommendation and the "yes" response is
+following it. d' measures how well a participant discriminates good from bad
+advice and c their overall bias towards following (negative c = liberal
+follower). Rates use the log-linear correction (Hautus, 1995), which keeps d'
+finite when a participant has no misses or no false alarms.
+
+All functions work on participant x corner follow matrices, so every
+participant (or simulated study) is scored in one pass.
+
+Usage:
+    sdt = signal_detection_metrics(followed_matrix(df, design), agent_correct_mask(design))
+    df = df.assign(**sdt)
+"""
+
+import numpy as np
+from scipy import stats
+
+SDT_METRICS = ['sdt_hits', 'sdt_misses', 'sdt_false_alarms', 'sdt_correct_rejections',
+               'sdt_hit_rate', 'sdt_false_alarm_rate', 'sdt_dprime', 'sdt_criterion']
+
+# Outcome codes returned by classify_decisions
+MISSING, CORRECT_REJECTION, FALSE_ALARM, MISS, HIT = -1, 0, 1, 2, 3
+
+
+def classify_decisions(followed, signal):
+    """Outcome code per decision: HIT / MISS / FALSE_ALARM / CORRECT_REJECTION / MISSING
+
+    followed: (..., K) array, 1 = followed agent, 0 = deviated, NaN = missing
+    signal: (K,) boolean mask of corners where the agent recommendation is correct
+    """
+    followed = np.asarray(followed, dtype=float)
+    codes = 2 * np.asarray(signal, dtype=int) + np.where(followed == 1, 1, 0)
+    return np.where(np.isnan(followed), MISSING, codes)
+
+
+def sdt_counts(followed, signal):
+    """Hits, misses, false alarms and correct rejections along the last axis"""
+    codes = classify_decisions(followed, signal)
+    return tuple((codes == code).sum(axis=-1) for code in (HIT, MISS, FALSE_ALARM, CORRECT_REJECTION))
+
+
+def sdt_indices(hits, misses, false_alarms, correct_rejections, correction='loglinear'):
+    """Hit rate, false-alarm rate, d' and criterion c from counts
+
+    correction='loglinear' adds 0.5 to every cell; correction=None uses the raw
+    rates (d' is then infinite for perfect performance). A rate without any
+    decisions on its corners is missing (not 0.5), and so are d' and c.
+    """
+    hits, misses = np.asarray(hits, dtype=float), np.asarray(misses, dtype=float)
+    false_alarms = np.asarray(false_alarms, dtype=float)
+    correct_rejections = np.asarray(correct_rejections, dtype=float)
+    add = 0.5 if correction == 'loglinear' else 0.0
+    n_signal, n_noise = hits + misses, false_alarms + correct_rejections
+    with np.errstate(invalid='ignore', divide='ignore'):
+        hit_rate = np.where(n_signal > 0, (hits + add) / (n_signal + 2 * add), np.nan)
+        fa_rate = np.where(n_noise > 0, (false_alarms + add) / (n_noise + 2 * add), np.nan)
+    z_hit, z_fa = stats.norm.ppf(hit_rate), stats.norm.ppf(fa_rate)
+    return {
+        'hit_rate': hit_rate,
+        'false_alarm_rate': fa_rate,
+        'dprime': z_hit - z_fa,
+        'criterion': -(z_hit + z_fa) / 2,
+    }
+
+
+def signal_detection_metrics(followed, signal, correction='loglinear'):
+    """All SDT metrics as a dict of arrays keyed by the SDT_METRICS column names"""
+    hits, misses, false_alarms, correct_rejections = sdt_counts(followed, signal)
+    indices = sdt_indices(hits, misses, false_alarms, correct_rejections, correction)
+    return {
+        'sdt_hits': hits,
+        'sdt_misses': misses,
+        'sdt_false_alarms': false_alarms,
+        'sdt_correct_rejections': correct_rejections,
+        'sdt_hit_rate': indices['hit_rate'],
+        'sdt_false_alarm_rate': indices['false_alarm_rate'],
+        'sdt_dprime': indices['dprime'],
+        'sdt_criterion': indices['criterion'],
+    }
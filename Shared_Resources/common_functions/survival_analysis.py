@@ -0,0 +1,219 @@
+"""
+Time-to-First-Deviation Survival Analysis
+VR Maze Navigation Studies
+
+At which corner does each participant first stop following the agent, and how
+does that differ by condition? The event is the first corner where the chosen
+direction differs from the agent recommendation; participants who follow the
+agent at every corner they reached are censored at their last observed corner.
+
+Everything works on participant x corner arrays and per-group count tables
+(built with one bincount), so the cost of the curves and tests depends on
+groups x corners rather than on the number of sequences:
+
+    - first_deviation(): event corner / indicator via argmax over the corners
+    - kaplan_meier(): survival curves with Greenwood SEs for all groups at once
+    - logrank_test(): k-group log-rank chi-square
+    - discrete_hazard_model(): logistic discrete-time hazard model fitted by
+      IRLS on aggregated (group x corner) event counts
+
+Usage:
+    surv = survival_data(df, STUDY1_DESIGN)
+    curves = kaplan_meier(surv['time'], surv['event'], surv['group'])
+    print(logrank_test(surv['time'], surv['event'], surv['group']))
+"""
+
+import numpy as np
+import pandas as pd
+from scipy import stats
+
+from trust_metrics import corner_numbers, error_corner_mask, followed_matrix, phase1_mask
+
+
+def first_deviation(followed):
+    """First-deviation corner and event indicator from a (N, K) follow matrix
+
+    Returns (time, event): time is the 1-based corner of the first deviation
+    (event = 1) or the last observed corner (event = 0); participants with no
+    observed corners get time 0 and are excluded from the risk sets.
+    """
+    followed = np.asarray(followed, dtype=float)
+    deviated = followed == 0
+    observed = ~np.isnan(followed)
+    event = deviated.any(axis=1)
+    first = deviated.argmax(axis=1) + 1
+    k = followed.shape[1]
+    last_observed = np.where(observed.any(axis=1), k - observed[:, ::-1].argmax(axis=1), 0)
+    return np.where(event, first, last_observed), event.astype(int)
+
+
+def survival_data(df, design, group_col=None):
+    """Per-participant first-deviation time, event and group label as a DataFrame"""
+    time, event = first_deviation(followed_matrix(df, design))
+    group_col = group_col or design['condition_col']
+    return pd.DataFrame({'time': time, 'event': event, 'group': df[group_col].to_numpy()},
+                        index=df.index)
+
+
+def event_table(time, event, group=None, n_times=None):
+    """Group x time counts of events, censorings and the number at risk
+
+    Returns (groups, times, deaths, censored, at_risk) with the count arrays
+    shaped (n_groups, n_times).
+    """
+    time = np.asarray(time, dtype=int)
+    event = np.asarray(event, dtype=int)
+    if group is None:
+        group = np.zeros(len(time), dtype=int)
+    codes, groups = pd.factorize(np.asarray(group), sort=True)
+    keep = (codes >= 0) & (time > 0)
+    time, event, codes = time[keep], event[keep], codes[keep]
+    n_times = n_times or int(time.max())
+    n_groups = len(groups)
+
+    flat = codes * n_times + (time - 1)
+    size = n_groups * n_times
+    deaths = np.bincount(flat, weights=event, minlength=size).reshape(n_groups, n_times)
+    leaving = np.bincount(flat, minlength=size).reshape(n_groups, n_times)
+    censored = leaving - deaths
+    # At risk at t: everyone whose time is >= t
+    at_risk = leaving[:, ::-1].cumsum(axis=1)[:, ::-1]
+    return list(groups), np.arange(1, n_times + 1), deaths, censored, at_risk
+
+
+def kaplan_meier(time, event, group=None, n_times=None):
+    """Kaplan-Meier survival (probability of not having deviated yet) per group
+
+    Returns a long DataFrame: group, corner, at_risk, events, censored,
+    survival, se (Greenwood) and a 95% log-log confidence interval.
+    """
+    groups, times, deaths, censored, at_risk = event_table(time, event, group, n_times)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        hazard = np.where(at_risk > 0, deaths / at_risk, 0.0)
+        survival = np.cumprod(1 - hazard, axis=1)
+        greenwood = np.cumsum(np.where(at_risk > deaths, deaths / (at_risk * (at_risk - deaths)), 0.0),
+                              axis=1)
+        se = survival * np.sqrt(greenwood)
+        log_log_se = np.sqrt(greenwood) / np.abs(np.log(survival))
+        z = stats.norm.ppf(0.975)
+        lower = survival ** np.exp(z * log_log_se)
+        upper = survival ** np.exp(-z * log_log_se)
+
+    n_groups, n_times = deaths.shape
+    return pd.DataFrame({
+        'group': np.repeat(groups, n_times),
+        'corner': np.tile(times, n_groups),
+        'at_risk': at_risk.ravel(),
+        'events': deaths.ravel(),
+        'censored': censored.ravel(),
+        'survival': survival.ravel(),
+        'se': se.ravel(),
+        'ci_lower': np.where(np.isfinite(lower), lower, survival).ravel(),
+        'ci_upper': np.where(np.isfinite(upper), upper, survival).ravel(),
+    })
+
+
+def median_deviation_corner(curves):
+    """First corner at which survival drops to 0.5 or below, per group (NaN if never)"""
+    reached = curves[curves['survival'] <= 0.5]
+    medians = reached.groupby('group', sort=False)['corner'].min()
+    return medians.reindex(curves['group'].unique())
+
+
+def logrank_test(time, event, group, n_times=None):
+    """k-group log-rank test of equal first-deviation hazards"""
+    groups, _, deaths, _, at_risk = event_table(time, event, group, n_times)
+    d_total = deaths.sum(axis=0)
+    n_total = at_risk.sum(axis=0)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        share = np.where(n_total > 0, at_risk / n_total, 0.0)
+        ties = np.where(n_total > 1, d_total * (n_total - d_total) / (n_total - 1), 0.0)
+    expected = (share * d_total).sum(axis=1)
+    observed = deaths.sum(axis=1)
+    # Hypergeometric covariance summed over corners
+    cov = -np.einsum('t,gt,ht->gh', ties, share, share)
+    cov[np.diag_indices(len(groups))] = (ties * share * (1 - share)).sum(axis=1)
+    diff = (observed - expected)[:-1]
+    chi2 = float(diff @ np.linalg.solve(cov[:-1, :-1], diff))
+    dof = len(groups) - 1
+    return {
+        'chi2': chi2,
+        'df': dof,
+        'p': stats.chi2.sf(chi2, dof),
+        'table': pd.DataFrame({'observed': observed, 'expected': expected}, index=groups),
+    }
+
+
+def _irls_binomial(X, events, trials, max_iter=50, tol=1e-10):
+    """Logistic regression on aggregated binomial counts (IRLS)"""
+    beta = np.zeros(X.shape[1])
+    rate = (events.sum() + 0.5) / (trials.sum() + 1.0)
+    beta[0] = np.log(rate / (1 - rate))
+    for _ in range(max_iter):
+        eta = X @ beta
+        mu = 1 / (1 + np.exp(-eta))
+        w = trials * mu * (1 - mu)
+        z = eta + (events - trials * mu) / np.maximum(w, 1e-12)
+        xtw = X.T * w
+        new_beta = np.linalg.solve(xtw @ X, xtw @ z)
+        if np.max(np.abs(new_beta - beta)) < tol:
+            beta = new_beta
+            break
+        beta = new_beta
+    mu = 1 / (1 + np.exp(-(X @ beta)))
+    info = (X.T * (trials * mu * (1 - mu))) @ X
+    loglik = float((events * np.log(mu) + (trials - events) * np.log(1 - mu)).sum())
+    return beta, np.linalg.inv(info), loglik
+
+
+def discrete_hazard_model(time, event, group, design, baseline='corner', reference=None):
+    """Discrete-time (logistic) hazard model of the first deviation
+
+    logit h(t | group) = baseline(t) + group effect, fitted on the aggregated
+    group x corner risk-set counts. baseline='corner' uses one intercept per
+    corner; baseline='linear' uses a linear corner trend plus phase 2 and
+    agent error corner indicators. Group effects are log odds ratios against
+    `reference` (default: the first group).
+    """
+    groups, times, deaths, _, at_risk = event_table(time, event, group, design['n_corners'])
+    reference = groups[0] if reference is None else reference
+    n_groups, n_times = deaths.shape
+    g = np.repeat(np.arange(n_groups), n_times)
+    t = np.tile(np.arange(n_times), n_groups)
+    events, trials = deaths.ravel(), at_risk.ravel().astype(float)
+    keep = trials > 0
+
+    corners = corner_numbers(design)[:n_times]
+    if baseline == 'corner':
+        observed_corners = np.unique(t[keep & (events > 0)])
+        columns = [(t == c).astype(float) for c in observed_corners]
+        names = [f'corner{corners[c]}' for c in observed_corners]
+        keep &= np.isin(t, observed_corners)
+    elif baseline == 'linear':
+        columns = [np.ones(len(t)), (corners - corners.mean())[t],
+                   (~phase1_mask(design)[:n_times])[t].astype(float),
+                   error_corner_mask(design)[:n_times][t].astype(float)]
+        names = ['Intercept', 'corner', 'phase2', 'error_corner']
+    else:
+        raise ValueError(f"Unknown baseline {baseline!r} (use 'corner' or 'linear')")
+    for i, level in enumerate(groups):
+        if level != reference:
+            columns.append((g == i).astype(float))
+            names.append(f'group[{level}]')
+
+    X = np.column_stack(columns)[keep]
+    if baseline == 'corner':
+        # Cell-means parametrisation: make the first corner column the intercept
+        X[:, 0] = 1.0
+        names[0] = 'Intercept'
+    beta, cov, loglik = _irls_binomial(X, events[keep], trials[keep])
+    se = np.sqrt(np.diag(cov))
+    z = beta / se
+    crit = stats.norm.ppf(0.975)
+    table = pd.DataFrame({
+        'coef': beta, 'se': se, 'z': z, 'p': 2 * stats.norm.sf(np.abs(z)),
+        'odds_ratio': np.exp(beta),
+        'or_ci_lower': np.exp(beta - crit * se), 'or_ci_upper': np.exp(beta + crit * se),
+    }, index=names)
+    return {'coefficients': table, 'loglik': loglik, 'n_person_corners': int(trials.sum()),
+            'reference': reference}
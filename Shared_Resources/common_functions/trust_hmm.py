@@ -0,0 +1,248 @@
+"""
+Hidden-Markov Trust-State Model
+VR Maze Navigation Studies
+
+initial_trust (corner 1) and the phase splits are coarse proxies for a latent
+trust state that changes corner by corner, especially after the agent errors.
+This module fits a two-state HMM (state 0 = distrust, state 1 = trust) to the
+follow / deviate sequences built from the corner direction columns, optionally
+with log decision time as a second emission.
+
+    - initial state and transition probabilities are estimated per condition
+    - transitions out of an agent error corner have their own matrix, so the
+      model can show trust being lost (and regained) after corners 3, 7 and 9
+    - emission parameters are shared across conditions, so "trust" means the
+      same behaviour in every condition
+
+Forward-backward and EM are vectorized over participants (the only Python
+loop is over the corners), and missing corners simply contribute no evidence.
+
+Usage:
+    fit = fit_trust_hmm(df, STUDY1_DESIGN, use_times=True)
+    posteriors = trust_state_posteriors(fit, df)      # hmm_trust_corner1..10
+    df = df.join(posteriors)
+"""
+
+import numpy as np
+import pandas as pd
+
+from decision_time_cleaning import trim_times
+from trust_metrics import corner_numbers, corner_times, followed_matrix
+
+N_STATES = 2
+STATE_LABELS = ['distrust', 'trust']
+
+
+def hmm_observations(df, design, use_times=False):
+    """Follow matrix, log-time matrix of the trimmed times (or None) and condition codes for the HMM"""
+    followed = followed_matrix(df, design)
+    log_times = None
+    if use_times:
+        times = trim_times(corner_times(df, design['n_corners']), design.get('time_cleaning'))
+        with np.errstate(invalid='ignore', divide='ignore'):
+            log_times = np.where(times > 0, np.log(times), np.nan)
+    conditions = list(design['conditions'])
+    codes = pd.Categorical(df[design['condition_col']], categories=conditions).codes
+    return followed, log_times, codes
+
+
+def _error_transition_index(design):
+    """For each corner t > 1: 1 if corner t-1 was an agent error corner, else 0"""
+    corners = corner_numbers(design)
+    return np.isin(corners[:-1], design['error_corners']).astype(int)
+
+
+def initial_hmm_parameters(n_conditions, log_times=None, rng=None):
+    """Starting values: trust state follows often, distrust state rarely"""
+    params = {
+        'initial': np.tile([0.3, 0.7], (n_conditions, 1)),
+        'transition': np.tile(np.array([[0.8, 0.2], [0.1, 0.9]]), (n_conditions, 2, 1, 1)),
+        'follow_prob': np.array([0.35, 0.9]),
+    }
+    if rng is not None:
+        params['initial'] = rng.dirichlet([4, 4], n_conditions)
+        params['transition'] = rng.dirichlet([4, 4], (n_conditions, 2, N_STATES))
+        params['follow_prob'] = np.sort(rng.uniform(0.2, 0.95, N_STATES))
+    if log_times is not None:
+        mean, sd = np.nanmean(log_times), np.nanstd(log_times)
+        # Hesitant (distrust) decisions start out slower
+        params['time_mean'] = np.array([mean + 0.25 * sd, mean - 0.25 * sd])
+        params['time_sd'] = np.array([sd, sd])
+    return params
+
+
+def emission_likelihoods(params, followed, log_times=None):
+    """(N, K, S) likelihood of each corner's observations under each state"""
+    p = params['follow_prob']
+    follow = followed[..., None]
+    lik = np.where(np.isnan(follow), 1.0, np.where(follow == 1, p, 1 - p))
+    if log_times is not None:
+        z = (log_times[..., None] - params['time_mean']) / params['time_sd']
+        density = np.exp(-0.5 * z ** 2) / (np.sqrt(2 * np.pi) * params['time_sd'])
+        lik = lik * np.where(np.isnan(z), 1.0, density)
+    return lik
+
+
+def forward_backward(params, emissions, codes, error_prev):
+    """Scaled forward-backward for all sequences at once
+
+    Returns posterior state probabilities gamma (N, K, S), pairwise posteriors
+    xi (N, K-1, S, S) and the log-likelihood of each sequence.
+    """
+    n, k, s = emissions.shape
+    # Per-participant transition matrices for regular and post-error steps, (N, S, S) each
+    transitions = [np.ascontiguousarray(params['transition'][codes, e]) for e in (0, 1)]
+    alpha = np.empty((n, k, s))
+    scale = np.empty((n, k))
+
+    alpha[:, 0] = params['initial'][codes] * emissions[:, 0]
+    scale[:, 0] = alpha[:, 0].sum(axis=1)
+    alpha[:, 0] /= scale[:, 0, None]
+    for t in range(1, k):
+        step = transitions[error_prev[t - 1]]
+        alpha[:, t] = np.einsum('ns,nst->nt', alpha[:, t - 1], step) * emissions[:, t]
+        scale[:, t] = alpha[:, t].sum(axis=1)
+        alpha[:, t] /= scale[:, t, None]
+
+    beta = np.ones((n, k, s))
+    xi = np.empty((n, k - 1, s, s))
+    for t in range(k - 1, 0, -1):
+        step = transitions[error_prev[t - 1]]
+        weighted = emissions[:, t] * beta[:, t]
+        xi[:, t - 1] = alpha[:, t - 1, :, None] * step * weighted[:, None, :] / scale[:, t, None, None]
+        beta[:, t - 1] = np.einsum('nst,nt->ns', step, weighted) / scale[:, t, None]
+
+    gamma = alpha * beta
+    gamma /= gamma.sum(axis=2, keepdims=True)
+    return gamma, xi, np.log(scale).sum(axis=1)
+
+
+def _m_step(params, gamma, xi, followed, log_times, codes, error_prev, n_conditions,
+            pseudo_count):
+    """Update parameters from the posterior expectations"""
+    onehot = np.eye(n_conditions)[codes]                       # (N, C)
+    updated = dict(params)
+
+    initial = onehot.T @ gamma[:, 0] + pseudo_count
+    updated['initial'] = initial / initial.sum(axis=1, keepdims=True)
+
+    transition = np.full((n_conditions, 2, N_STATES, N_STATES), pseudo_count)
+    for e in (0, 1):
+        steps = error_prev == e
+        if steps.any():
+            counts = xi[:, steps].sum(axis=1).reshape(len(codes), -1)
+            transition[:, e] += (onehot.T @ counts).reshape(n_conditions, N_STATES, N_STATES)
+    updated['transition'] = transition / transition.sum(axis=3, keepdims=True)
+
+    observed = ~np.isnan(followed)
+    weight = gamma * observed[..., None]
+    follows = gamma * np.where(observed, followed, 0.0)[..., None]
+    updated['follow_prob'] = (follows.sum(axis=(0, 1)) + pseudo_count) \
+        / (weight.sum(axis=(0, 1)) + 2 * pseudo_count)
+    if log_times is not None:
+        timed = ~np.isnan(log_times)
+        w = gamma * timed[..., None]
+        x = np.where(timed, log_times, 0.0)[..., None]
+        total = w.sum(axis=(0, 1))
+        mean = (w * x).sum(axis=(0, 1)) / total
+        var = (w * (x - mean) ** 2).sum(axis=(0, 1)) / total
+        updated['time_mean'] = mean
+        updated['time_sd'] = np.sqrt(np.maximum(var, 1e-6))
+    return updated
+
+
+def _order_states(params):
+    """Relabel states so that state 1 is the one that follows the agent more"""
+    if params['follow_prob'][1] >= params['follow_prob'][0]:
+        return params
+    flip = [1, 0]
+    ordered = dict(params)
+    ordered['initial'] = params['initial'][:, flip]
+    ordered['transition'] = params['transition'][:, :, flip][:, :, :, flip]
+    for key in ('follow_prob', 'time_mean', 'time_sd'):
+        if key in params:
+            ordered[key] = params[key][flip]
+    return ordered
+
+
+def fit_trust_hmm(df, design, use_times=False, max_iter=200, tol=1e-6, n_init=1,
+                  pseudo_count=0.5, seed=2024):
+    """Fit the two-state trust HMM by EM
+
+    n_init > 1 adds random restarts (the default start is always included);
+    the restart with the highest log-likelihood is returned. pseudo_count is a
+    symmetric Dirichlet/Beta prior count that keeps probabilities off 0 and 1.
+    """
+    followed, log_times, codes = hmm_observations(df, design, use_times)
+    keep = codes >= 0
+    followed, codes = followed[keep], codes[keep]
+    if log_times is not None:
+        log_times = log_times[keep]
+    n_conditions = len(design['conditions'])
+    error_prev = _error_transition_index(design)
+    rng = np.random.default_rng(seed)
+
+    best = None
+    for start in range(n_init):
+        params = initial_hmm_parameters(n_conditions, log_times, rng if start else None)
+        history = []
+        for _ in range(max_iter):
+            emissions = emission_likelihoods(params, followed, log_times)
+            gamma, xi, loglik = forward_backward(params, emissions, codes, error_prev)
+            history.append(loglik.sum())
+            if len(history) > 1 and abs(history[-1] - history[-2]) < tol * abs(history[-2]):
+                break
+            params = _m_step(params, gamma, xi, followed, log_times, codes, error_prev,
+                             n_conditions, pseudo_count)
+        if best is None or history[-1] > best['loglik']:
+            best = {'params': params, 'loglik': history[-1], 'history': history,
+                    'converged': len(history) < max_iter}
+
+    n_params = n_conditions * (1 + 2 * N_STATES) + N_STATES * (3 if use_times else 1)
+    return {
+        'params': _order_states(best['params']),
+        'design': design,
+        'use_times': use_times,
+        'loglik': best['loglik'],
+        'bic': -2 * best['loglik'] + n_params * np.log(keep.sum()),
+        'n_iter': len(best['history']),
+        'converged': best['converged'],
+    }
+
+
+def trust_state_posteriors(fit, df):
+    """P(trust state) at every corner, one hmm_trust_corner{c} column per corner
+
+    Participants outside the design conditions get NaN. Also adds the expected
+    number of corners spent in the trust state (hmm_expected_trust_corners).
+    """
+    design = fit['design']
+    followed, log_times, codes = hmm_observations(df, design, fit['use_times'])
+    columns = [f'hmm_trust_corner{c}' for c in corner_numbers(design)]
+    result = pd.DataFrame(np.nan, index=df.index, columns=columns + ['hmm_expected_trust_corners'])
+    keep = codes >= 0
+    if not keep.any():
+        return result
+    emissions = emission_likelihoods(fit['params'], followed[keep],
+                                     None if log_times is None else log_times[keep])
+    gamma, _, _ = forward_backward(fit['params'], emissions, codes[keep], _error_transition_index(design))
+    trust = gamma[..., 1]
+    result.loc[keep, columns] = trust
+    result.loc[keep, 'hmm_expected_trust_corners'] = trust.sum(axis=1)
+    return result
+
+
+def hmm_parameter_table(fit):
+    """Per-condition initial trust and transition probabilities as a DataFrame"""
+    params = fit['params']
+    rows = []
+    for i, condition in enumerate(fit['design']['conditions']):
+        for e, after in enumerate(['regular corner', 'agent error']):
+            rows.append({
+                'condition': condition,
+                'after': after,
+                'P(initial trust)': params['initial'][i, 1],
+                'P(trust -> distrust)': params['transition'][i, e, 1, 0],
+                'P(distrust -> trust)': params['transition'][i, e, 0, 1],
+            })
+    return pd.DataFrame(rows)
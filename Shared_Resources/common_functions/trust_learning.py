@@ -0,0 +1,202 @@
+"""
+Reinforcement-Learning Trust-Update Model
+VR Maze Navigation Studies
+
+Models how each participant updates reliance on the agent corner by corner:
+
+    V_1     = V0                                  (initial trust prior)
+    P(follow at corner t) = logistic(beta * (V_t - 0.5))
+    V_{t+1} = V_t + alpha * (r_t - V_t)           (r_t = 1 if the agent was right)
+
+with learning rate alpha, initial trust V0 and inverse choice temperature
+beta. Instead of one scipy.optimize call per participant, the log-likelihood,
+gradient and Fisher information of every participant's sequence are computed
+together as arrays (the only loop is over the corners), and all parameter
+sets are updated simultaneously by damped Newton steps (Fisher scoring where
+the observed information is not yet positive definite). A weak normal prior
+on the unconstrained parameters keeps estimates finite for participants who
+follow the agent at every corner.
+
+Usage:
+    rl = fit_trust_learning(df, STUDY1_DESIGN)       # rl_* columns
+    df = df.join(rl)
+"""
+
+import numpy as np
+import pandas as pd
+from scipy.special import expit
+
+from trust_metrics import agent_correct_mask, followed_matrix
+
+RL_COLUMNS = ['rl_learning_rate', 'rl_initial_trust', 'rl_inverse_temperature',
+              'rl_final_trust', 'rl_loglik', 'rl_n_decisions', 'rl_converged']
+
+# Starting points tried for every participant (alpha, V0, beta)
+START_GRID = [(0.1, 0.7, 3.0), (0.3, 0.7, 3.0), (0.6, 0.8, 5.0), (0.2, 0.5, 1.0)]
+
+MAX_STEP = 3.0
+
+
+def _to_unconstrained(alpha, v0, beta):
+    alpha, v0, beta = (np.asarray(x, dtype=float) for x in (alpha, v0, beta))
+    return np.stack([np.log(alpha / (1 - alpha)), np.log(v0 / (1 - v0)), np.log(beta)], axis=-1)
+
+
+def _to_natural(theta):
+    return expit(theta[..., 0]), expit(theta[..., 1]), np.exp(theta[..., 2])
+
+
+def trust_trajectories(alpha, v0, outcomes):
+    """Trust values V_t before every corner, shape (N, K)
+
+    alpha, v0: (N,) parameters; outcomes: (K,) 1 where the agent was right.
+    """
+    alpha, v0 = np.asarray(alpha, dtype=float), np.asarray(v0, dtype=float)
+    values = np.empty((len(alpha), len(outcomes)))
+    v = v0.copy()
+    for t, r in enumerate(outcomes):
+        values[:, t] = v
+        v = v + alpha * (r - v)
+    return values
+
+
+def rl_objective(theta, followed, outcomes, prior_sd=2.0, derivatives=True):
+    """Penalized log-likelihood per participant, with gradient and Fisher information
+
+    theta: (N, 3) unconstrained parameters (logit alpha, logit V0, log beta).
+    Returns (objective (N,), gradient (N, 3), information (N, 3, 3)).
+    """
+    alpha, v0, beta = _to_natural(theta)
+    n, k = followed.shape
+    observed = ~np.isnan(followed)
+    y = np.where(observed, followed, 0.0)
+
+    v = v0.copy()
+    dv_alpha = np.zeros(n)
+    dv_v0 = np.ones(n)
+    loglik = np.zeros(n)
+    grad = np.zeros((n, 3))
+    info = np.zeros((n, 3, 3))
+    for t in range(k):
+        eta = beta * (v - 0.5)
+        p = expit(eta)
+        obs = observed[:, t]
+        loglik += np.where(obs, y[:, t] * np.log(p + 1e-300) + (1 - y[:, t]) * np.log(1 - p + 1e-300), 0.0)
+        if derivatives:
+            # d eta / d theta via the chain rule through the constrained parameters
+            d_eta = np.stack([beta * dv_alpha * alpha * (1 - alpha),
+                              beta * dv_v0 * v0 * (1 - v0),
+                              beta * (v - 0.5)], axis=1)
+            resid = np.where(obs, y[:, t] - p, 0.0)
+            weight = np.where(obs, p * (1 - p), 0.0)
+            grad += resid[:, None] * d_eta
+            info += weight[:, None, None] * d_eta[:, :, None] * d_eta[:, None, :]
+        r = outcomes[t]
+        dv_alpha = (1 - alpha) * dv_alpha + (r - v)
+        dv_v0 = (1 - alpha) * dv_v0
+        v = v + alpha * (r - v)
+
+    penalty = 0.5 * (theta ** 2).sum(axis=1) / prior_sd ** 2
+    if not derivatives:
+        return loglik - penalty
+    grad -= theta / prior_sd ** 2
+    info += np.eye(3) / prior_sd ** 2
+    return loglik - penalty, grad, info
+
+
+def _newton_information(theta, followed, outcomes, prior_sd, fisher, step=1e-5):
+    """Observed information (central differences of the analytic gradient)
+
+    Falls back to the Fisher information for participants whose observed
+    information is not positive definite (far from the optimum).
+    """
+    n = len(theta)
+    observed = np.empty((n, 3, 3))
+    for j in range(3):
+        shift = np.zeros(3)
+        shift[j] = step
+        _, grad_up, _ = rl_objective(theta + shift, followed, outcomes, prior_sd)
+        _, grad_down, _ = rl_objective(theta - shift, followed, outcomes, prior_sd)
+        observed[:, :, j] = -(grad_up - grad_down) / (2 * step)
+    observed = (observed + observed.transpose(0, 2, 1)) / 2
+    definite = np.linalg.eigvalsh(observed)[:, 0] > 1e-8
+    return np.where(definite[:, None, None], observed, fisher)
+
+
+def fit_rl_parameters(followed, outcomes, prior_sd=2.0, max_iter=100, tol=1e-8):
+    """Batched damped Newton / Fisher scoring for every participant's (alpha, V0, beta)
+
+    Returns (theta, objective, converged) with theta on the unconstrained scale.
+    """
+    followed = np.asarray(followed, dtype=float)
+    outcomes = np.asarray(outcomes, dtype=float)
+    n = len(followed)
+
+    # Best of a few starting points per participant
+    starts = [np.tile(_to_unconstrained(*start), (n, 1)) for start in START_GRID]
+    values = np.stack([rl_objective(s, followed, outcomes, prior_sd, derivatives=False) for s in starts])
+    best = values.argmax(axis=0)
+    theta = np.stack(starts)[best, np.arange(n)]
+
+    converged = np.zeros(n, dtype=bool)
+    objective, grad, info = rl_objective(theta, followed, outcomes, prior_sd)
+    for _ in range(max_iter):
+        active = ~converged
+        if not active.any():
+            break
+        hessian = _newton_information(theta[active], followed[active], outcomes, prior_sd, info[active])
+        step = np.linalg.solve(hessian, grad[active][..., None])[..., 0]
+        # Keep single steps within a few units on the unconstrained scale
+        step *= (MAX_STEP / np.maximum(np.abs(step).max(axis=1), MAX_STEP))[:, None]
+        scale = np.ones(active.sum())
+        current = objective[active]
+        # Step halving until the penalized likelihood does not decrease
+        for _ in range(30):
+            trial = theta[active] + scale[:, None] * step
+            trial_obj = rl_objective(trial, followed[active], outcomes, prior_sd, derivatives=False)
+            worse = trial_obj < current - 1e-12
+            if not worse.any():
+                break
+            scale = np.where(worse, scale / 2, scale)
+        trial[worse] = theta[active][worse]
+        scale[worse] = 0.0
+        theta[active] = trial
+        new_obj, new_grad, new_info = rl_objective(trial, followed[active], outcomes, prior_sd)
+        # Converged when the Newton decrement (expected remaining gain) is negligible
+        decrement = 0.5 * (new_grad * np.linalg.solve(new_info, new_grad[..., None])[..., 0]).sum(axis=1)
+        done = (decrement < tol) | ((np.abs(new_obj - current) < tol) & (scale == 0))
+        objective[active], grad[active], info[active] = new_obj, new_grad, new_info
+        converged[np.flatnonzero(active)[done]] = True
+    return theta, objective, converged
+
+
+def fit_trust_learning(df, design, prior_sd=2.0, max_iter=100):
+    """Fit the trust-update model to every participant; returns the rl_* columns
+
+    Participants without any observed decision are not fitted; their
+    estimates are NaN (the prior alone would otherwise be reported).
+    """
+    followed = followed_matrix(df, design)
+    outcomes = agent_correct_mask(design).astype(float)
+    n_decisions = (~np.isnan(followed)).sum(axis=1)
+    fitted = n_decisions > 0
+    theta = np.full((len(followed), 3), np.nan)
+    converged = np.zeros(len(followed), dtype=bool)
+    loglik = np.full(len(followed), np.nan)
+    if fitted.any():
+        theta[fitted], _, converged[fitted] = fit_rl_parameters(followed[fitted], outcomes,
+                                                                prior_sd, max_iter)
+        loglik[fitted] = rl_objective(theta[fitted], followed[fitted], outcomes,
+                                      prior_sd=np.inf, derivatives=False)
+    alpha, v0, beta = _to_natural(theta)
+    values = trust_trajectories(alpha, v0, outcomes)
+    final = values[:, -1] + alpha * (outcomes[-1] - values[:, -1])
+    return pd.DataFrame({
+        'rl_learning_rate': alpha,
+        'rl_initial_trust': v0,
+        'rl_inverse_temperature': beta,
+        'rl_final_trust': final,
+        'rl_loglik': loglik,
+        'rl_n_decisions': n_decisions,
+        'rl_converged': converged,
+    }, index=df.index)
@@ -0,0 +1,194 @@
+"""
+Shared Trust Metric Definitions
+VR Maze Navigation Studies (Study 1 and Study 2)
+
+The analysis scripts compute every behavioural metric from the corner-level
+columns (corner{c}_decision1_direction / corner{c}_decision1_time). This module
+turns those columns into participant x corner arrays once and derives the
+metrics with array operations, so simulations and follow-up models use exactly
+the same definitions as METRICS_CALCULATION_GUIDE.md.
+
+Usage:
+    from trust_metrics import STUDY1_DESIGN, calculate_trust_metrics
+    metrics = calculate_trust_metrics(df, STUDY1_DESIGN)
+"""
+
+import numpy as np
+import pandas as pd
+
+from decision_patterns import pack_follow
+from decision_time_cleaning import STUDY1_TIME_CLEANING, STUDY2_TIME_CLEANING, clean_times, trimming_counts
+from learning_curves import learning_curve_metrics
+from signal_detection import SDT_METRICS, signal_detection_metrics
+
+N_CORNERS = 10
+
+# Study 1 maze route (agent advice vs. actual correct turn)
+AGENT_RECOMMENDATIONS = {
+    1: 'Right', 2: 'Forward', 3: 'Left', 4: 'Right', 5: 'Forward',
+    6: 'Forward', 7: 'Forward', 8: 'Left', 9: 'Left', 10: 'Left'
+}
+
+CORRECT_PATH = {
+    1: 'Right', 2: 'Forward', 3: 'Right', 4: 'Right', 5: 'Forward',
+    6: 'Forward', 7: 'Left', 8: 'Left', 9: 'Forward', 10: 'Left'
+}
+
+STUDY1_DESIGN = {
+    'name': 'Study 1',
+    'condition_col': 'Display',
+    'conditions': ['I+MAPK', 'I-MAPK', 'E+MAPK', 'E-MAPK'],
+    'n_corners': N_CORNERS,
+    'agent_recommendations': AGENT_RECOMMENDATIONS,
+    'correct_path': CORRECT_PATH,
+    'error_corners': [3, 7, 9],
+    'phase1_last_corner': 5,
+    'time_cleaning': STUDY1_TIME_CLEANING,
+}
+
+# The Maze 2 route has not been coded yet, so compliance-based metrics need
+# agent_recommendations / correct_path filled in before they can be used.
+STUDY2_DESIGN = {
+    'name': 'Study 2',
+    'condition_col': 'distance_condition',
+    'conditions': ['High Distance (5.4m)', 'Low Distance (1.8m)'],
+    'n_corners': N_CORNERS,
+    'agent_recommendations': None,
+    'correct_path': None,
+    'error_corners': [],
+    'phase1_last_corner': 5,
+    'time_cleaning': STUDY2_TIME_CLEANING,
+}
+
+TIME_METRICS = ['phase1_mean_time', 'phase2_mean_time', 'decision_time_change',
+                'mean_decision_time_overall', 'error_corner_mean_time']
+
+COMPLIANCE_METRICS = ['compliance_rate', 'initial_trust', 'overcompliance'] + SDT_METRICS
+
+
+def corner_numbers(design):
+    """Corner numbers 1..K for a design"""
+    return np.arange(1, design['n_corners'] + 1)
+
+
+def phase1_mask(design):
+    """Boolean mask of Phase 1 corners"""
+    return corner_numbers(design) <= design['phase1_last_corner']
+
+
+def error_corner_mask(design):
+    """Boolean mask of the agent error corners"""
+    return np.isin(corner_numbers(design), design['error_corners'])
+
+
+def agent_correct_mask(design):
+    """Boolean mask of corners where the agent recommendation is correct"""
+    if design.get('agent_recommendations') is None or design.get('correct_path') is None:
+        raise ValueError(f"{design.get('name', 'Design')} has no agent route coded "
+                         "(agent_recommendations / correct_path)")
+    return np.array([design['agent_recommendations'][c] == design['correct_path'][c]
+                     for c in corner_numbers(design)])
+
+
+def corner_times(df, n_corners=N_CORNERS, decision=1):
+    """Participant x corner matrix of decision times (NaN where missing)"""
+    times = np.full((len(df), n_corners), np.nan)
+    for corner in range(1, n_corners + 1):
+        col = f'corner{corner}_decision{decision}_time'
+        if col in df.columns:
+            times[:, corner - 1] = pd.to_numeric(df[col], errors='coerce').to_numpy(dtype=float)
+    return times
+
+
+def corner_directions(df, n_corners=N_CORNERS, decision=1):
+    """Participant x corner matrix of chosen directions (None where missing)"""
+    directions = np.full((len(df), n_corners), None, dtype=object)
+    for corner in range(1, n_corners + 1):
+        col = f'corner{corner}_decision{decision}_direction'
+        if col in df.columns:
+            values = df[col].to_numpy(dtype=object)
+            directions[:, corner - 1] = np.where(pd.notna(values), values, None)
+    return directions
+
+
+def followed_matrix(df, design):
+    """Participant x corner follow matrix: 1 = followed agent, 0 = deviated, NaN = missing"""
+    if design.get('agent_recommendations') is None:
+        raise ValueError(f"{design.get('name', 'Design')} has no agent_recommendations coded")
+    directions = corner_directions(df, design['n_corners'])
+    recommended = np.array([design['agent_recommendations'][c] for c in corner_numbers(design)],
+                           dtype=object)
+    followed = (directions == recommended).astype(float)
+    followed[pd.isna(directions)] = np.nan
+    return followed
+
+
+def masked_mean(values, mask=None, axis=-1):
+    """Mean over axis ignoring NaN (and entries outside mask); NaN when empty"""
+    valid = ~np.isnan(values)
+    if mask is not None:
+        valid = valid & mask
+    counts = valid.sum(axis=axis)
+    totals = np.where(valid, values, 0.0).sum(axis=axis)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        return np.where(counts > 0, totals / np.maximum(counts, 1), np.nan)
+
+
+def time_metrics(times, design):
+    """Decision time metrics from a (..., corner) time array
+
+    Works for a single participant x corner matrix as well as stacked
+    simulated studies, since every metric is a reduction over the last axis.
+    """
+    p1 = phase1_mask(design)
+    phase1 = masked_mean(times, p1)
+    phase2 = masked_mean(times, ~p1)
+    return {
+        'phase1_mean_time': phase1,
+        'phase2_mean_time': phase2,
+        'decision_time_change': phase2 - phase1,
+        'mean_decision_time_overall': masked_mean(times),
+        'error_corner_mean_time': masked_mean(times, error_corner_mask(design)),
+    }
+
+
+def compliance_metrics(followed, design):
+    """Compliance and signal-detection metrics from a (..., corner) follow array"""
+    answered = ~np.isnan(followed)
+    follows = np.where(answered, followed, 0.0)
+    correct = agent_correct_mask(design)
+    n_answered = answered.sum(axis=-1)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        rate = np.where(n_answered > 0, follows.sum(axis=-1) / np.maximum(n_answered, 1) * 100, np.nan)
+    metrics = {
+        'compliance_rate': rate,
+        'initial_trust': follows[..., 0].astype(int),
+        'overcompliance': (follows * ~correct).sum(axis=-1).astype(int),
+    }
+    metrics.update(signal_detection_metrics(followed, correct))
+    return metrics
+
+
+def calculate_trust_metrics(df, design=STUDY1_DESIGN, cleaning=None):
+    """Calculate the corner-based behavioural metrics for every participant
+
+    Returns a DataFrame aligned to df.index with the decision time metrics and,
+    when the design has an agent route coded, the compliance metrics.
+    cleaning: decision-time cleaning configuration (see decision_time_cleaning),
+    e.g. design['time_cleaning']; None uses the raw times. With cleaning, the
+    number of trimmed times per participant is added as n_trimmed_times.
+    Per-participant learning-curve parameters are added as lc_* columns
+    (see learning_curves), and the follow vector as the uint16 codes
+    follow_pattern / follow_observed (see decision_patterns).
+    """
+    times = corner_times(df, design['n_corners'])
+    cleaned = clean_times(times, cleaning)
+    metrics = time_metrics(cleaned, design)
+    metrics.update(learning_curve_metrics(cleaned, design))
+    if cleaning is not None:
+        metrics['n_trimmed_times'] = trimming_counts(times, cleaning)
+    if design.get('agent_recommendations') is not None:
+        followed = followed_matrix(df, design)
+        metrics.update(compliance_metrics(followed, design))
+        metrics['follow_pattern'], metrics['follow_observed'] = pack_follow(followed)
+    return pd.DataFrame(metrics, index=df.index)
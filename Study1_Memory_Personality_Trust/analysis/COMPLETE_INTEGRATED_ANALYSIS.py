@@ -1,3 +1,6 @@
+import os
+import shutil
+import sys
 import pandas as pd
 import numpy as np
 from scipy import stats
@@ -6,6 +9,32 @@ import seaborn as sns
 import warnings
 warnings.filterwarnings('ignore')
 
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                                '..', '..', 'Shared_Resources', 'common_functions'))
+from bayes_factors import bf10_correlation, bf10_ttest, bf_evidence, format_bf
+from decision_patterns import pack_follow, pattern_counts, pattern_index, query_patterns, transition_counts
+from decision_time_cleaning import clean_times
+from descriptive_cube import build_descriptive_cube, cube_table, cube_values
+from dimension_reduction import (PERCEPTION_SCALES, bootstrap_loadings, factor_invariance, factor_scores,
+                                 fit_factors, perception_matrix)
+from equivalence import equivalence_tests
+from group_tests import pearsonr_arrays, significance_stars, ttest_from_stats, ttest_ind_arrays
+from influence import influence_analysis
+from mediation import mediation_analysis
+from moderation import moderation_analysis
+from multiple_imputation import (correlation_estimates, group_difference_estimates, mice_impute,
+                                 pooled_analysis)
+from multiverse import (DIMENSIONS, analysis_variables, multiverse_summary, run_multiverse,
+                        specification_curve)
+from partial_correlation_network import (NETWORK_VARIABLES, bootstrap_network, condition_networks,
+                                         estimate_network, network_matrix)
+from participant_profiles import PROFILE_FEATURES, fit_profiles, profile_centers, profile_prevalence
+from prediction import cross_validated_prediction, prediction_features, prediction_summary
+from questionnaire_scoring import reliability_analysis, score_scales
+from sequential_effects import sequential_metrics, sequential_summary
+from trust_learning import fit_trust_learning
+from trust_metrics import STUDY1_DESIGN, calculate_trust_metrics, corner_times, followed_matrix, time_metrics
+
 def load_data():
     """Load complete data"""
     print("="*80)
@@ -26,9 +55,19 @@ def load_data():
             'i': 'Introvert', 'e': 'Extrovert'
         })
     
-    # Calculate metrics if needed
-    if 'decision_time_change' not in df.columns or 'initial_trust' not in df.columns:
-        print("\n[INFO] Calculating missing metrics...")
+    # Score the questionnaire scales from item-level responses when they are available
+    scores = score_scales(df)
+    if not scores.empty:
+        for col in scores.columns:
+            df[col] = scores[col]
+        if {'Trust_pre', 'Trust_post'} <= set(scores.columns):
+            df['trust_difference'] = df['Trust_post'] - df['Trust_pre']
+        print(f"[OK] Scored {len(scores.columns)} questionnaire scales from item responses")
+    
+    # Recompute metrics from the corner columns so the decision-time trimming applies
+    if ('corner1_decision1_time' in df.columns or 'decision_time_change' not in df.columns
+            or 'initial_trust' not in df.columns):
+        print("\n[INFO] Calculating behavioural metrics...")
         calculate_all_metrics(df)
     
     return df
@@ -36,88 +75,47 @@ def load_data():
 def calculate_all_metrics(df):
     """Calculate all necessary metrics"""
     
-    agent_recommendations = {
-        1: 'Right', 2: 'Forward', 3: 'Left', 4: 'Right', 5: 'Forward',
-        6: 'Forward', 7: 'Forward', 8: 'Left', 9: 'Left', 10: 'Left'
-    }
+    # Corner-based time, compliance and signal-detection metrics (guide sections 3-4),
+    # with decision times above the study's cutoff trimmed before averaging
+    metrics = calculate_trust_metrics(df, STUDY1_DESIGN, cleaning=STUDY1_DESIGN['time_cleaning'])
+    for col in metrics.columns:
+        df[col] = metrics[col]
     
-    correct_path = {
-        1: 'Right', 2: 'Forward', 3: 'Right', 4: 'Right', 5: 'Forward',
-        6: 'Forward', 7: 'Left', 8: 'Left', 9: 'Forward', 10: 'Left'
-    }
+    # Per-participant trust-update (reinforcement-learning) parameters as rl_* columns
+    rl = fit_trust_learning(df, STUDY1_DESIGN)
+    for col in rl.columns:
+        df[col] = rl[col]
     
-    # Initialize
-    if 'phase1_mean_time' not in df.columns:
-        df['phase1_mean_time'] = 0.0
-    if 'phase2_mean_time' not in df.columns:
-        df['phase2_mean_time'] = 0.0
-    if 'decision_time_change' not in df.columns:
-        df['decision_time_change'] = 0.0
-    if 'error_corner_mean_time' not in df.columns:
-        df['error_corner_mean_time'] = 0.0
-    if 'mean_decision_time_overall' not in df.columns:
-        df['mean_decision_time_overall'] = 0.0
-    if 'compliance_rate' not in df.columns:
-        df['compliance_rate'] = 0.0
-    if 'initial_trust' not in df.columns:
-        df['initial_trust'] = 0
-    if 'overcompliance' not in df.columns:
-        df['overcompliance'] = 0
-    
-    for idx, row in df.iterrows():
-        phase1_times = []
-        phase2_times = []
-        all_times = []
-        error_times = []
-        followed = 0
-        total = 0
-        over = 0
-        
-        for corner in range(1, 11):
-            time_col = f'corner{corner}_decision1_time'
-            direction_col = f'corner{corner}_decision1_direction'
-            
-            if time_col in df.columns and pd.notna(row[time_col]):
-                t = row[time_col]
-                all_times.append(t)
-                
-                if corner <= 5:
-                    phase1_times.append(t)
-                else:
-                    phase2_times.append(t)
-                
-                if corner in [3, 7, 9]:
-                    error_times.append(t)
-            
-            if direction_col in df.columns and pd.notna(row[direction_col]):
-                total += 1
-                agent_rec = agent_recommendations[corner]
-                correct_ans = correct_path[corner]
-                
-                if row[direction_col] == agent_rec:
-                    followed += 1
-                    
-                    if corner == 1:
-                        df.loc[idx, 'initial_trust'] = 1
-                    
-                    if agent_rec != correct_ans:
-                        over += 1
-        
-        if phase1_times:
-            df.loc[idx, 'phase1_mean_time'] = np.mean(phase1_times)
-        if phase2_times:
-            df.loc[idx, 'phase2_mean_time'] = np.mean(phase2_times)
-        if phase1_times and phase2_times:
-            df.loc[idx, 'decision_time_change'] = np.mean(phase2_times) - np.mean(phase1_times)
-        if all_times:
-            df.loc[idx, 'mean_decision_time_overall'] = np.mean(all_times)
-        if error_times:
-            df.loc[idx, 'error_corner_mean_time'] = np.mean(error_times)
-        if total > 0:
-            df.loc[idx, 'compliance_rate'] = (followed / total) * 100
-        df.loc[idx, 'overcompliance'] = over
-    
-    print("  [OK] All metrics calculated")
+    n_trimmed = int(metrics['n_trimmed_times'].sum())
+    print(f"  [OK] All metrics calculated ({n_trimmed} outlying decision times trimmed, "
+          f"{int(rl['rl_converged'].sum())} of {len(rl)} trust-update fits converged)")
+
+def analyze_scale_reliability(df):
+    """Internal consistency of the questionnaire scales by condition"""
+    
+    scale_df, item_df = reliability_analysis(df, condition_col='Display')
+    if scale_df.empty:
+        return scale_df
+    
+    print("\n" + "="*80)
+    print("PART 0: QUESTIONNAIRE SCALE RELIABILITY")
+    print("="*80)
+    
+    for _, row in scale_df[scale_df['condition'] == 'All'].iterrows():
+        by_condition = scale_df[(scale_df['scale'] == row['scale']) & (scale_df['condition'] != 'All')]
+        alpha_range = f"{by_condition['alpha'].min():.2f}-{by_condition['alpha'].max():.2f}"
+        print(f"  {row['scale']:<18} alpha = {row['alpha']:.2f}, omega = {row['omega']:.2f} "
+              f"(conditions: alpha {alpha_range}; n = {row['n_complete']})")
+    
+    weak_items = item_df[(item_df['condition'] == 'All') & (item_df['item_total_r'] < 0.30)]
+    for _, row in weak_items.iterrows():
+        print(f"  [WARN] {row['item']}: corrected item-total r = {row['item_total_r']:.2f}")
+    
+    scale_df.to_csv('scale_reliability.csv', index=False)
+    item_df.to_csv('scale_item_statistics.csv', index=False)
+    print("\n[OK] Saved: scale_reliability.csv, scale_item_statistics.csv")
+    
+    return scale_df
 
 def analyze_agent_perceptions_correlations(df):
     """Analyze agent perception correlations with trust and decision time"""
@@ -131,7 +129,7 @@ def analyze_agent_perceptions_correlations(df):
     outcome_metrics = {
         'Trust': ['Trust_post', 'trust_difference'],
         'Decision Time': ['mean_decision_time_overall', 'phase1_mean_time', 'phase2_mean_time'],
-        'Compliance': ['compliance_rate']
+        'Compliance': ['compliance_rate', 'sdt_dprime', 'sdt_criterion']
     }
     
     correlation_results = []
@@ -140,9 +138,6 @@ def analyze_agent_perceptions_correlations(df):
         if agent_metric not in df.columns:
             continue
         
-        print(f"\n{agent_metric}:")
-        print("-" * 70)
-        
         for outcome_cat, outcomes in outcome_metrics.items():
             for outcome in outcomes:
                 if outcome not in df.columns:
@@ -162,17 +157,212 @@ def analyze_agent_perceptions_correlations(df):
                         'n': len(data),
                         'Significant': 'Yes' if p < 0.05 else 'Trend' if p < 0.10 else 'No'
                     })
-                    
-                    if p < 0.10:
-                        sig = '***' if p < 0.001 else '**' if p < 0.01 else '*' if p < 0.05 else '†'
-                        print(f"  {outcome}: r = {r:.3f}, p = {p:.3f} {sig} (n = {len(data)})")
     
+    # Bayes factors for every correlation in one call
     corr_df = pd.DataFrame(correlation_results)
+    if not corr_df.empty:
+        corr_df['BF10'] = bf10_correlation(corr_df['r'], corr_df['n'])
+        corr_df['BF_evidence'] = bf_evidence(corr_df['BF10'])
+        for agent_metric, rows in corr_df.groupby('Agent_Metric', sort=False):
+            print(f"\n{agent_metric}:")
+            print("-" * 70)
+            for _, row in rows[rows['p'] < 0.10].iterrows():
+                sig = significance_stars(row['p'])
+                print(f"  {row['Outcome']}: r = {row['r']:.3f}, p = {row['p']:.3f} {sig} "
+                      f"(n = {row['n']}), {format_bf(row['BF10'])}")
+    
     corr_df.to_csv('agent_perception_correlations.csv', index=False)
     print("\n[OK] Saved: agent_perception_correlations.csv")
     
     return corr_df
 
+def analyze_perception_dimensions(df):
+    """Factor structure of the Godspeed and VR scales, its invariance, and factor-score correlations"""
+    
+    print("\n" + "="*80)
+    print("PART 1D: DIMENSIONS OF AGENT PERCEPTION AND VR EXPERIENCE (EFA)")
+    print("="*80)
+    
+    X = perception_matrix(df, PERCEPTION_SCALES)
+    if X.shape[1] < 3 or len(X) <= X.shape[1]:
+        print("[WARNING] Not enough perception scales / complete cases for factor analysis")
+        return pd.DataFrame()
+    
+    fit = fit_factors(X, method='efa')
+    print(f"\n{X.shape[1]} scales, n = {len(X)} complete cases")
+    print("Eigenvalues vs parallel-analysis thresholds (95th percentile):")
+    for k, (value, threshold) in enumerate(zip(fit['eigenvalues'][:4], fit['parallel_thresholds'][:4]), start=1):
+        print(f"  {k}: {value:.2f} vs {threshold:.2f}")
+    print(f"  -> {fit['n_factors']} factor(s), principal-axis factoring"
+          f"{' with varimax rotation' if fit['rotated'] else ''}")
+    
+    loadings = bootstrap_loadings(X, fit, n_boot=1000)
+    print("\nLoadings [95% bootstrap CI]:")
+    for variable, rows in loadings.groupby('variable', sort=False):
+        cells = ', '.join(f"{row['factor']} {row['loading']:5.2f} [{row['ci_low']:5.2f}, {row['ci_high']:5.2f}]"
+                          for _, row in rows.iterrows())
+        print(f"  {variable:<18} {cells}")
+    
+    invariance = factor_invariance(X, df.loc[X.index, 'Display'], fit)
+    print("\nInvariance across conditions (Tucker congruence with the pooled solution):")
+    for condition, rows in invariance.groupby('condition', sort=False):
+        cells = ', '.join(f"{row['factor']} {row['congruence']:.3f} ({row['similarity']})" for _, row in rows.iterrows())
+        print(f"  {condition:<8} (n = {rows['n'].iloc[0]}) {cells}")
+    
+    # Factor scores replace the nine correlated scales as outcomes / predictors
+    scores = factor_scores(X, fit).add_prefix('perception_')
+    for col in scores.columns:
+        df[col] = scores[col]
+    outcomes = [o for o in ['Trust_post', 'trust_difference', 'mean_decision_time_overall',
+                            'compliance_rate', 'sdt_dprime', 'sdt_criterion'] if o in df.columns]
+    x = df[list(scores.columns)].to_numpy(dtype=float).T[:, None, :]
+    y = df[outcomes].apply(pd.to_numeric, errors='coerce').to_numpy(dtype=float).T[None, :, :]
+    corr = pearsonr_arrays(x, y)
+    corr_df = pd.DataFrame({
+        'Factor': np.repeat(scores.columns, len(outcomes)), 'Outcome': np.tile(outcomes, len(scores.columns)),
+        'r': corr['r'].ravel(), 'p': corr['p'].ravel(), 'n': corr['n'].ravel(),
+    })
+    corr_df['BF10'] = bf10_correlation(corr_df['r'], corr_df['n'])
+    corr_df['BF_evidence'] = bf_evidence(corr_df['BF10'])
+    print("\nFactor-score correlations:")
+    for _, row in corr_df.iterrows():
+        sig = significance_stars(row['p'])
+        print(f"  {row['Factor']} x {row['Outcome']}: r = {row['r']:.3f}, p = {row['p']:.3f}"
+              f"{' ' + sig if sig else ''} (n = {row['n']}), {format_bf(row['BF10'])}")
+    
+    loadings.to_csv('perception_factor_loadings.csv', index=False)
+    invariance.to_csv('perception_factor_invariance.csv', index=False)
+    corr_df.to_csv('perception_factor_correlations.csv', index=False)
+    print("\n[OK] Saved: perception_factor_loadings.csv, perception_factor_invariance.csv, "
+          "perception_factor_correlations.csv")
+    
+    return corr_df
+
+def analyze_partial_correlation_network(df):
+    """Regularized partial-correlation network of perceptions, trust, compliance and decision times"""
+    
+    print("\n" + "="*80)
+    print("PART 1E: PARTIAL-CORRELATION NETWORK (EBIC GRAPHICAL LASSO)")
+    print("="*80)
+    
+    X = network_matrix(df, NETWORK_VARIABLES)
+    if X.shape[1] < 3 or len(X) <= X.shape[1]:
+        print("[WARNING] Not enough network variables / complete cases")
+        return pd.DataFrame()
+    
+    network = estimate_network(X, method='glasso')
+    edges, centrality = bootstrap_network(X, network, n_boot=500)
+    present = edges[edges['partial_r'] != 0]
+    print(f"\n{X.shape[1]} nodes, n = {len(X)} complete cases, EBIC penalty = {network['alpha']:.3f}")
+    print(f"{len(present)} of {len(edges)} edges retained "
+          f"(bootstrap: {edges.attrs['n_boot']} resamples)")
+    
+    print("\nStrongest edges: partial r [95% CI], inclusion (marginal r):")
+    for _, row in present.reindex(present['partial_r'].abs().sort_values(ascending=False).index).head(10).iterrows():
+        print(f"  {row['node1']:<18} -- {row['node2']:<18} {row['partial_r']:6.3f} "
+              f"[{row['ci_low']:6.3f}, {row['ci_high']:6.3f}], {row['inclusion']*100:3.0f}% "
+              f"(r = {row['marginal_r']:.3f})")
+    
+    indices = [i for i in ['strength', 'expected_influence', 'closeness'] if centrality[f'{i}_z'].notna().any()]
+    print(f"\nCentrality ({' / '.join(i.replace('_', ' ') for i in indices)}, z):")
+    for _, row in centrality.sort_values('strength', ascending=False).iterrows():
+        print(f"  {row['node']:<18} " + ' '.join(f"{row[f'{i}_z']:6.2f}" for i in indices))
+    
+    by_condition, global_strength = condition_networks(X, df.loc[X.index, 'Display'], network)
+    print("\nGlobal strength (sum of |partial r|) by condition:")
+    for condition, value in global_strength.items():
+        print(f"  {condition:<8} {value:.3f}")
+    
+    edges.to_csv('network_edges.csv', index=False)
+    centrality.to_csv('network_centrality.csv', index=False)
+    by_condition.to_csv('network_by_condition.csv', index=False)
+    print("\n[OK] Saved: network_edges.csv, network_centrality.csv, network_by_condition.csv")
+    
+    return edges
+
+def analyze_perception_trust_mediation(df):
+    """Test agent perception -> post-task trust -> behavior mediation chains"""
+    
+    print("\n" + "="*80)
+    print("PART 1B: PERCEPTION -> TRUST -> BEHAVIOR MEDIATION")
+    print("="*80)
+    
+    agent_metrics = ['Anthropomorphism', 'Animacy', 'Likeability', 
+                    'Intelligence', 'Safety', 'Aesthetic']
+    outcome_metrics = ['compliance_rate', 'sdt_dprime', 'mean_decision_time_overall']
+    
+    agent_metrics = [m for m in agent_metrics if m in df.columns]
+    outcome_metrics = [m for m in outcome_metrics if m in df.columns]
+    if not agent_metrics or not outcome_metrics or 'Trust_post' not in df.columns:
+        return pd.DataFrame()
+    
+    mediation_df = mediation_analysis(df, agent_metrics, ['Trust_post'], outcome_metrics,
+                                      n_boot=5000)
+    
+    for _, row in mediation_df.iterrows():
+        if row['significant'] or row['sobel_p'] < 0.10:
+            marker = '*' if row['significant'] else '†'
+            print(f"  {row['predictor']} -> Trust_post -> {row['outcome']}: "
+                  f"ab = {row['indirect']:.3f}, 95% CI [{row['indirect_ci_lower']:.3f}, "
+                  f"{row['indirect_ci_upper']:.3f}] {marker}")
+    
+    mediation_df.to_csv('perception_trust_mediation.csv', index=False)
+    print("\n[OK] Saved: perception_trust_mediation.csv")
+    
+    return mediation_df
+
+def analyze_with_multiple_imputation(df, m=20):
+    """Re-test key effects on all participants with multiply imputed corner times and scores"""
+    
+    print("\n" + "="*80)
+    print("PART 1C: MULTIPLE-IMPUTATION SENSITIVITY ANALYSIS")
+    print("="*80)
+    
+    time_cols = [f'corner{c}_decision1_time' for c in range(1, STUDY1_DESIGN['n_corners'] + 1)]
+    agent_metrics = ['Anthropomorphism', 'Animacy', 'Likeability', 
+                    'Intelligence', 'Safety', 'Aesthetic']
+    scores = agent_metrics + ['Familiarity', 'Immersion', 'Self-efficacy', 'Trust_pre', 'Trust_post']
+    
+    scores = [c for c in scores if c in df.columns]
+    if (any(c not in df.columns for c in time_cols) or 'Trust_post' not in scores
+            or 'memory_function' not in df.columns):
+        return pd.DataFrame()
+    
+    # Trimmed decision times count as missing and are imputed like any other gap
+    mi_input = df.copy()
+    mi_input[time_cols] = clean_times(corner_times(df, STUDY1_DESIGN['n_corners']),
+                                      STUDY1_DESIGN['time_cleaning'])
+    n_missing = int(mi_input[time_cols + scores].isna().sum().sum())
+    print(f"\nImputing {n_missing} missing values ({m} imputations)...")
+    # The memmap store lives in a temporary directory that is removed after pooling
+    store = mice_impute(mi_input, time_cols + scores, m=m)
+    
+    outcomes = ['Trust_post', 'mean_decision_time_overall', 'decision_time_change']
+    pairs = [(metric, 'Trust_post') for metric in agent_metrics if metric in scores]
+    
+    def analysis(data):
+        data = data.assign(**time_metrics(corner_times(data, STUDY1_DESIGN['n_corners']), STUDY1_DESIGN))
+        return (group_difference_estimates(data, 'memory_function', (False, True), outcomes,
+                                           labels=('No Memory', 'Memory'))
+                + correlation_estimates(data, pairs))
+    
+    pooled_df = pooled_analysis(store, df, analysis)
+    store_path = store['path']
+    del store
+    shutil.rmtree(store_path, ignore_errors=True)
+    
+    for _, row in pooled_df.iterrows():
+        label = 'r' if row['scale'] == 'r' else 'diff'
+        p = row['p']
+        sig = significance_stars(p)
+        print(f"  {row['name']}: {label} = {row['estimate']:.3f}, 95% CI [{row['ci_lower']:.3f}, "
+              f"{row['ci_upper']:.3f}], p = {p:.3f} {sig} (FMI = {row['fmi']:.2f})")
+    
+    pooled_df.to_csv('multiple_imputation_pooled_results.csv', index=False)
+    print("\n[OK] Saved: multiple_imputation_pooled_results.csv")
+    
+    return pooled_df
+
 def analyze_vr_metrics_effects(df):
     """Analyze VR experience metrics"""
     
@@ -182,7 +372,7 @@ def analyze_vr_metrics_effects(df):
     
     vr_metrics = ['Familiarity', 'Immersion', 'Self-efficacy']
     outcome_metrics = ['Trust_post', 'trust_difference', 'mean_decision_time_overall', 
-                      'compliance_rate']
+                      'compliance_rate', 'sdt_dprime', 'sdt_criterion']
     
     vr_results = []
     
@@ -190,9 +380,6 @@ def analyze_vr_metrics_effects(df):
         if vr_metric not in df.columns:
             continue
         
-        print(f"\n{vr_metric}:")
-        print("-" * 70)
-        
         for outcome in outcome_metrics:
             if outcome not in df.columns:
                 continue
@@ -209,20 +396,79 @@ def analyze_vr_metrics_effects(df):
                     'p': p,
                     'n': len(data)
                 })
-                
-                if p < 0.10:
-                    sig = '***' if p < 0.001 else '**' if p < 0.01 else '*' if p < 0.05 else '†'
-                    print(f"  {outcome}: r = {r:.3f}, p = {p:.3f} {sig}")
     
-    if vr_results:
-        vr_df = pd.DataFrame(vr_results)
+    vr_df = pd.DataFrame(vr_results)
+    if not vr_df.empty:
+        vr_df['BF10'] = bf10_correlation(vr_df['r'], vr_df['n'])
+        vr_df['BF_evidence'] = bf_evidence(vr_df['BF10'])
+        for vr_metric, rows in vr_df.groupby('VR_Metric', sort=False):
+            print(f"\n{vr_metric}:")
+            print("-" * 70)
+            for _, row in rows[rows['p'] < 0.10].iterrows():
+                sig = significance_stars(row['p'])
+                print(f"  {row['Outcome']}: r = {row['r']:.3f}, p = {row['p']:.3f} {sig}, {format_bf(row['BF10'])}")
+    
+    # Do the VR metrics moderate the memory function effect?
+    moderators = [m for m in vr_metrics if m in df.columns]
+    outcomes = [o for o in outcome_metrics if o in df.columns]
+    if moderators and outcomes and 'memory_function' in df.columns:
+        print("\nMemory function x VR metric moderation:")
+        print("-" * 70)
+        moderation_df = moderation_analysis(df, 'memory_function', moderators, outcomes,
+                                            levels=(False, True))
+        for _, row in moderation_df.iterrows():
+            if row['p_interaction'] < 0.10:
+                p = row['p_interaction']
+                sig = significance_stars(p)
+                print(f"  {row['moderator']} x memory -> {row['outcome']}: "
+                      f"b = {row['b_interaction']:.3f}, p = {p:.3f} {sig}")
+                print(f"    Johnson-Neyman: memory effect significant for {row['jn_significant']} "
+                      f"({row['percent_range_significant']:.0f}% of range)")
+        moderation_df.to_csv('vr_metrics_memory_moderation.csv', index=False)
+        print("\n[OK] Saved: vr_metrics_memory_moderation.csv")
+    
+    if not vr_df.empty:
         vr_df.to_csv('vr_metrics_correlations.csv', index=False)
         print("\n[OK] Saved: vr_metrics_correlations.csv")
         return vr_df
     
     return pd.DataFrame()
 
-def analyze_agent_personality_on_perceptions(df):
+def analyze_out_of_sample_prediction(df):
+    """Cross-validated prediction of behavior and trust from perceptions, VR metrics and personality"""
+    
+    print("\n" + "="*80)
+    print("PART 2B: OUT-OF-SAMPLE PREDICTION (REPEATED K-FOLD, NESTED SEARCH)")
+    print("="*80)
+    
+    predictors = ['Anthropomorphism', 'Animacy', 'Likeability', 'Intelligence', 'Safety',
+                  'Aesthetic', 'Familiarity', 'Immersion', 'Self-efficacy']
+    outcome_metrics = ['compliance_rate', 'overcompliance', 'Trust_post']
+    
+    predictors = [m for m in predictors if m in df.columns]
+    outcome_metrics = [m for m in outcome_metrics if m in df.columns]
+    categorical = [c for c in ['participant_intro_extro'] if c in df.columns]
+    if not predictors or not outcome_metrics:
+        return pd.DataFrame()
+    
+    X = prediction_features(df, predictors, categorical)
+    fold_results = cross_validated_prediction(X, df[outcome_metrics], n_splits=5, n_repeats=5)
+    summary_df = prediction_summary(fold_results)
+    
+    for outcome in outcome_metrics:
+        print(f"\n{outcome}:")
+        print("-" * 70)
+        for _, row in summary_df[summary_df['outcome'] == outcome].iterrows():
+            print(f"  {row['model']:<15} R2 = {row['r2_mean']:6.3f} (SD {row['r2_std']:.3f}), "
+                  f"RMSE = {row['rmse_mean']:.3f}")
+    
+    fold_results.to_csv('prediction_fold_results.csv', index=False)
+    summary_df.to_csv('prediction_summary.csv', index=False)
+    print("\n[OK] Saved: prediction_fold_results.csv, prediction_summary.csv")
+    
+    return summary_df
+
+def analyze_agent_personality_on_perceptions(df, cube):
     """Test agent personality effects on agent perceptions"""
     
     print("\n" + "="*80)
@@ -238,41 +484,45 @@ def analyze_agent_personality_on_perceptions(df):
         if metric not in df.columns:
             continue
         
-        intro_agent = df[df['agent_personality'] == 'Introvert'][metric].dropna()
-        extro_agent = df[df['agent_personality'] == 'Extrovert'][metric].dropna()
+        n, m, sd = [cube_values(cube, 'agent_personality', metric, stat, ['Introvert', 'Extrovert'])
+                    for stat in ('count', 'mean', 'std')]
         
-        if len(intro_agent) > 1 and len(extro_agent) > 1:
-            t, p = stats.ttest_ind(intro_agent, extro_agent)
-            pooled_std = np.sqrt((intro_agent.std()**2 + extro_agent.std()**2) / 2)
-            d = (intro_agent.mean() - extro_agent.mean()) / pooled_std if pooled_std > 0 else 0
+        if n[0] > 1 and n[1] > 1:
+            test = ttest_from_stats(n[0], m[0], sd[0]**2, n[1], m[1], sd[1]**2)
+            t, p, d = float(test['t']), float(test['p']), float(test['d'])
             
             perception_results.append({
                 'Metric': metric,
-                'Introvert_Agent_M': intro_agent.mean(),
-                'Introvert_Agent_SD': intro_agent.std(),
-                'Extrovert_Agent_M': extro_agent.mean(),
-                'Extrovert_Agent_SD': extro_agent.std(),
+                'Introvert_Agent_M': m[0],
+                'Introvert_Agent_SD': sd[0],
+                'Extrovert_Agent_M': m[1],
+                'Extrovert_Agent_SD': sd[1],
+                'n_Introvert': n[0],
+                'n_Extrovert': n[1],
                 't': t,
                 'p': p,
                 'd': d
             })
-            
-            if p < 0.10:
-                sig = '***' if p < 0.001 else '**' if p < 0.01 else '*' if p < 0.05 else '†'
-                print(f"\n{metric}: {sig}")
-                print(f"  Introvert Agent: M = {intro_agent.mean():.3f}, SD = {intro_agent.std():.3f}")
-                print(f"  Extrovert Agent: M = {extro_agent.mean():.3f}, SD = {extro_agent.std():.3f}")
-                print(f"  t = {t:.3f}, p = {p:.3f}, d = {d:.3f}")
     
     if perception_results:
         perception_df = pd.DataFrame(perception_results)
+        perception_df['BF10'] = bf10_ttest(perception_df['t'], perception_df['n_Introvert'],
+                                           perception_df['n_Extrovert'])
+        perception_df['BF_evidence'] = bf_evidence(perception_df['BF10'])
+        for _, row in perception_df[perception_df['p'] < 0.10].iterrows():
+            p = row['p']
+            sig = significance_stars(p)
+            print(f"\n{row['Metric']}: {sig}")
+            print(f"  Introvert Agent: M = {row['Introvert_Agent_M']:.3f}, SD = {row['Introvert_Agent_SD']:.3f}")
+            print(f"  Extrovert Agent: M = {row['Extrovert_Agent_M']:.3f}, SD = {row['Extrovert_Agent_SD']:.3f}")
+            print(f"  t = {row['t']:.3f}, p = {p:.3f}, d = {row['d']:.3f}, {format_bf(row['BF10'])}")
         perception_df.to_csv('agent_personality_perception_effects.csv', index=False)
         print("\n[OK] Saved: agent_personality_perception_effects.csv")
         return perception_df
     
     return pd.DataFrame()
 
-def analyze_phase_specific_effects(df):
+def analyze_phase_specific_effects(df, cube):
     """Analyze Phase 1 vs Phase 2 separately"""
     
     print("\n" + "="*80)
@@ -307,19 +557,26 @@ def analyze_phase_specific_effects(df):
                     'Phase1_M': paired_data['phase1_mean_time'].mean(),
                     'Phase2_M': paired_data['phase2_mean_time'].mean(),
                     'Difference': diff,
+                    'n': len(paired_data),
                     't': t,
                     'p': p,
                     'd': d
                 })
-                
-                if p < 0.10:
-                    sig = '***' if p < 0.001 else '**' if p < 0.01 else '*' if p < 0.05 else '†'
-                    direction = 'SLOWER' if diff > 0 else 'FASTER'
-                    print(f"\n{cond}: Phase 2 {direction} {sig}")
-                    print(f"  Phase 1: M = {paired_data['phase1_mean_time'].mean():.2f}s")
-                    print(f"  Phase 2: M = {paired_data['phase2_mean_time'].mean():.2f}s")
-                    print(f"  Change: {diff:+.2f}s")
-                    print(f"  paired t({len(paired_data)-1}) = {t:.3f}, p = {p:.3f}, d = {d:.3f}")
+    
+    # Paired Bayes factors for all conditions in one call
+    if phase_results:
+        bf = bf10_ttest([r['t'] for r in phase_results], [r['n'] for r in phase_results])
+        for r, bf10 in zip(phase_results, bf):
+            r['BF10'] = bf10
+            if r['p'] < 0.10:
+                p = r['p']
+                sig = significance_stars(p)
+                direction = 'SLOWER' if r['Difference'] > 0 else 'FASTER'
+                print(f"\n{r['Condition']}: Phase 2 {direction} {sig}")
+                print(f"  Phase 1: M = {r['Phase1_M']:.2f}s")
+                print(f"  Phase 2: M = {r['Phase2_M']:.2f}s")
+                print(f"  Change: {r['Difference']:+.2f}s")
+                print(f"  paired t({r['n']-1}) = {r['t']:.3f}, p = {p:.3f}, d = {r['d']:.3f}, {format_bf(bf10)}")
     
     # Memory effects by phase
     print("\n[B] Memory Effects by Phase:")
@@ -328,31 +585,42 @@ def analyze_phase_specific_effects(df):
     for phase_name, phase_col in [('Phase 1', 'phase1_mean_time'), ('Phase 2', 'phase2_mean_time')]:
         print(f"\n{phase_name}:")
         
-        # Within Introvert Agent
-        i_mem = df[df['Display'] == 'I+MAPK'][phase_col].dropna()
-        i_nomem = df[df['Display'] == 'I-MAPK'][phase_col].dropna()
-        
-        if len(i_mem) > 1 and len(i_nomem) > 1:
-            t, p = stats.ttest_ind(i_mem, i_nomem)
-            pooled_std = np.sqrt((i_mem.std()**2 + i_nomem.std()**2) / 2)
-            d = (i_mem.mean() - i_nomem.mean()) / pooled_std if pooled_std > 0 else 0
+        for agent_label, mem_cond, nomem_cond in [('Introvert Agent', 'I+MAPK', 'I-MAPK'),
+                                                  ('Extrovert Agent', 'E+MAPK', 'E-MAPK')]:
+            n, m, sd = [cube_values(cube, 'Display', phase_col, stat, [mem_cond, nomem_cond])
+                        for stat in ('count', 'mean', 'std')]
             
-            if p < 0.10:
-                sig = '***' if p < 0.001 else '**' if p < 0.01 else '*' if p < 0.05 else '†'
-                print(f"  Introvert Agent: I+MAPK={i_mem.mean():.2f} vs I-MAPK={i_nomem.mean():.2f}, p={p:.3f} {sig}, d={d:.3f}")
-        
-        # Within Extrovert Agent
-        e_mem = df[df['Display'] == 'E+MAPK'][phase_col].dropna()
-        e_nomem = df[df['Display'] == 'E-MAPK'][phase_col].dropna()
+            if n[0] > 1 and n[1] > 1:
+                test = ttest_from_stats(n[0], m[0], sd[0]**2, n[1], m[1], sd[1]**2)
+                p, d = float(test['p']), float(test['d'])
+                
+                if p < 0.10:
+                    sig = significance_stars(p)
+                    bf10 = float(bf10_ttest(test['t'], n[0], n[1]))
+                    print(f"  {agent_label}: {mem_cond}={m[0]:.2f} vs {nomem_cond}={m[1]:.2f}, p={p:.3f} {sig}, "
+                          f"d={d:.3f}, {format_bf(bf10)}")
+    
+    # Memory effects on the fitted learning-curve parameters
+    lc_metrics = [('lc_exponential_initial', 'Initial time'), ('lc_exponential_asymptote', 'Asymptote'),
+                  ('lc_exponential_rate', 'Learning rate'), ('lc_exponential_error_effect', 'Error-corner effect')]
+    lc_metrics = [(metric, label) for metric, label in lc_metrics if metric in df.columns]
+    if lc_metrics:
+        print("\n[C] Memory Effects on Learning-Curve Parameters (exponential fit):")
+        print("-" * 70)
         
-        if len(e_mem) > 1 and len(e_nomem) > 1:
-            t, p = stats.ttest_ind(e_mem, e_nomem)
-            pooled_std = np.sqrt((e_mem.std()**2 + e_nomem.std()**2) / 2)
-            d = (e_mem.mean() - e_nomem.mean()) / pooled_std if pooled_std > 0 else 0
-            
-            if p < 0.10:
-                sig = '***' if p < 0.001 else '**' if p < 0.01 else '*' if p < 0.05 else '†'
-                print(f"  Extrovert Agent: E+MAPK={e_mem.mean():.2f} vs E-MAPK={e_nomem.mean():.2f}, p={p:.3f} {sig}, d={d:.3f}")
+        for metric, label in lc_metrics:
+            print(f"\n{label}:")
+            for agent_label, mem_cond, nomem_cond in [('Introvert Agent', 'I+MAPK', 'I-MAPK'),
+                                                      ('Extrovert Agent', 'E+MAPK', 'E-MAPK')]:
+                n, m, sd = [cube_values(cube, 'Display', metric, stat, [mem_cond, nomem_cond])
+                            for stat in ('count', 'mean', 'std')]
+                if n[0] > 1 and n[1] > 1:
+                    test = ttest_from_stats(n[0], m[0], sd[0]**2, n[1], m[1], sd[1]**2)
+                    p, d = float(test['p']), float(test['d'])
+                    sig = significance_stars(p)
+                    print(f"  {agent_label}: {mem_cond}={m[0]:.2f} vs {nomem_cond}={m[1]:.2f} "
+                          f"(n={n[0]:.0f} vs {n[1]:.0f} identified fits), "
+                          f"p={p:.3f}{' ' + sig if sig else ''}, d={d:.3f}")
     
     if phase_results:
         phase_df = pd.DataFrame(phase_results)
@@ -362,7 +630,141 @@ def analyze_phase_specific_effects(df):
     
     return pd.DataFrame()
 
-def analyze_initial_trust(df):
+def analyze_post_error_effects(df):
+    """Post-error slowing, compliance drop and recovery after the agent error corners"""
+    
+    print("\n" + "="*80)
+    print("PART 4B: POST-ERROR SEQUENTIAL EFFECTS (Corners after 3, 7, 9)")
+    print("="*80)
+    
+    if 'corner1_decision1_time' not in df.columns:
+        print("[WARNING] Corner-level data not found")
+        return pd.DataFrame()
+    
+    times = clean_times(corner_times(df), STUDY1_DESIGN['time_cleaning'])
+    seq = pd.DataFrame(sequential_metrics(times, followed_matrix(df, STUDY1_DESIGN), STUDY1_DESIGN,
+                                          lags=(1, 2)), index=df.index)
+    for col in seq.columns:
+        df[col] = seq[col]
+    
+    summary_df = pd.concat([
+        sequential_summary(seq, df['Display']).assign(grouping='Display'),
+        sequential_summary(seq, df['memory_function'].map({True: '+MAPK', False: '-MAPK'}))
+            .query("condition != 'All'").assign(grouping='memory_function'),
+    ], ignore_index=True)
+    
+    key_metrics = [('seq_pes_lag1', 'Post-error slowing (s)'),
+                   ('seq_compliance_drop_lag1', 'Post-error compliance drop (%)'),
+                   ('seq_recovery_follow_length', 'Corners until following again'),
+                   ('seq_recovery_time_length', 'Corners until pre-error speed')]
+    for metric, label in key_metrics:
+        print(f"\n{label}:")
+        rows = summary_df[(summary_df['metric'] == metric) & (summary_df['grouping'] == 'Display')]
+        for _, row in rows.iterrows():
+            sig = significance_stars(row['p_vs_0']) if metric.startswith(('seq_pes', 'seq_compliance')) else ''
+            print(f"  {row['condition']:<8} M = {row['mean']:6.2f} (SD = {row['sd']:.2f}, n = {row['n']:.0f}) {sig}")
+        test = ttest_ind_arrays(seq.loc[df['memory_function'] == True, metric].to_numpy(dtype=float),
+                                seq.loc[df['memory_function'] == False, metric].to_numpy(dtype=float))
+        print(f"  +MAPK vs -MAPK: t = {float(test['t']):.3f}, p = {float(test['p']):.3f}, d = {float(test['d']):.3f}")
+    
+    summary_df.to_csv('post_error_sequential_effects.csv', index=False)
+    print("\n[OK] Saved: post_error_sequential_effects.csv")
+    
+    return summary_df
+
+def analyze_decision_patterns(df):
+    """Follow/deviate pattern frequencies and transition matrices by condition"""
+    
+    print("\n" + "="*80)
+    print("PART 4C: DECISION PATTERNS AND COMPLIANCE TRANSITIONS")
+    print("="*80)
+    
+    if 'corner1_decision1_direction' not in df.columns:
+        print("[WARNING] Corner-level data not found")
+        return pd.DataFrame()
+    
+    if 'follow_pattern' not in df.columns:
+        df['follow_pattern'], df['follow_observed'] = pack_follow(followed_matrix(df, STUDY1_DESIGN))
+    index = pattern_index(df['follow_pattern'], df['follow_observed'], df['Display'],
+                          STUDY1_DESIGN['n_corners'])
+    
+    patterns = pattern_counts(index)
+    print("\nMost frequent complete decision patterns (F = followed, D = deviated):")
+    for _, row in patterns[patterns['condition'] == 'All'].head(5).iterrows():
+        print(f"  {row['pattern']}  n = {row['count']:.0f} ({row['proportion']*100:.1f}%)")
+    
+    transitions = pd.concat([
+        transition_counts(index).assign(corners='all'),
+        transition_counts(index, STUDY1_DESIGN['error_corners']).assign(corners='error'),
+    ], ignore_index=True)
+    print("\nTransition probabilities (all corners | from error corners):")
+    print(f"  {'Condition':<8} {'P(F->D)':>8} {'P(D->F)':>8} | {'P(F->D)':>8} {'P(D->F)':>8}")
+    for condition in ['All'] + index['levels']:
+        rows = transitions[transitions['condition'] == condition].set_index(['corners', 'from_state', 'to_state'])
+        values = [rows.loc[(corners, a, b), 'probability'] for corners in ('all', 'error')
+                  for a, b in (('F', 'D'), ('D', 'F'))]
+        print(f"  {condition:<8} {values[0]:8.3f} {values[1]:8.3f} | {values[2]:8.3f} {values[3]:8.3f}")
+    
+    queries = {'Deviated at error corner 3, followed at 4': {3: 'D', 4: 'F'},
+               'Followed at 1-2, deviated at 3, followed at 4': 'FFDF',
+               'Followed at every error corner (3, 7, 9)': {3: 'F', 7: 'F', 9: 'F'}}
+    print("\nPattern queries (% of participants by condition):")
+    for label, query in queries.items():
+        result = query_patterns(index, query)
+        shares = ', '.join(f"{row['condition']} {row['proportion']*100:.0f}%" for _, row in result.iterrows())
+        print(f"  {label}: {shares}")
+    
+    patterns.to_csv('decision_patterns.csv', index=False)
+    transitions.to_csv('compliance_transitions.csv', index=False)
+    print("\n[OK] Saved: decision_patterns.csv, compliance_transitions.csv")
+    
+    return transitions
+
+def analyze_participant_profiles(df):
+    """Behavioural participant types and their prevalence across conditions"""
+    
+    print("\n" + "="*80)
+    print("PART 4D: BEHAVIOURAL PARTICIPANT PROFILES (CLUSTERING)")
+    print("="*80)
+    
+    features = [f for f in PROFILE_FEATURES if f in df.columns]
+    if 'compliance_rate' not in features:
+        print("[WARNING] Compliance metrics not found")
+        return pd.DataFrame()
+    
+    model = fit_profiles(df, features, k_values=(2, 3, 4, 5), method='minibatch_kmeans')
+    df['profile'] = model['profiles']
+    print(f"\nFeatures: {', '.join(features)}")
+    print("Model selection (mini-batch k-means, best of 10 restarts per k):")
+    for _, row in model['selection'].iterrows():
+        print(f"  k = {row['k']}: silhouette = {-row['selection']:.3f}")
+    print(f"  -> {model['k']} profiles")
+    
+    centers = profile_centers(model)
+    print("\nProfile centres:")
+    for _, row in centers.iterrows():
+        print(f"  {row['profile']:<20} n = {row['n']:3d}  compliance = {row['compliance_rate']:5.1f}%  "
+              f"overcompliance = {row['overcompliance']:.2f}")
+    
+    prevalence_tables = []
+    for grouping in ['Display', 'memory_function']:
+        table, test = profile_prevalence(df['profile'], df[grouping])
+        prevalence_tables.append(table.assign(grouping=grouping, chi2=test['chi2'], p=test['p'],
+                                              cramers_v=test['cramers_v']))
+        print(f"\nProfile prevalence by {grouping}: chi2({test['df']}) = {test['chi2']:.2f}, "
+              f"p = {test['p']:.3f}, V = {test['cramers_v']:.3f}")
+        shares = table.pivot(index='condition', columns='profile', values='proportion')
+        for condition, row in shares.iterrows():
+            print(f"  {str(condition):<8} " + ', '.join(f"{name} {share*100:.0f}%" for name, share in row.items()))
+    
+    prevalence_df = pd.concat(prevalence_tables, ignore_index=True)
+    centers.to_csv('participant_profiles.csv', index=False)
+    prevalence_df.to_csv('profile_prevalence.csv', index=False)
+    print("\n[OK] Saved: participant_profiles.csv, profile_prevalence.csv")
+    
+    return prevalence_df
+
+def analyze_initial_trust(df, cube):
     """Analyze initial trust (corner 1 compliance)"""
     
     print("\n" + "="*80)
@@ -382,10 +784,11 @@ def analyze_initial_trust(df):
     print("\nBy Condition:")
     print("-" * 70)
     
-    for cond in ['I+MAPK', 'I-MAPK', 'E+MAPK', 'E-MAPK']:
-        cond_data = df[df['Display'] == cond]
-        pct = cond_data['initial_trust'].mean() * 100
-        print(f"  {cond}: {pct:.1f}% ({cond_data['initial_trust'].sum()}/{len(cond_data)})")
+    conditions = ['I+MAPK', 'I-MAPK', 'E+MAPK', 'E-MAPK']
+    counts = cube_values(cube, 'Display', 'initial_trust', 'count', conditions)
+    rates = cube_values(cube, 'Display', 'initial_trust', 'mean', conditions)
+    for cond, n, rate in zip(conditions, counts, rates):
+        print(f"  {cond}: {rate * 100:.1f}% ({round(rate * n)}/{n:.0f})")
     
     # Chi-square test
     from scipy.stats import chi2_contingency
@@ -398,12 +801,164 @@ def analyze_initial_trust(df):
     # By memory
     print("\nBy Memory Function:")
     print("-" * 70)
-    mem_pct = df[df['memory_function'] == True]['initial_trust'].mean() * 100
-    nomem_pct = df[df['memory_function'] == False]['initial_trust'].mean() * 100
+    mem_pct, nomem_pct = cube_values(cube, 'memory_function', 'initial_trust', 'mean', [True, False]) * 100
     print(f"  +MAPK: {mem_pct:.1f}%")
     print(f"  -MAPK: {nomem_pct:.1f}%")
 
-def create_comprehensive_visualizations(df):
+def analyze_equivalence(df, cube):
+    """Equivalence (TOST) tests for the memory-function and agent-personality contrasts"""
+    
+    print("\n" + "="*80)
+    print("PART 5B: EQUIVALENCE TESTS (TOST) FOR NULL FINDINGS")
+    print("="*80)
+    
+    metrics = ['Trust_pre', 'Trust_post', 'trust_difference', 'compliance_rate',
+               'phase1_mean_time', 'phase2_mean_time', 'decision_time_change',
+               'Anthropomorphism', 'Animacy', 'Likeability', 'Intelligence', 'Safety']
+    equivalence_df = pd.concat([
+        equivalence_tests(cube, 'memory_function', [(True, False)], metrics),
+        equivalence_tests(cube, 'agent_personality', [('Introvert', 'Extrovert')], metrics),
+    ], ignore_index=True)
+    
+    for _, row in equivalence_df.iterrows():
+        print(f"  {row['grouping']:<18} {row['metric']:<22} diff = {row['diff']:7.2f}, "
+              f"bounds ±{row['bound_upper']:.2f}, p(TOST) = {row['p_tost']:.3f} -> {row['conclusion']}")
+    
+    equivalence_df.to_csv('equivalence_tests.csv', index=False)
+    print("\n[OK] Saved: equivalence_tests.csv")
+    
+    return equivalence_df
+
+def analyze_influence(df):
+    """Leave-one-out influence of single participants on the reported findings"""
+    
+    print("\n" + "="*80)
+    print("PART 5C: LEAVE-ONE-OUT INFLUENCE DIAGNOSTICS")
+    print("="*80)
+    
+    findings = []
+    for agent in ['I', 'E']:
+        groups = (f'{agent}+MAPK', f'{agent}-MAPK')
+        for metric, label in [('phase2_mean_time', 'Phase 2'), ('decision_time_change', 'Time Change'),
+                              ('error_corner_mean_time', 'Error Time'),
+                              ('mean_decision_time_overall', 'Overall Time')]:
+            findings.append({'name': f'{groups[0]} {label} > {groups[1]}', 'test': 'ttest',
+                             'outcome': metric, 'group_col': 'Display', 'groups': groups})
+    findings += [
+        {'name': 'Introvert Agent Phase 1 < Extrovert Agent', 'test': 'ttest', 'outcome': 'phase1_mean_time',
+         'group_col': 'agent_personality', 'groups': ('Introvert', 'Extrovert')},
+        {'name': 'Extrovert Agent Likeability > Introvert Agent', 'test': 'ttest', 'outcome': 'Likeability',
+         'group_col': 'agent_personality', 'groups': ('Introvert', 'Extrovert')},
+        {'name': 'Extrovert Agent Animacy > Introvert Agent', 'test': 'ttest', 'outcome': 'Animacy',
+         'group_col': 'agent_personality', 'groups': ('Introvert', 'Extrovert')},
+        {'name': 'E-MAPK > I-MAPK Trust', 'test': 'ttest', 'outcome': 'Trust_post',
+         'group_col': 'Display', 'groups': ('I-MAPK', 'E-MAPK')},
+        {'name': 'Intelligence x Trust_post', 'test': 'correlation', 'x': 'Intelligence', 'y': 'Trust_post'},
+        {'name': 'Animacy x Decision Speed', 'test': 'correlation', 'x': 'Animacy',
+         'y': 'mean_decision_time_overall'},
+    ]
+    findings = [f for f in findings
+                if all(v in df.columns for v in ([f['x'], f['y']] if f['test'] == 'correlation' else [f['outcome']]))]
+    
+    participant_df, summary_df = influence_analysis(df, findings)
+    
+    for _, row in summary_df.iterrows():
+        flag = f"  <- {row['n_flips']} removal(s) flip significance" if row['n_flips'] else ''
+        print(f"  {row['finding']:<45} est = {row['estimate']:6.3f} "
+              f"[LOO {row['min_loo_estimate']:6.3f} to {row['max_loo_estimate']:6.3f}], "
+              f"max LOO p = {row['max_loo_p']:.3f}{flag}")
+    
+    participant_df.to_csv('influence_diagnostics.csv', index=False)
+    summary_df.to_csv('influence_summary.csv', index=False)
+    print("\n[OK] Saved: influence_diagnostics.csv, influence_summary.csv")
+    
+    return summary_df
+
+def analyze_multiverse(df):
+    """Re-run the key tests over the grid of analytic choices (specification curve)"""
+    
+    print("\n" + "="*80)
+    print("PART 6: MULTIVERSE / SPECIFICATION-CURVE ANALYSIS")
+    print("="*80)
+    
+    analyses = [
+        {'name': 'Memory -> decision_time_change', 'test': 'ttest', 'outcome': 'decision_time_change',
+         'group_col': 'memory_function', 'groups': (True, False)},
+        {'name': 'Memory -> error_corner_mean_time', 'test': 'ttest', 'outcome': 'error_corner_mean_time',
+         'group_col': 'memory_function', 'groups': (True, False)},
+        {'name': 'Agent personality -> phase1_mean_time', 'test': 'ttest', 'outcome': 'phase1_mean_time',
+         'group_col': 'agent_personality', 'groups': ('Introvert', 'Extrovert')},
+        {'name': 'Likeability ~ Trust_post', 'test': 'correlation', 'x': 'Likeability', 'y': 'Trust_post'},
+        {'name': 'Intelligence ~ decision_time_change', 'test': 'correlation', 'x': 'Intelligence',
+         'y': 'decision_time_change'},
+        {'name': 'Memory -> decision-factor response length', 'test': 'ttest', 'outcome': 'word_count',
+         'text_col': 'For Task 1, what factors did you consider when making decisions during the experiment?',
+         'group_col': 'memory_function', 'groups': (True, False)},
+    ]
+    if 'corner1_decision1_time' not in df.columns:
+        print("[WARNING] Corner-level decision times not found")
+        return pd.DataFrame()
+    analyses = [a for a in analyses if a.get('text_col', 'Display') in df.columns
+                and all(v == 'word_count' or v in df.columns for v in analysis_variables(a))]
+    
+    results = run_multiverse(df, analyses)
+    summary_df = multiverse_summary(results)
+    
+    for _, row in summary_df.iterrows():
+        print(f"\n{row['analysis']} ({row['n_universes']} universes):")
+        print(f"  Reported: {row['reported_estimate']:.3f} (p = {row['reported_p']:.3f}); "
+              f"median = {row['median_estimate']:.3f}, range [{row['min_estimate']:.3f}, {row['max_estimate']:.3f}]")
+        print(f"  Significant in {row['share_significant'] * 100:.1f}% of universes")
+    
+    results.to_csv('multiverse_results.csv', index=False)
+    summary_df.to_csv('multiverse_summary.csv', index=False)
+    print("\n[OK] Saved: multiverse_results.csv, multiverse_summary.csv")
+    
+    create_specification_curve_figure(results, [a['name'] for a in analyses])
+    
+    return summary_df
+
+def create_specification_curve_figure(results, analyses):
+    """Specification curves: ranked estimates (top) and the choices behind them (bottom)"""
+    
+    os.makedirs('COMPLETE_FINAL_FIGURES', exist_ok=True)
+    fig, axes = plt.subplots(2, len(analyses), figsize=(4.5 * len(analyses), 8), squeeze=False,
+                             gridspec_kw={'height_ratios': [1, 1.3]})
+    
+    for col, name in enumerate(analyses):
+        curve = specification_curve(results, name)
+        ax, ax_choices = axes[0, col], axes[1, col]
+        colors = np.where(curve['significant'], '#E74C3C', '#95A5A6')
+        ax.scatter(curve['rank'], curve['estimate'], c=colors, s=10)
+        reported = curve[curve['is_reported']]
+        ax.scatter(reported['rank'], reported['estimate'], facecolors='none', edgecolors='black', s=60,
+                   label='Reported')
+        ax.axhline(0, color='black', linewidth=0.8)
+        ax.set_title(name, fontsize=10, fontweight='bold')
+        ax.set_ylabel("Cohen's d" if curve['test'].iloc[0] == 'ttest' else 'r')
+        ax.legend(fontsize=8)
+        
+        # One row per option of the dimensions this analysis varies over
+        labels, y = [], 0
+        for dim in DIMENSIONS:
+            options = curve[dim].dropna().map(str)
+            for option in sorted(options.unique()):
+                ranks = curve.loc[curve[dim].map(str) == option, 'rank']
+                ax_choices.scatter(ranks, np.full(len(ranks), y), marker='|', color='#34495E', s=30)
+                labels.append(f'{dim}: {option}')
+                y += 1
+        ax_choices.set_yticks(range(len(labels)))
+        ax_choices.set_yticklabels(labels, fontsize=7)
+        ax_choices.set_xlabel('Specification rank')
+    
+    plt.tight_layout()
+    plt.savefig('COMPLETE_FINAL_FIGURES/Figure4_Specification_Curves.png',
+                dpi=300, bbox_inches='tight', facecolor='white')
+    plt.close()
+    
+    print("  [OK] Saved: Figure4_Specification_Curves.png")
+
+def create_comprehensive_visualizations(df, cube):
     """Create comprehensive publication figures"""
     
     print("\n" + "="*80)
@@ -434,10 +989,10 @@ def create_comprehensive_visualizations(df):
     x = np.arange(len(conditions))
     width = 0.35
     
-    phase1_means = [df[df['Display'] == c]['phase1_mean_time'].mean() for c in conditions]
-    phase1_sems = [df[df['Display'] == c]['phase1_mean_time'].sem() for c in conditions]
-    phase2_means = [df[df['Display'] == c]['phase2_mean_time'].mean() for c in conditions]
-    phase2_sems = [df[df['Display'] == c]['phase2_mean_time'].sem() for c in conditions]
+    phase1_means = cube_values(cube, 'Display', 'phase1_mean_time', 'mean', conditions)
+    phase1_sems = cube_values(cube, 'Display', 'phase1_mean_time', 'sem', conditions)
+    phase2_means = cube_values(cube, 'Display', 'phase2_mean_time', 'mean', conditions)
+    phase2_sems = cube_values(cube, 'Display', 'phase2_mean_time', 'sem', conditions)
     
     bars1 = ax1.bar(x - width/2, phase1_means, width, yerr=phase1_sems,
                     label='Phase 1 (Guided)', color='skyblue', alpha=0.85,
@@ -466,8 +1021,8 @@ def create_comprehensive_visualizations(df):
     # Panel B: Learning Curve Reversal
     ax2 = axes[0, 1]
     
-    change_means = [df[df['Display'] == c]['decision_time_change'].mean() for c in conditions]
-    change_sems = [df[df['Display'] == c]['decision_time_change'].sem() for c in conditions]
+    change_means = cube_values(cube, 'Display', 'decision_time_change', 'mean', conditions)
+    change_sems = cube_values(cube, 'Display', 'decision_time_change', 'sem', conditions)
     
     bars = ax2.bar(conditions, change_means, yerr=change_sems, color=colors, alpha=0.85,
                    edgecolor='black', linewidth=1.2, capsize=5)
@@ -488,10 +1043,10 @@ def create_comprehensive_visualizations(df):
     # Panel C: Agent Personality Effects by Phase
     ax3 = axes[1, 0]
     
-    phase1_intro = df[df['agent_personality'] == 'Introvert']['phase1_mean_time'].mean()
-    phase1_extro = df[df['agent_personality'] == 'Extrovert']['phase1_mean_time'].mean()
-    phase2_intro = df[df['agent_personality'] == 'Introvert']['phase2_mean_time'].mean()
-    phase2_extro = df[df['agent_personality'] == 'Extrovert']['phase2_mean_time'].mean()
+    phase1_intro, phase1_extro = cube_values(cube, 'agent_personality', 'phase1_mean_time', 'mean',
+                                             ['Introvert', 'Extrovert'])
+    phase2_intro, phase2_extro = cube_values(cube, 'agent_personality', 'phase2_mean_time', 'mean',
+                                             ['Introvert', 'Extrovert'])
     
     x = np.arange(2)
     width = 0.35
@@ -519,8 +1074,8 @@ def create_comprehensive_visualizations(df):
     # Panel D: Error Corner Analysis
     ax4 = axes[1, 1]
     
-    error_means = [df[df['Display'] == c]['error_corner_mean_time'].mean() for c in conditions]
-    error_sems = [df[df['Display'] == c]['error_corner_mean_time'].sem() for c in conditions]
+    error_means = cube_values(cube, 'Display', 'error_corner_mean_time', 'mean', conditions)
+    error_sems = cube_values(cube, 'Display', 'error_corner_mean_time', 'sem', conditions)
     
     bars = ax4.bar(conditions, error_means, yerr=error_sems, color=colors, alpha=0.85,
                    edgecolor='black', linewidth=1.2, capsize=5)
@@ -684,10 +1239,10 @@ def create_comprehensive_visualizations(df):
         # Panel A: Trust Pre vs Post
         ax1 = axes[0, 0]
         
-        intro_pre = df[df['participant_intro_extro'] == 'Introvert']['Trust_pre'].mean()
-        intro_post = df[df['participant_intro_extro'] == 'Introvert']['Trust_post'].mean()
-        extro_pre = df[df['participant_intro_extro'] == 'Extrovert']['Trust_pre'].mean()
-        extro_post = df[df['participant_intro_extro'] == 'Extrovert']['Trust_post'].mean()
+        intro_pre, extro_pre = cube_values(cube, 'participant_intro_extro', 'Trust_pre', 'mean',
+                                           ['Introvert', 'Extrovert'])
+        intro_post, extro_post = cube_values(cube, 'participant_intro_extro', 'Trust_post', 'mean',
+                                             ['Introvert', 'Extrovert'])
         
         x = np.arange(2)
         width = 0.35
@@ -730,7 +1285,7 @@ def create_comprehensive_visualizations(df):
         # Panel C: Initial Trust
         ax3 = axes[1, 0]
         
-        initial_trust_data = df.groupby('Display')['initial_trust'].apply(lambda x: x.mean() * 100)
+        initial_trust_data = cube_table(cube, 'Display', 'initial_trust', ['mean'])['mean'] * 100
         
         bars = ax3.bar(range(len(initial_trust_data)), initial_trust_data.values,
                       color=colors, alpha=0.85, edgecolor='black', linewidth=1.2)
@@ -884,28 +1439,67 @@ def main():
     # Load data
     df = load_data()
     
+    # Descriptive statistics for every metric x grouping, computed once
+    cube = build_descriptive_cube(df)
+    
     # Run all analyses
     print("\n" + "="*80)
     print("RUNNING ALL ANALYSES (INTEGRATED)")
     print("="*80)
     
+    # Questionnaire reliability (when item-level responses are available)
+    reliability_results = analyze_scale_reliability(df)
+    
     # Agent perceptions
     corr_results = analyze_agent_perceptions_correlations(df)
     
+    # Perception factor structure
+    dimension_results = analyze_perception_dimensions(df)
+    
+    # Partial-correlation network
+    network_results = analyze_partial_correlation_network(df)
+    
+    # Perception -> trust -> behavior mediation
+    mediation_results = analyze_perception_trust_mediation(df)
+    
+    # Multiple-imputation sensitivity analysis
+    mi_results = analyze_with_multiple_imputation(df)
+    
     # VR metrics
     vr_results = analyze_vr_metrics_effects(df)
     
+    # Out-of-sample prediction
+    prediction_results = analyze_out_of_sample_prediction(df)
+    
     # Agent personality on perceptions
-    perception_results = analyze_agent_personality_on_perceptions(df)
+    perception_results = analyze_agent_personality_on_perceptions(df, cube)
     
     # Phase-specific
-    phase_results = analyze_phase_specific_effects(df)
+    phase_results = analyze_phase_specific_effects(df, cube)
+    
+    # Post-error sequential effects
+    sequential_results = analyze_post_error_effects(df)
+    
+    # Decision patterns and transitions
+    pattern_results = analyze_decision_patterns(df)
+    
+    # Behavioural participant profiles
+    profile_results = analyze_participant_profiles(df)
     
     # Initial trust
-    analyze_initial_trust(df)
+    analyze_initial_trust(df, cube)
+    
+    # Equivalence tests for the non-significant contrasts
+    equivalence_results = analyze_equivalence(df, cube)
+    
+    # Single-participant influence on the findings
+    influence_results = analyze_influence(df)
+    
+    # Robustness of the key tests to the analytic choices
+    multiverse_results = analyze_multiverse(df)
     
     # Create visualizations
-    create_comprehensive_visualizations(df)
+    create_comprehensive_visualizations(df, cube)
     
     # Compile all findings
     all_findings = compile_all_findings()
@@ -928,13 +1522,33 @@ def main():
     print("  - Figure1_Complete_Decision_Time_Analysis.png")
     print("  - Figure2_Agent_Perceptions_Analysis.png")
     print("  - Figure3_Participant_Behavior_Complete.png")
+    print("  - Figure4_Specification_Curves.png")
     
     print("\nData Files:")
     print("  - ALL_INTEGRATED_FINDINGS.csv (master findings table)")
+    print("  - scale_reliability.csv / scale_item_statistics.csv (item-level data only)")
     print("  - agent_perception_correlations.csv")
+    print("  - perception_factor_loadings.csv")
+    print("  - perception_factor_invariance.csv")
+    print("  - perception_factor_correlations.csv")
+    print("  - network_edges.csv")
+    print("  - network_centrality.csv")
+    print("  - network_by_condition.csv")
+    print("  - perception_trust_mediation.csv")
+    print("  - multiple_imputation_pooled_results.csv")
     print("  - vr_metrics_correlations.csv")
+    print("  - vr_metrics_memory_moderation.csv")
+    print("  - prediction_fold_results.csv / prediction_summary.csv")
     print("  - agent_personality_perception_effects.csv")
     print("  - phase_comparison_results.csv")
+    print("  - post_error_sequential_effects.csv")
+    print("  - decision_patterns.csv")
+    print("  - compliance_transitions.csv")
+    print("  - participant_profiles.csv")
+    print("  - profile_prevalence.csv")
+    print("  - equivalence_tests.csv")
+    print("  - influence_diagnostics.csv / influence_summary.csv")
+    print("  - multiverse_results.csv / multiverse_summary.csv")
 
 if __name__ == "__main__":
     main()
@@ -1,3 +1,5 @@
+import os
+import sys
 import pandas as pd
 import numpy as np
 from scipy import stats
@@ -6,6 +8,15 @@ import seaborn as sns
 import warnings
 warnings.filterwarnings('ignore')
 
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                                '..', '..', 'Shared_Resources', 'common_functions'))
+from descriptive_cube import build_descriptive_cube, cube_table, cube_values, cube_series, cube_value
+from decision_time_cleaning import clean_times
+from equivalence import metric_bounds, tost_from_stats
+from group_tests import ttest_from_stats
+from partial_correlation_network import estimate_network, network_matrix
+from trust_metrics import STUDY1_DESIGN, compliance_metrics, corner_times, followed_matrix, time_metrics
+
 def load_data():
     """Load complete data with all metrics"""
     print("="*80)
@@ -56,7 +67,7 @@ def load_data():
     
     return df
 
-def create_figure1_sample_descriptives(df):
+def create_figure1_sample_descriptives(df, cube):
     """Figure 1: Sample Characteristics (6 panels)"""
     print("\n[1] Creating Figure 1: Sample Characteristics...")
     
@@ -121,10 +132,11 @@ def create_figure1_sample_descriptives(df):
         age_data = df['Age'].dropna()
         ax4.hist(age_data, bins=15, color='#4ECDC4', edgecolor='black', 
                 linewidth=1.2, alpha=0.85)
-        ax4.axvline(age_data.mean(), color='red', linestyle='--', linewidth=2.5,
-                   label=f'Mean = {age_data.mean():.1f}')
-        ax4.axvline(age_data.median(), color='orange', linestyle='--', linewidth=2.5,
-                   label=f'Median = {age_data.median():.1f}')
+        age_mean, age_median = cube_value(cube, 'Age', 'mean'), cube_value(cube, 'Age', 'median')
+        ax4.axvline(age_mean, color='red', linestyle='--', linewidth=2.5,
+                   label=f'Mean = {age_mean:.1f}')
+        ax4.axvline(age_median, color='orange', linestyle='--', linewidth=2.5,
+                   label=f'Median = {age_median:.1f}')
         ax4.set_xlabel('Age (years)', fontsize=11, fontweight='bold')
         ax4.set_ylabel('Frequency', fontsize=11, fontweight='bold')
         ax4.set_title('D. Age Distribution', fontsize=12, fontweight='bold')
@@ -135,7 +147,7 @@ def create_figure1_sample_descriptives(df):
     ax5 = fig.add_subplot(gs[1, 1])
     
     if 'Trust_pre' in df.columns:
-        trust_pre_means = df.groupby('condition_label')['Trust_pre'].agg(['mean', 'sem'])
+        trust_pre_means = cube_table(cube, 'condition_label', 'Trust_pre')
         
         bars = ax5.bar(range(len(trust_pre_means)), trust_pre_means['mean'].values,
                        yerr=trust_pre_means['sem'].values, capsize=5,
@@ -151,8 +163,8 @@ def create_figure1_sample_descriptives(df):
     ax6 = fig.add_subplot(gs[1, 2])
     
     vr_metrics = ['Familiarity', 'Immersion', 'Self-efficacy']
-    vr_means = [df[m].mean() for m in vr_metrics if m in df.columns]
-    vr_sems = [df[m].sem() for m in vr_metrics if m in df.columns]
+    vr_means = [cube_value(cube, m, 'mean') for m in vr_metrics if m in df.columns]
+    vr_sems = [cube_value(cube, m, 'sem') for m in vr_metrics if m in df.columns]
     vr_labels = [m for m in vr_metrics if m in df.columns]
     
     if vr_means:
@@ -175,7 +187,7 @@ def create_figure1_sample_descriptives(df):
     
     print("  [OK] Saved: Figure1_Sample_Descriptives.png")
 
-def create_figure2_trust_by_all_conditions(df):
+def create_figure2_trust_by_all_conditions(df, cube):
     """Figure 2: Trust outcomes by ALL condition combinations (9 panels)"""
     print("\n[2] Creating Figure 2: Trust by All Conditions...")
     
@@ -189,10 +201,10 @@ def create_figure2_trust_by_all_conditions(df):
     x = np.arange(len(conditions))
     width = 0.35
     
-    pre_means = [df[df['condition_label']==c]['Trust_pre'].mean() for c in conditions]
-    pre_sems = [df[df['condition_label']==c]['Trust_pre'].sem() for c in conditions]
-    post_means = [df[df['condition_label']==c]['Trust_post'].mean() for c in conditions]
-    post_sems = [df[df['condition_label']==c]['Trust_post'].sem() for c in conditions]
+    pre_means = cube_values(cube, 'condition_label', 'Trust_pre', 'mean', conditions)
+    pre_sems = cube_values(cube, 'condition_label', 'Trust_pre', 'sem', conditions)
+    post_means = cube_values(cube, 'condition_label', 'Trust_post', 'mean', conditions)
+    post_sems = cube_values(cube, 'condition_label', 'Trust_post', 'sem', conditions)
     
     bars1 = ax1.bar(x - width/2, pre_means, width, yerr=pre_sems, capsize=4,
                     label='Pre-Task Trust', color='skyblue', edgecolor='black',
@@ -212,7 +224,7 @@ def create_figure2_trust_by_all_conditions(df):
     # Panel B: Trust by Memory Function
     ax2 = fig.add_subplot(gs[0, 1])
     
-    mem_groups = df.groupby('memory_function')[['Trust_pre', 'Trust_post']].agg(['mean', 'sem'])
+    mem_groups = cube_table(cube, 'memory_function', ['Trust_pre', 'Trust_post'])
     
     x = np.arange(2)
     width = 0.35
@@ -233,18 +245,24 @@ def create_figure2_trust_by_all_conditions(df):
     ax2.grid(axis='y', alpha=0.3)
     
     # Add stats annotation
-    with_mem = df[df['memory_function'] == 'With Memory Function']['Trust_post'].dropna()
-    without_mem = df[df['memory_function'] == 'Without Memory Function']['Trust_post'].dropna()
-    if len(with_mem) > 1 and len(without_mem) > 1:
-        t, p = stats.ttest_ind(with_mem, without_mem)
-        ax2.text(0.5, 0.95, f'Post-Task: p = {p:.3f}', transform=ax2.transAxes,
+    n, m, sd = [cube_values(cube, 'memory_function', 'Trust_post', stat,
+                            ['With Memory Function', 'Without Memory Function'])
+                for stat in ('count', 'mean', 'std')]
+    if n[0] > 1 and n[1] > 1:
+        p = float(ttest_from_stats(n[0], m[0], sd[0]**2, n[1], m[1], sd[1]**2)['p'])
+        # Equivalence (TOST) against the trust-scale bound, so a null result is interpretable
+        _, bound, scale = metric_bounds(['Trust_post'])
+        p_tost = float(tost_from_stats(n[0], m[0], sd[0]**2, n[1], m[1], sd[1]**2,
+                                       bound[0], scale[0])['p_tost'])
+        ax2.text(0.5, 0.95, f'Post-Task: p = {p:.3f}\nTOST (±{bound[0]:.0f}): p = {p_tost:.3f}',
+                transform=ax2.transAxes,
                 ha='center', va='top', fontsize=9, 
                 bbox=dict(boxstyle='round', facecolor='yellow', alpha=0.3))
     
     # Panel C: Trust by Agent Personality
     ax3 = fig.add_subplot(gs[0, 2])
     
-    agent_groups = df.groupby('agent_personality')[['Trust_pre', 'Trust_post']].agg(['mean', 'sem'])
+    agent_groups = cube_table(cube, 'agent_personality', ['Trust_pre', 'Trust_post'])
     
     x = np.arange(2)
     width = 0.35
@@ -267,7 +285,7 @@ def create_figure2_trust_by_all_conditions(df):
     # Panel D: Trust by Match/Mismatch
     ax4 = fig.add_subplot(gs[1, 0])
     
-    match_groups = df.groupby('match_label')[['Trust_pre', 'Trust_post']].agg(['mean', 'sem'])
+    match_groups = cube_table(cube, 'match_label', ['Trust_pre', 'Trust_post'])
     
     x = np.arange(2)
     width = 0.35
@@ -290,7 +308,7 @@ def create_figure2_trust_by_all_conditions(df):
     # Panel E: Trust by Participant Personality
     ax5 = fig.add_subplot(gs[1, 1])
     
-    part_groups = df.groupby('participant_intro_extro')[['Trust_pre', 'Trust_post']].agg(['mean', 'sem'])
+    part_groups = cube_table(cube, 'participant_intro_extro', ['Trust_pre', 'Trust_post'])
     
     x = np.arange(2)
     width = 0.35
@@ -311,10 +329,11 @@ def create_figure2_trust_by_all_conditions(df):
     ax5.grid(axis='y', alpha=0.3)
     
     # Add stats
-    intro_pre = df[df['participant_intro_extro'] == 'Introvert Participant']['Trust_pre'].dropna()
-    extro_pre = df[df['participant_intro_extro'] == 'Extrovert Participant']['Trust_pre'].dropna()
-    if len(intro_pre) > 1 and len(extro_pre) > 1:
-        t, p = stats.ttest_ind(intro_pre, extro_pre)
+    n, m, sd = [cube_values(cube, 'participant_intro_extro', 'Trust_pre', stat,
+                            ['Introvert Participant', 'Extrovert Participant'])
+                for stat in ('count', 'mean', 'std')]
+    if n[0] > 1 and n[1] > 1:
+        p = float(ttest_from_stats(n[0], m[0], sd[0]**2, n[1], m[1], sd[1]**2)['p'])
         if p < 0.10:
             ax5.text(0.5, 0.95, f'Pre-Task: p = {p:.3f}*', transform=ax5.transAxes,
                     ha='center', va='top', fontsize=9,
@@ -329,8 +348,9 @@ def create_figure2_trust_by_all_conditions(df):
         ax6.hist(trust_diff, bins=20, color='#4ECDC4', edgecolor='black',
                 linewidth=1.2, alpha=0.85)
         ax6.axvline(0, color='red', linestyle='--', linewidth=2.5, label='No Change')
-        ax6.axvline(trust_diff.mean(), color='orange', linestyle='--', linewidth=2.5,
-                   label=f'Mean = {trust_diff.mean():.2f}')
+        trust_diff_mean = cube_value(cube, 'trust_difference', 'mean')
+        ax6.axvline(trust_diff_mean, color='orange', linestyle='--', linewidth=2.5,
+                   label=f'Mean = {trust_diff_mean:.2f}')
         ax6.set_xlabel('Trust Change (Post - Pre)', fontsize=11, fontweight='bold')
         ax6.set_ylabel('Frequency', fontsize=11, fontweight='bold')
         ax6.set_title('F. Trust Change Distribution', fontsize=12, fontweight='bold')
@@ -340,7 +360,7 @@ def create_figure2_trust_by_all_conditions(df):
     # Panel G: Trust by Match × Memory
     ax7 = fig.add_subplot(gs[2, 0])
     
-    match_mem_groups = df.groupby(['match_label', 'memory_function'])['Trust_post'].agg(['mean', 'sem']).reset_index()
+    match_mem_groups = cube_table(cube, ['match_label', 'memory_function'], 'Trust_post').reset_index()
     
     x = np.arange(2)
     width = 0.35
@@ -367,7 +387,7 @@ def create_figure2_trust_by_all_conditions(df):
     # Panel H: Trust by Agent Personality × Memory
     ax8 = fig.add_subplot(gs[2, 1])
     
-    agent_mem_groups = df.groupby(['agent_personality', 'memory_function'])['Trust_post'].agg(['mean', 'sem']).reset_index()
+    agent_mem_groups = cube_table(cube, ['agent_personality', 'memory_function'], 'Trust_post').reset_index()
     
     x = np.arange(2)
     width = 0.35
@@ -397,8 +417,8 @@ def create_figure2_trust_by_all_conditions(df):
     if 'Propensity' in df.columns or 'Propensity_pre' in df.columns:
         prop_col = 'Propensity_pre' if 'Propensity_pre' in df.columns else 'Propensity'
         
-        prop_means = [df[df['condition_label']==c][prop_col].mean() for c in conditions]
-        prop_sems = [df[df['condition_label']==c][prop_col].sem() for c in conditions]
+        prop_means = cube_values(cube, 'condition_label', prop_col, 'mean', conditions)
+        prop_sems = cube_values(cube, 'condition_label', prop_col, 'sem', conditions)
         
         colors = ['#4ECDC4', '#95E1D3', '#FF6B6B', '#FFB3B3']
         bars = ax9.bar(range(len(conditions)), prop_means, yerr=prop_sems, capsize=4,
@@ -419,25 +439,21 @@ def create_figure2_trust_by_all_conditions(df):
     
     print("  [OK] Saved: Figure2_Trust_All_Conditions.png")
 
-def create_figure3_decision_time_comprehensive(df):
+def create_figure3_decision_time_comprehensive(df, cube):
     """Figure 3: Decision time by all conditions (9 panels)"""
     print("\n[3] Creating Figure 3: Decision Time Comprehensive...")
     
     fig = plt.figure(figsize=(20, 14))
     gs = fig.add_gridspec(3, 3, hspace=0.4, wspace=0.3)
     
-    # Calculate metrics if needed
-    if 'mean_decision_time_overall' not in df.columns:
-        calculate_decision_metrics(df)
-    
     colors = ['#4ECDC4', '#95E1D3', '#FF6B6B', '#FFB3B3']
     conditions = df['condition_label'].unique()
     
     # Panel A: Overall decision time by condition
     ax1 = fig.add_subplot(gs[0, 0])
     
-    means = [df[df['condition_label']==c]['mean_decision_time_overall'].mean() for c in conditions]
-    sems = [df[df['condition_label']==c]['mean_decision_time_overall'].sem() for c in conditions]
+    means = cube_values(cube, 'condition_label', 'mean_decision_time_overall', 'mean', conditions)
+    sems = cube_values(cube, 'condition_label', 'mean_decision_time_overall', 'sem', conditions)
     
     bars = ax1.bar(range(len(conditions)), means, yerr=sems, capsize=5,
                    color=colors, edgecolor='black', linewidth=1.5, alpha=0.85)
@@ -453,10 +469,10 @@ def create_figure3_decision_time_comprehensive(df):
     x = np.arange(len(conditions))
     width = 0.35
     
-    p1_means = [df[df['condition_label']==c]['phase1_mean_time'].mean() for c in conditions]
-    p1_sems = [df[df['condition_label']==c]['phase1_mean_time'].sem() for c in conditions]
-    p2_means = [df[df['condition_label']==c]['phase2_mean_time'].mean() for c in conditions]
-    p2_sems = [df[df['condition_label']==c]['phase2_mean_time'].sem() for c in conditions]
+    p1_means = cube_values(cube, 'condition_label', 'phase1_mean_time', 'mean', conditions)
+    p1_sems = cube_values(cube, 'condition_label', 'phase1_mean_time', 'sem', conditions)
+    p2_means = cube_values(cube, 'condition_label', 'phase2_mean_time', 'mean', conditions)
+    p2_sems = cube_values(cube, 'condition_label', 'phase2_mean_time', 'sem', conditions)
     
     ax2.bar(x - width/2, p1_means, width, yerr=p1_sems, capsize=4,
            label='Phase 1 (Guided)', color='skyblue', edgecolor='black', linewidth=1.2, alpha=0.85)
@@ -473,8 +489,8 @@ def create_figure3_decision_time_comprehensive(df):
     # Panel C: Decision time change
     ax3 = fig.add_subplot(gs[0, 2])
     
-    change_means = [df[df['condition_label']==c]['decision_time_change'].mean() for c in conditions]
-    change_sems = [df[df['condition_label']==c]['decision_time_change'].sem() for c in conditions]
+    change_means = cube_values(cube, 'condition_label', 'decision_time_change', 'mean', conditions)
+    change_sems = cube_values(cube, 'condition_label', 'decision_time_change', 'sem', conditions)
     
     bars = ax3.bar(range(len(conditions)), change_means, yerr=change_sems, capsize=5,
                    color=colors, edgecolor='black', linewidth=1.5, alpha=0.85)
@@ -488,7 +504,7 @@ def create_figure3_decision_time_comprehensive(df):
     # Panel D: By Memory Function
     ax4 = fig.add_subplot(gs[1, 0])
     
-    mem_groups = df.groupby('memory_function')[['phase1_mean_time', 'phase2_mean_time']].agg(['mean', 'sem'])
+    mem_groups = cube_table(cube, 'memory_function', ['phase1_mean_time', 'phase2_mean_time'])
     
     x = np.arange(2)
     width = 0.35
@@ -510,7 +526,7 @@ def create_figure3_decision_time_comprehensive(df):
     # Panel E: By Agent Personality
     ax5 = fig.add_subplot(gs[1, 1])
     
-    agent_groups = df.groupby('agent_personality')[['phase1_mean_time', 'phase2_mean_time']].agg(['mean', 'sem'])
+    agent_groups = cube_table(cube, 'agent_personality', ['phase1_mean_time', 'phase2_mean_time'])
     
     x = np.arange(2)
     width = 0.35
@@ -532,7 +548,7 @@ def create_figure3_decision_time_comprehensive(df):
     # Panel F: By Match/Mismatch
     ax6 = fig.add_subplot(gs[1, 2])
     
-    match_groups = df.groupby('match_label')[['phase1_mean_time', 'phase2_mean_time']].agg(['mean', 'sem'])
+    match_groups = cube_table(cube, 'match_label', ['phase1_mean_time', 'phase2_mean_time'])
     
     x = np.arange(2)
     width = 0.35
@@ -554,8 +570,8 @@ def create_figure3_decision_time_comprehensive(df):
     # Panel G: Error corner time
     ax7 = fig.add_subplot(gs[2, 0])
     
-    error_means = [df[df['condition_label']==c]['error_corner_mean_time'].mean() for c in conditions]
-    error_sems = [df[df['condition_label']==c]['error_corner_mean_time'].sem() for c in conditions]
+    error_means = cube_values(cube, 'condition_label', 'error_corner_mean_time', 'mean', conditions)
+    error_sems = cube_values(cube, 'condition_label', 'error_corner_mean_time', 'sem', conditions)
     
     bars = ax7.bar(range(len(conditions)), error_means, yerr=error_sems, capsize=5,
                    color=colors, edgecolor='black', linewidth=1.5, alpha=0.85)
@@ -568,7 +584,7 @@ def create_figure3_decision_time_comprehensive(df):
     # Panel H: By Participant Personality
     ax8 = fig.add_subplot(gs[2, 1])
     
-    part_groups = df.groupby('participant_intro_extro')['mean_decision_time_overall'].agg(['mean', 'sem'])
+    part_groups = cube_table(cube, 'participant_intro_extro', 'mean_decision_time_overall')
     
     bars = ax8.bar(range(len(part_groups)), part_groups['mean'].values,
                    yerr=part_groups['sem'].values, capsize=5,
@@ -602,66 +618,23 @@ def create_figure3_decision_time_comprehensive(df):
     print("  [OK] Saved: Figure3_DecisionTime_All_Conditions.png")
 
 def calculate_decision_metrics(df):
-    """Calculate decision time metrics if missing"""
-    
-    agent_recommendations = {
-        1: 'Right', 2: 'Forward', 3: 'Left', 4: 'Right', 5: 'Forward',
-        6: 'Forward', 7: 'Forward', 8: 'Left', 9: 'Left', 10: 'Left'
-    }
-    
-    correct_path = {
-        1: 'Right', 2: 'Forward', 3: 'Right', 4: 'Right', 5: 'Forward',
-        6: 'Forward', 7: 'Left', 8: 'Left', 9: 'Forward', 10: 'Left'
-    }
-    
-    if 'phase1_mean_time' not in df.columns:
-        df['phase1_mean_time'] = 0.0
-    if 'phase2_mean_time' not in df.columns:
-        df['phase2_mean_time'] = 0.0
-    if 'decision_time_change' not in df.columns:
-        df['decision_time_change'] = 0.0
-    if 'error_corner_mean_time' not in df.columns:
-        df['error_corner_mean_time'] = 0.0
-    if 'mean_decision_time_overall' not in df.columns:
-        df['mean_decision_time_overall'] = 0.0
-    
-    for idx, row in df.iterrows():
-        phase1_times = []
-        phase2_times = []
-        all_times = []
-        error_times = []
-        
-        for corner in range(1, 11):
-            time_col = f'corner{corner}_decision1_time'
-            
-            if time_col in df.columns and pd.notna(row[time_col]):
-                t = row[time_col]
-                all_times.append(t)
-                
-                if corner <= 5:
-                    phase1_times.append(t)
-                else:
-                    phase2_times.append(t)
-                
-                if corner in [3, 7, 9]:
-                    error_times.append(t)
-        
-        if phase1_times:
-            df.loc[idx, 'phase1_mean_time'] = np.mean(phase1_times)
-        if phase2_times:
-            df.loc[idx, 'phase2_mean_time'] = np.mean(phase2_times)
-        if phase1_times and phase2_times:
-            df.loc[idx, 'decision_time_change'] = np.mean(phase2_times) - np.mean(phase1_times)
-        if all_times:
-            df.loc[idx, 'mean_decision_time_overall'] = np.mean(all_times)
-        if error_times:
-            df.loc[idx, 'error_corner_mean_time'] = np.mean(error_times)
+    """Calculate decision time metrics from the trimmed corner times"""
+    
+    times = clean_times(corner_times(df, STUDY1_DESIGN['n_corners']), STUDY1_DESIGN['time_cleaning'])
+    for col, values in time_metrics(times, STUDY1_DESIGN).items():
+        df[col] = values
+
+def calculate_compliance_rate(df):
+    """Calculate compliance rate (and the other compliance metrics) if missing"""
+    
+    for col, values in compliance_metrics(followed_matrix(df, STUDY1_DESIGN), STUDY1_DESIGN).items():
+        df[col] = values
 
-def create_figure4_agent_perceptions_heatmap(df):
+def create_figure4_agent_perceptions_heatmap(df, cube):
     """Figure 4: Complete agent perceptions correlation heatmap"""
     print("\n[4] Creating Figure 4: Agent Perceptions Correlation Heatmap...")
     
-    fig, axes = plt.subplots(2, 2, figsize=(18, 14))
+    fig, axes = plt.subplots(2, 3, figsize=(26, 14))
     
     agent_metrics = ['Anthropomorphism', 'Animacy', 'Likeability', 
                     'Intelligence', 'Safety', 'Aesthetic']
@@ -754,7 +727,37 @@ def create_figure4_agent_perceptions_heatmap(df):
     
     ax4.set_title('D. Personality Match Condition', fontsize=12, fontweight='bold')
     
-    plt.suptitle('Figure 4: Agent Perception Correlations by Subgroup',
+    # Panels E-F: Partial correlations (each pair controlling for all other nodes).
+    # Trust difference and overall time are sums of other nodes, so they are left out.
+    network_outcomes = ['Trust_pre', 'Trust_post', 'phase1_mean_time', 'phase2_mean_time',
+                        'compliance_rate', 'overcompliance']
+    X = network_matrix(df, agent_metrics + network_outcomes)
+    ax5, ax6 = axes[0, 2], axes[1, 2]
+    rows = [m for m in agent_metrics if m in X.columns]
+    cols = [m for m in network_outcomes if m in X.columns]
+    if rows and cols and len(X) > X.shape[1]:
+        network = estimate_network(X, method='glasso')
+        r_idx = [X.columns.get_loc(m) for m in rows]
+        c_idx = [X.columns.get_loc(m) for m in cols]
+        partial = network['weights'][np.ix_(r_idx, c_idx)]
+        marginal = network['R'][np.ix_(r_idx, c_idx)]
+        
+        sns.heatmap(partial, annot=True, fmt='.2f', cmap='RdBu_r', center=0,
+                   xticklabels=[m.replace('_', '\n') for m in cols],
+                   yticklabels=rows, cbar_kws={'label': 'Partial r'},
+                   vmin=-0.6, vmax=0.6, ax=ax5, linewidths=0.5)
+        ax5.set_title(f'E. Partial Correlations (EBIC glasso, n = {len(X)})', fontsize=12, fontweight='bold')
+        
+        sns.heatmap(partial - marginal, annot=True, fmt='.2f', cmap='PuOr_r', center=0,
+                   xticklabels=[m.replace('_', '\n') for m in cols],
+                   yticklabels=rows, cbar_kws={'label': 'Partial r - Pearson r'},
+                   vmin=-0.6, vmax=0.6, ax=ax6, linewidths=0.5)
+        ax6.set_title('F. Partial minus Marginal Correlation', fontsize=12, fontweight='bold')
+    else:
+        ax5.axis('off')
+        ax6.axis('off')
+    
+    plt.suptitle('Figure 4: Agent Perception Correlations by Subgroup and Partial Correlations',
                 fontsize=15, fontweight='bold')
     plt.tight_layout()
     
@@ -764,40 +767,21 @@ def create_figure4_agent_perceptions_heatmap(df):
     
     print("  [OK] Saved: Figure4_Perceptions_Heatmap_Subgroups.png")
 
-def create_figure5_compliance_patterns(df):
+def create_figure5_compliance_patterns(df, cube):
     """Figure 5: Compliance patterns by all conditions (6 panels)"""
     print("\n[5] Creating Figure 5: Compliance Patterns...")
     
     fig = plt.figure(figsize=(18, 12))
     gs = fig.add_gridspec(2, 3, hspace=0.35, wspace=0.3)
     
-    if 'compliance_rate' not in df.columns:
-        # Calculate compliance
-        df['compliance_rate'] = 0.0
-        for idx, row in df.iterrows():
-            followed = 0
-            total = 0
-            for corner in range(1, 11):
-                dir_col = f'corner{corner}_decision1_direction'
-                if dir_col in df.columns and pd.notna(row[dir_col]):
-                    total += 1
-                    agent_recommendations = {
-                        1: 'Right', 2: 'Forward', 3: 'Left', 4: 'Right', 5: 'Forward',
-                        6: 'Forward', 7: 'Forward', 8: 'Left', 9: 'Left', 10: 'Left'
-                    }
-                    if row[dir_col] == agent_recommendations[corner]:
-                        followed += 1
-            if total > 0:
-                df.loc[idx, 'compliance_rate'] = (followed / total) * 100
-    
     conditions = df['condition_label'].unique()
     colors = ['#4ECDC4', '#95E1D3', '#FF6B6B', '#FFB3B3']
     
     # Panel A: Compliance by condition
     ax1 = fig.add_subplot(gs[0, 0])
     
-    comp_means = [df[df['condition_label']==c]['compliance_rate'].mean() for c in conditions]
-    comp_sems = [df[df['condition_label']==c]['compliance_rate'].sem() for c in conditions]
+    comp_means = cube_values(cube, 'condition_label', 'compliance_rate', 'mean', conditions)
+    comp_sems = cube_values(cube, 'condition_label', 'compliance_rate', 'sem', conditions)
     
     bars = ax1.bar(range(len(conditions)), comp_means, yerr=comp_sems, capsize=5,
                    color=colors, edgecolor='black', linewidth=1.5, alpha=0.85)
@@ -811,7 +795,7 @@ def create_figure5_compliance_patterns(df):
     # Panel B: By Memory
     ax2 = fig.add_subplot(gs[0, 1])
     
-    mem_comp = df.groupby('memory_function')['compliance_rate'].agg(['mean', 'sem'])
+    mem_comp = cube_table(cube, 'memory_function', 'compliance_rate')
     
     bars = ax2.bar(range(len(mem_comp)), mem_comp['mean'].values,
                    yerr=mem_comp['sem'].values, capsize=5,
@@ -826,7 +810,7 @@ def create_figure5_compliance_patterns(df):
     # Panel C: By Agent Personality
     ax3 = fig.add_subplot(gs[0, 2])
     
-    agent_comp = df.groupby('agent_personality')['compliance_rate'].agg(['mean', 'sem'])
+    agent_comp = cube_table(cube, 'agent_personality', 'compliance_rate')
     
     bars = ax3.bar(range(len(agent_comp)), agent_comp['mean'].values,
                    yerr=agent_comp['sem'].values, capsize=5,
@@ -841,7 +825,7 @@ def create_figure5_compliance_patterns(df):
     # Panel D: By Match
     ax4 = fig.add_subplot(gs[1, 0])
     
-    match_comp = df.groupby('match_label')['compliance_rate'].agg(['mean', 'sem'])
+    match_comp = cube_table(cube, 'match_label', 'compliance_rate')
     
     bars = ax4.bar(range(len(match_comp)), match_comp['mean'].values,
                    yerr=match_comp['sem'].values, capsize=5,
@@ -857,7 +841,7 @@ def create_figure5_compliance_patterns(df):
     ax5 = fig.add_subplot(gs[1, 1])
     
     if 'overcompliance' in df.columns:
-        part_over = df.groupby('participant_intro_extro')['overcompliance'].agg(['mean', 'sem'])
+        part_over = cube_table(cube, 'participant_intro_extro', 'overcompliance')
         
         bars = ax5.bar(range(len(part_over)), part_over['mean'].values,
                        yerr=part_over['sem'].values, capsize=5,
@@ -872,7 +856,7 @@ def create_figure5_compliance_patterns(df):
     ax6 = fig.add_subplot(gs[1, 2])
     
     if 'initial_trust' in df.columns:
-        init_trust = df.groupby('condition_label')['initial_trust'].apply(lambda x: x.mean() * 100)
+        init_trust = cube_table(cube, 'condition_label', 'initial_trust', ['mean'])['mean'] * 100
         
         bars = ax6.bar(range(len(init_trust)), init_trust.values,
                        color=colors, edgecolor='black', linewidth=1.5, alpha=0.85)
@@ -895,7 +879,7 @@ def create_figure5_compliance_patterns(df):
     
     print("  [OK] Saved: Figure5_Compliance_Patterns.png")
 
-def create_figure6_perceptions_by_conditions(df):
+def create_figure6_perceptions_by_conditions(df, cube):
     """Figure 6: All agent perceptions by conditions (6 panels)"""
     print("\n[6] Creating Figure 6: Agent Perceptions by Conditions...")
     
@@ -914,8 +898,8 @@ def create_figure6_perceptions_by_conditions(df):
         
         ax = fig.add_subplot(gs[idx // 3, idx % 3])
         
-        means = [df[df['condition_label']==c][metric].mean() for c in conditions]
-        sems = [df[df['condition_label']==c][metric].sem() for c in conditions]
+        means = cube_values(cube, 'condition_label', metric, 'mean', conditions)
+        sems = cube_values(cube, 'condition_label', metric, 'sem', conditions)
         
         bars = ax.bar(range(len(conditions)), means, yerr=sems, capsize=5,
                      color=colors, edgecolor='black', linewidth=1.5, alpha=0.85)
@@ -935,7 +919,7 @@ def create_figure6_perceptions_by_conditions(df):
     
     print("  [OK] Saved: Figure6_Agent_Perceptions_By_Condition.png")
 
-def create_figure7_interaction_plots(df):
+def create_figure7_interaction_plots(df, cube):
     """Figure 7: All 2-way interaction plots (6 panels)"""
     print("\n[7] Creating Figure 7: Interaction Plots...")
     
@@ -946,8 +930,7 @@ def create_figure7_interaction_plots(df):
     ax1 = fig.add_subplot(gs[0, 0])
     
     for agent in ['Introvert Agent', 'Extrovert Agent']:
-        data = df[df['agent_personality'] == agent]
-        mem_groups = data.groupby('memory_function')['Trust_post'].mean()
+        mem_groups = cube_series(cube, ['agent_personality', 'memory_function'], 'Trust_post', 'mean', within=agent)
         
         if len(mem_groups) == 2:  # Need both memory conditions
             x_pos = [0, 1]
@@ -966,8 +949,7 @@ def create_figure7_interaction_plots(df):
     ax2 = fig.add_subplot(gs[0, 1])
     
     for match in ['Match', 'Mismatch']:
-        data = df[df['match_label'] == match]
-        mem_groups = data.groupby('memory_function')['Trust_post'].mean()
+        mem_groups = cube_series(cube, ['match_label', 'memory_function'], 'Trust_post', 'mean', within=match)
         
         if len(mem_groups) == 2:
             x_pos = [0, 1]
@@ -986,8 +968,7 @@ def create_figure7_interaction_plots(df):
     ax3 = fig.add_subplot(gs[0, 2])
     
     for agent in ['Introvert Agent', 'Extrovert Agent']:
-        data = df[df['agent_personality'] == agent]
-        mem_groups = data.groupby('memory_function')['mean_decision_time_overall'].mean()
+        mem_groups = cube_series(cube, ['agent_personality', 'memory_function'], 'mean_decision_time_overall', 'mean', within=agent)
         
         if len(mem_groups) == 2:
             x_pos = [0, 1]
@@ -1006,8 +987,7 @@ def create_figure7_interaction_plots(df):
     ax4 = fig.add_subplot(gs[1, 0])
     
     for match in ['Match', 'Mismatch']:
-        data = df[df['match_label'] == match]
-        agent_groups = data.groupby('agent_personality')['Trust_post'].mean()
+        agent_groups = cube_series(cube, ['match_label', 'agent_personality'], 'Trust_post', 'mean', within=match)
         
         if len(agent_groups) == 2:
             x_pos = [0, 1]
@@ -1026,8 +1006,7 @@ def create_figure7_interaction_plots(df):
     ax5 = fig.add_subplot(gs[1, 1])
     
     for part in ['Introvert Participant', 'Extrovert Participant']:
-        data = df[df['participant_intro_extro'] == part]
-        agent_groups = data.groupby('agent_personality')['Trust_post'].mean()
+        agent_groups = cube_series(cube, ['participant_intro_extro', 'agent_personality'], 'Trust_post', 'mean', within=part)
         
         if len(agent_groups) == 2:
             x_pos = [0, 1]
@@ -1046,8 +1025,7 @@ def create_figure7_interaction_plots(df):
     ax6 = fig.add_subplot(gs[1, 2])
     
     for part in ['Introvert Participant', 'Extrovert Participant']:
-        data = df[df['participant_intro_extro'] == part]
-        mem_groups = data.groupby('memory_function')['mean_decision_time_overall'].mean()
+        mem_groups = cube_series(cube, ['participant_intro_extro', 'memory_function'], 'mean_decision_time_overall', 'mean', within=part)
         
         if len(mem_groups) == 2:
             x_pos = [0, 1]
@@ -1071,7 +1049,7 @@ def create_figure7_interaction_plots(df):
     
     print("  [OK] Saved: Figure7_Interaction_Plots.png")
 
-def create_figure8_vr_and_individual_diffs(df):
+def create_figure8_vr_and_individual_diffs(df, cube):
     """Figure 8: VR metrics and individual differences (6 panels)"""
     print("\n[8] Creating Figure 8: VR Metrics and Individual Differences...")
     
@@ -1089,7 +1067,7 @@ def create_figure8_vr_and_individual_diffs(df):
     
     for i, metric in enumerate(vr_metrics):
         if metric in df.columns:
-            means = [df[df['condition_label']==c][metric].mean() for c in conditions]
+            means = cube_values(cube, 'condition_label', metric, 'mean', conditions)
             ax1.bar(x + i*width, means, width, label=metric, alpha=0.85,
                    edgecolor='black', linewidth=1.2)
     
@@ -1131,7 +1109,7 @@ def create_figure8_vr_and_individual_diffs(df):
     ax3 = fig.add_subplot(gs[0, 2])
     
     if 'Risk_propensity' in df.columns:
-        risk_groups = df.groupby('condition_label')['Risk_propensity'].agg(['mean', 'sem'])
+        risk_groups = cube_table(cube, 'condition_label', 'Risk_propensity')
         
         colors = ['#4ECDC4', '#95E1D3', '#FF6B6B', '#FFB3B3']
         bars = ax3.bar(range(len(risk_groups)), risk_groups['mean'].values,
@@ -1162,7 +1140,7 @@ def create_figure8_vr_and_individual_diffs(df):
     ax5 = fig.add_subplot(gs[1, 1])
     
     if 'Age' in df.columns:
-        age_groups = df.groupby('condition_label')['Age'].agg(['mean', 'sem'])
+        age_groups = cube_table(cube, 'condition_label', 'Age')
         
         colors = ['#4ECDC4', '#95E1D3', '#FF6B6B', '#FFB3B3']
         bars = ax5.bar(range(len(age_groups)), age_groups['mean'].values,
@@ -1178,7 +1156,7 @@ def create_figure8_vr_and_individual_diffs(df):
     ax6 = fig.add_subplot(gs[1, 2])
     
     if 'total_help_requests' in df.columns:
-        help_part = df.groupby('participant_intro_extro')['total_help_requests'].agg(['mean', 'sem'])
+        help_part = cube_table(cube, 'participant_intro_extro', 'total_help_requests')
         
         bars = ax6.bar(range(len(help_part)), help_part['mean'].values,
                        yerr=help_part['sem'].values, capsize=5,
@@ -1207,27 +1185,34 @@ def main():
     # Load data
     df = load_data()
     
+    # Make sure every derived metric exists, then compute all descriptives once
+    if 'corner1_decision1_time' in df.columns or 'mean_decision_time_overall' not in df.columns:
+        calculate_decision_metrics(df)
+    if 'compliance_rate' not in df.columns:
+        calculate_compliance_rate(df)
+    cube = build_descriptive_cube(df)
+    
     # Create all figures
-    create_figure1_sample_descriptives(df)
-    create_figure2_trust_by_all_conditions(df)
-    create_figure3_decision_time_comprehensive(df)
-    create_figure4_agent_perceptions_heatmap(df)
-    create_figure5_compliance_patterns(df)
-    create_figure6_perceptions_by_conditions(df)
-    create_figure7_interaction_plots(df)
-    create_figure8_vr_and_individual_diffs(df)
+    create_figure1_sample_descriptives(df, cube)
+    create_figure2_trust_by_all_conditions(df, cube)
+    create_figure3_decision_time_comprehensive(df, cube)
+    create_figure4_agent_perceptions_heatmap(df, cube)
+    create_figure5_compliance_patterns(df, cube)
+    create_figure6_perceptions_by_conditions(df, cube)
+    create_figure7_interaction_plots(df, cube)
+    create_figure8_vr_and_individual_diffs(df, cube)
     
     print("\n" + "="*80)
     print("COMPLETE! ALL PUBLICATION FIGURES GENERATED")
     print("="*80)
     print("\nTotal Figures: 8")
-    print("Total Panels: 56")
+    print("Total Panels: 58")
     print("\nAll figures saved in: PUBLICATION_FIGURES_COMPLETE/")
     print("\nFigures include:")
     print("  1. Sample descriptives (6 panels)")
     print("  2. Trust by all conditions (9 panels)")
     print("  3. Decision time comprehensive (9 panels)")
-    print("  4. Agent perceptions heatmaps (4 panels)")
+    print("  4. Agent perceptions heatmaps (6 panels)")
     print("  5. Compliance patterns (6 panels)")
     print("  6. Perceptions by condition (6 panels)")
     print("  7. Interaction plots (6 panels)")
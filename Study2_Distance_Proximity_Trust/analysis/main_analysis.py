@@ -23,6 +23,8 @@ Requirements:
     - pandas, numpy, scipy, matplotlib, seaborn, scikit-learn
 """
 
+import os
+import sys
 import pandas as pd
 import numpy as np
 import matplotlib.pyplot as plt
@@ -32,6 +34,12 @@ from scipy.stats import ttest_ind, chi2_contingency
 import warnings
 warnings.filterwarnings('ignore')
 
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                                '..', '..', 'Shared_Resources', 'common_functions'))
+from bayes_factors import bf10_ttest, format_bf
+from equivalence import metric_bounds, tost_from_stats
+from moderation import moderation_analysis
+
 # Set style for professional plots
 plt.style.use('seaborn-v0_8-whitegrid')
 sns.set_palette("husl")
@@ -115,7 +123,18 @@ def distance_proximity_analysis(df):
     t_stat, p_val = ttest_ind(high_distance['trust_difference'], low_distance['trust_difference'])
     effect_size = (high_distance['trust_difference'].mean() - low_distance['trust_difference'].mean()) / \
                   np.sqrt((high_distance['trust_difference'].var() + low_distance['trust_difference'].var()) / 2)
-    print(f"\n📈 Trust Difference t-test: t = {t_stat:.3f}, p = {p_val:.3f}, d = {effect_size:.3f}")
+    bf10 = float(bf10_ttest(t_stat, high_distance['trust_difference'].count(), low_distance['trust_difference'].count()))
+    print(f"\n📈 Trust Difference t-test: t = {t_stat:.3f}, p = {p_val:.3f}, d = {effect_size:.3f}, {format_bf(bf10)}")
+    
+    # Pre-task trust equivalence (TOST): groups should not differ before the task
+    _, bound, scale = metric_bounds(['trust_pre'])
+    pre = [g['trust_pre'].dropna() for g in (high_distance, low_distance)]
+    tost = tost_from_stats(len(pre[0]), pre[0].mean(), pre[0].var(), len(pre[1]), pre[1].mean(), pre[1].var(),
+                           bound[0], scale[0])
+    print(f"📈 Pre-task Trust equivalence (TOST, ±{bound[0]:.0f}): diff = {float(tost['diff']):.2f}, "
+          f"90% CI [{float(tost['ci_lower']):.2f}, {float(tost['ci_upper']):.2f}], "
+          f"p = {float(tost['p_tost']):.3f} ({tost['conclusion']})")
+    results['trust_pre_equivalence'] = {key: np.asarray(value).item() for key, value in tost.items()}
     
     return results
 
@@ -147,13 +166,15 @@ def behavioral_trust_analysis(df):
     t_stat, p_val = ttest_ind(high_distance['decision_time_phase2'], low_distance['decision_time_phase2'])
     effect_size = (high_distance['decision_time_phase2'].mean() - low_distance['decision_time_phase2'].mean()) / \
                   np.sqrt((high_distance['decision_time_phase2'].var() + low_distance['decision_time_phase2'].var()) / 2)
-    print(f"\n📈 Phase 2 Decision Time t-test: t = {t_stat:.3f}, p = {p_val:.3f}, d = {effect_size:.3f}")
+    bf10 = float(bf10_ttest(t_stat, high_distance['decision_time_phase2'].count(), low_distance['decision_time_phase2'].count()))
+    print(f"\n📈 Phase 2 Decision Time t-test: t = {t_stat:.3f}, p = {p_val:.3f}, d = {effect_size:.3f}, {format_bf(bf10)}")
     
     # Error corner decision time t-test
     t_stat, p_val = ttest_ind(high_distance['decision_time_error'], low_distance['decision_time_error'])
     effect_size = (high_distance['decision_time_error'].mean() - low_distance['decision_time_error'].mean()) / \
                   np.sqrt((high_distance['decision_time_error'].var() + low_distance['decision_time_error'].var()) / 2)
-    print(f"\n📈 Error Corner Decision Time t-test: t = {t_stat:.3f}, p = {p_val:.3f}, d = {effect_size:.3f}")
+    bf10 = float(bf10_ttest(t_stat, high_distance['decision_time_error'].count(), low_distance['decision_time_error'].count()))
+    print(f"\n📈 Error Corner Decision Time t-test: t = {t_stat:.3f}, p = {p_val:.3f}, d = {effect_size:.3f}, {format_bf(bf10)}")
     
     return results
 
@@ -187,13 +208,15 @@ def compliance_analysis(df):
     t_stat, p_val = ttest_ind(high_distance['overall_compliance'], low_distance['overall_compliance'])
     effect_size = (high_distance['overall_compliance'].mean() - low_distance['overall_compliance'].mean()) / \
                   np.sqrt((high_distance['overall_compliance'].var() + low_distance['overall_compliance'].var()) / 2)
-    print(f"\n📈 Overall Compliance t-test: t = {t_stat:.3f}, p = {p_val:.3f}, d = {effect_size:.3f}")
+    bf10 = float(bf10_ttest(t_stat, high_distance['overall_compliance'].count(), low_distance['overall_compliance'].count()))
+    print(f"\n📈 Overall Compliance t-test: t = {t_stat:.3f}, p = {p_val:.3f}, d = {effect_size:.3f}, {format_bf(bf10)}")
     
     # Overcompliance t-test
     t_stat, p_val = ttest_ind(high_distance['overcompliance'], low_distance['overcompliance'])
     effect_size = (high_distance['overcompliance'].mean() - low_distance['overcompliance'].mean()) / \
                   np.sqrt((high_distance['overcompliance'].var() + low_distance['overcompliance'].var()) / 2)
-    print(f"\n📈 Overcompliance t-test: t = {t_stat:.3f}, p = {p_val:.3f}, d = {effect_size:.3f}")
+    bf10 = float(bf10_ttest(t_stat, high_distance['overcompliance'].count(), low_distance['overcompliance'].count()))
+    print(f"\n📈 Overcompliance t-test: t = {t_stat:.3f}, p = {p_val:.3f}, d = {effect_size:.3f}, {format_bf(bf10)}")
     
     return results
 
@@ -226,10 +249,36 @@ def agent_perception_analysis(df):
     t_stat, p_val = ttest_ind(high_distance['safety_perception'], low_distance['safety_perception'])
     effect_size = (high_distance['safety_perception'].mean() - low_distance['safety_perception'].mean()) / \
                   np.sqrt((high_distance['safety_perception'].var() + low_distance['safety_perception'].var()) / 2)
-    print(f"\n📈 Safety Perception t-test: t = {t_stat:.3f}, p = {p_val:.3f}, d = {effect_size:.3f}")
+    bf10 = float(bf10_ttest(t_stat, high_distance['safety_perception'].count(), low_distance['safety_perception'].count()))
+    print(f"\n📈 Safety Perception t-test: t = {t_stat:.3f}, p = {p_val:.3f}, d = {effect_size:.3f}, {format_bf(bf10)}")
     
     return results
 
+def vr_moderation_analysis(df):
+    """Test whether VR experience metrics moderate the distance effects"""
+    print("\n🥽 VR Experience x Distance Moderation...")
+    
+    moderators = [m for m in ['Familiarity', 'Immersion', 'Self-efficacy'] if m in df.columns]
+    outcomes = [o for o in ['trust_difference', 'trust_post', 'overall_compliance',
+                            'decision_time_phase1', 'decision_time_phase2'] if o in df.columns]
+    if not moderators or not outcomes:
+        print("   VR experience metrics not available")
+        return pd.DataFrame()
+    
+    results = moderation_analysis(df, 'distance_condition', moderators, outcomes,
+                                  levels=('High Distance (5.4m)', 'Low Distance (1.8m)'))
+    for _, row in results.iterrows():
+        if row['p_interaction'] < 0.05:
+            print(f"   {row['moderator']} x distance -> {row['outcome']}: "
+                  f"b = {row['b_interaction']:.3f}, p = {row['p_interaction']:.3f}")
+            print(f"      Close-distance effect: {row['slope_low']:.2f} (-1 SD), "
+                  f"{row['slope_mean']:.2f} (mean), {row['slope_high']:.2f} (+1 SD); "
+                  f"significant over {row['percent_range_significant']:.0f}% of the range")
+    
+    results.to_csv('vr_distance_moderation.csv', index=False)
+    print("✅ Saved vr_distance_moderation.csv")
+    return results
+
 def risk_propensity_overview(df):
     """Provide risk propensity overview"""
     print("\n🎲 Risk Propensity Overview...")
@@ -338,6 +387,7 @@ def main():
     behavioral_results = behavioral_trust_analysis(df)
     compliance_results = compliance_analysis(df)
     perception_results = agent_perception_analysis(df)
+    moderation_results = vr_moderation_analysis(df)
     risk_propensity_overview(df)
     
     # Create visualizations